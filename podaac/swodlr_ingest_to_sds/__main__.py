@@ -1,13 +1,35 @@
-'''Command line tool for submitting an individual granule to the SDS'''
+'''Command line tool for ingesting granules to the SDS'''
 import logging
 from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from functools import cache
+from itertools import islice
 import json
 from pathlib import PurePath
+import sys
+from threading import Lock
+from time import monotonic, sleep
 from urllib.parse import urlsplit
 import boto3
+from podaac.swodlr_common import sds_statuses
+from podaac.swodlr_ingest_to_sds import report, requeue
+from podaac.swodlr_ingest_to_sds.scan import SCAN_SEGMENTS
+
+PUBLISH_BATCH_LIMIT = 10
+DEFAULT_WORKERS = 8
+PROGRESS_INTERVAL = 1000  # messages
 
 logging.basicConfig(level=logging.INFO)
-sns = boto3.client('sns')
+
+
+@cache
+def sns():
+    '''
+    Lazily creates an SNS client
+    '''
+    return boto3.client('sns')
 
 
 def main():
@@ -15,18 +37,309 @@ def main():
     Main entry point for the script
     '''
 
+    if sys.argv[1:2] == ['requeue']:
+        requeue_main(sys.argv[2:])
+        return
+
+    if sys.argv[1:2] == ['report']:
+        report_main(sys.argv[2:])
+        return
+
     parser = ArgumentParser()
 
     parser.add_argument('topic_arn')
-    parser.add_argument('s3_url')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('s3_url', nargs='?')
+    source.add_argument('--file', '-f',
+                        help='file of S3 urls, one per line; - for stdin')
+    source.add_argument('--s3-prefix',
+                        help='S3 url prefix of the granules to submit')
+    parser.add_argument('--suffix', default='.nc',
+                        help='suffix of the keys to submit under --s3-prefix')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--checkpoint',
+                        help='file recording published urls, which are '
+                             'skipped when resuming')
 
     args = parser.parse_args()
 
-    res = sns.publish(
-        TopicArn=args.topic_arn,
-        Message=json.dumps(_gen_cnm_r(args.s3_url))
+    if args.s3_url is not None:
+        res = sns().publish(
+            TopicArn=args.topic_arn,
+            Message=json.dumps(_gen_cnm_r(args.s3_url))
+        )
+        logging.info('Sent SNS message; id: %s', res['MessageId'])
+        return
+
+    if args.file is not None:
+        s3_urls = _read_urls(args.file)
+    else:
+        s3_urls = _list_urls(args.s3_prefix, args.suffix)
+
+    _, failed = publish_bulk(
+        args.topic_arn, s3_urls, args.workers, args.checkpoint
+    )
+    if failed > 0:
+        sys.exit(1)
+
+
+def requeue_main(argv):
+    '''
+    Entry point for the requeue subcommand, which republishes the granules
+    in the ingest table which failed or are stuck in a status
+    '''
+    parser = ArgumentParser(prog='ingest requeue')
+
+    parser.add_argument('topic_arn')
+    parser.add_argument('table_name')
+    parser.add_argument('--status', action='append',
+                        help='status of the granules to requeue; may be '
+                             'repeated; defaults to the failed statuses')
+    parser.add_argument('--older-than', type=float,
+                        help='only requeue granules last checked more than '
+                             'this many hours ago')
+    parser.add_argument('--segments', type=int,
+                        default=SCAN_SEGMENTS)
+    parser.add_argument('--rate', type=float,
+                        help='max messages published per second')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--dry-run', action='store_true')
+
+    args = parser.parse_args(argv)
+
+    statuses = args.status or list(sds_statuses.FAIL)
+    checked_before = None
+    if args.older_than is not None:
+        checked_before = (
+            datetime.now() - timedelta(hours=args.older_than)
+        ).isoformat()
+
+    table = boto3.resource('dynamodb').Table(args.table_name)
+    items = [
+        item for item in requeue.scan_ingest_table(
+            table, statuses, checked_before, args.segments
+        )
+        if 's3_url' in item
+    ]
+    for status, count in sorted(Counter(
+        item['status'] for item in items
+    ).items()):
+        logging.info('Matched granules; status: %s; count: %d',
+                     status, count)
+
+    if args.dry_run:
+        for item in items:
+            print(item['granule_id'])
+        return
+
+    items = requeue.release_granules(table, items, args.workers)
+    _, failed = publish_bulk(
+        args.topic_arn, [item['s3_url'] for item in items],
+        args.workers, rate=args.rate
+    )
+    if failed > 0:
+        sys.exit(1)
+
+
+def report_main(argv):
+    '''
+    Entry point for the report subcommand, which prints the queue, run and
+    total latency percentiles of the granules in the ingest table
+    '''
+    parser = ArgumentParser(prog='ingest report')
+
+    parser.add_argument('table_name')
+    parser.add_argument('--segments', type=int, default=SCAN_SEGMENTS)
+
+    args = parser.parse_args(argv)
+
+    table = boto3.resource('dynamodb').Table(args.table_name)
+    latencies = report.latency_report(
+        report.scan_transitions(table, args.segments)
     )
-    logging.info('Sent SNS message; id: %s', res['MessageId'])
+    print(report.format_report(latencies))
+
+
+def publish_bulk(topic_arn, s3_urls, workers=DEFAULT_WORKERS,
+                 checkpoint_path=None, rate=None):
+    '''
+    Publishes a CNM-R for each S3 url, PUBLISH_BATCH_LIMIT messages per
+    PublishBatch call with the calls made concurrently and, if a rate is
+    given, at no more than that many messages per second. Urls recorded in
+    the checkpoint file are skipped and published urls are appended to it.
+    Returns a tuple of the number of messages published and failed
+    '''
+    checkpoint = _Checkpoint(checkpoint_path)
+    progress = _Progress()
+    batches = _batch(
+        (url for url in s3_urls if url not in checkpoint), PUBLISH_BATCH_LIMIT
+    )
+    started = monotonic()
+    sent = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for batch in batches:
+            if rate:
+                sleep(max(0, started + sent / rate - monotonic()))
+            sent += len(batch)
+
+            # Bound the batches in flight so urls are read as they're needed
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    progress.update(*future.result())
+
+            pending.add(executor.submit(
+                _publish_batch, topic_arn, batch, checkpoint
+            ))
+
+        for future in pending:
+            progress.update(*future.result())
+
+    checkpoint.close()
+    progress.report(final=True)
+    return progress.published, progress.failed
+
+
+def _publish_batch(topic_arn, s3_urls, checkpoint):
+    entries = [
+        {'Id': str(i), 'Message': json.dumps(_gen_cnm_r(url))}
+        for i, url in enumerate(s3_urls)
+    ]
+
+    try:
+        res = sns().publish_batch(
+            TopicArn=topic_arn, PublishBatchRequestEntries=entries
+        )
+    # boto3 raises a variety of client and connection errors
+    except Exception:  # pylint: disable=broad-exception-caught
+        logging.exception('Failed to publish batch; first url: %s',
+                          s3_urls[0])
+        return 0, len(s3_urls)
+
+    for failure in res.get('Failed', []):
+        logging.error('Failed to publish %s: %s',
+                      s3_urls[int(failure['Id'])], failure.get('Message'))
+
+    successful = [s3_urls[int(success['Id'])]
+                  for success in res.get('Successful', [])]
+    checkpoint.add(successful)
+
+    return len(successful), len(s3_urls) - len(successful)
+
+
+def _read_urls(path):
+    '''
+    Yields S3 urls from a file, or stdin if path is -, skipping blank lines
+    and comments
+    '''
+    # pylint: disable-next=consider-using-with
+    f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _list_urls(s3_prefix, suffix):
+    '''
+    Yields the S3 urls of every object under a prefix whose key ends with
+    the suffix
+    '''
+    url_components = urlsplit(s3_prefix)
+    bucket = url_components.netloc
+    prefix = url_components.path.lstrip('/')
+
+    paginator = boto3.client('s3').get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].endswith(suffix):
+                yield f's3://{bucket}/{obj["Key"]}'
+
+
+def _batch(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class _Checkpoint:
+    '''
+    Set of published urls which is loaded from and appended to a file
+    '''
+
+    def __init__(self, path):
+        self._lock = Lock()
+        self._urls = set()
+        self._file = None
+
+        if path is None:
+            return
+
+        try:
+            with open(path, encoding='utf-8') as f:
+                self._urls = {line.strip() for line in f if line.strip()}
+            logging.info('Resuming from checkpoint; published: %d',
+                         len(self._urls))
+        except FileNotFoundError:
+            pass
+
+        # pylint: disable-next=consider-using-with
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __contains__(self, url):
+        return url in self._urls
+
+    def add(self, urls):
+        '''Records urls as published'''
+        if self._file is None or len(urls) == 0:
+            return
+
+        with self._lock:
+            self._file.writelines(f'{url}\n' for url in urls)
+            self._file.flush()
+
+    def close(self):
+        '''Closes the checkpoint file'''
+        if self._file is not None:
+            self._file.close()
+
+
+class _Progress:
+    '''
+    Counts published and failed messages and logs the throughput
+    '''
+
+    def __init__(self):
+        self.published = 0
+        self.failed = 0
+        self._started = monotonic()
+        self._last_report = 0
+
+    def update(self, published, failed):
+        '''Adds a batch's results and reports progress periodically'''
+        self.published += published
+        self.failed += failed
+
+        if self.published + self.failed - self._last_report \
+                >= PROGRESS_INTERVAL:
+            self.report()
+
+    def report(self, final=False):
+        '''Logs the messages published so far and the throughput'''
+        total = self.published + self.failed
+        elapsed = monotonic() - self._started
+        self._last_report = total
+        logging.info(
+            '%s: %d; failed: %d; %.1f msg/s',
+            'Published' if final else 'Publishing', self.published,
+            self.failed, total / elapsed if elapsed > 0 else 0
+        )
 
 
 def _gen_cnm_r(s3_url):
@@ -1,19 +1,119 @@
 '''Lambda to bootstrap step function execution'''
 import json
 import boto3
+from botocore.exceptions import ClientError
+from podaac.swodlr_ingest_to_sds.message_attributes import (
+    PRIORITY_ATTRIBUTE, REQUEUE_COUNT_ATTRIBUTE
+)
+from podaac.swodlr_ingest_to_sds.profiling import profiler
 from podaac.swodlr_ingest_to_sds.utilities import utils
 
+# Leaves headroom under the 256 KiB step function payload limit for the
+# job set submit_to_sds adds
+EXECUTION_MAX_BYTES = 192 * 1024
+EXECUTION_MAX_RECORDS = int(utils.get_param('execution_max_records') or 500)
+FILE_KEYS = ('name', 'uri', 'type')
+
 stepfunctions = boto3.client('stepfunctions')
 ingest_sf_arn = utils.get_param('stepfunction_arn')
 logger = utils.get_logger(__name__)
 
 
+@profiler.profile('bootstrap')
 def lambda_handler(event, _context):
-    '''Starts step function execution'''
-
-    sf_input = json.dumps(event, separators=(',', ':'))
-    result = stepfunctions.start_execution(
-        stateMachineArn=ingest_sf_arn,
-        input=sf_input
-    )
-    logger.info('Started step function execution: %s', result['executionArn'])
+    '''
+    Starts step function executions for the SQS records received, packing
+    as many compacted records into each execution as fit in its payload.
+    Returns the records of executions which failed to start so that only
+    they are redelivered
+    '''
+    records = [_compact_record(record) for record in event['Records']]
+    failures = []
+
+    for batch in _batch_records(records):
+        sf_input = json.dumps({'Records': batch}, separators=(',', ':'))
+        try:
+            result = stepfunctions.start_execution(
+                stateMachineArn=ingest_sf_arn,
+                input=sf_input
+            )
+        except ClientError:
+            logger.exception('Failed to start step function execution; '
+                             'records: %d', len(batch))
+            failures.extend(
+                {'itemIdentifier': record['messageId']} for record in batch
+            )
+            continue
+
+        logger.info('Started step function execution: %s; records: %d',
+                    result['executionArn'], len(batch))
+
+    return {'batchItemFailures': failures}
+
+
+def _batch_records(records):
+    '''
+    Yields lists of records which fit within the execution limits
+    '''
+    envelope_size = len('{"Records":[]}')
+    batch = []
+    size = envelope_size
+    for record in records:
+        record_size = len(json.dumps(record, separators=(',', ':'))) + 1
+        if batch and (size + record_size > EXECUTION_MAX_BYTES
+                      or len(batch) >= EXECUTION_MAX_RECORDS):
+            yield batch
+            batch = []
+            size = envelope_size
+
+        batch.append(record)
+        size += record_size
+
+    if batch:
+        yield batch
+
+
+def _compact_record(record):
+    '''
+    Strips an SQS record down to the fields submit_to_sds reads
+    '''
+    compacted = {
+        'messageId': record['messageId'],
+        'body': _compact_body(record['body'])
+    }
+
+    attributes = record.get('messageAttributes') or {}
+    for name in (REQUEUE_COUNT_ATTRIBUTE, PRIORITY_ATTRIBUTE):
+        if name not in attributes:
+            continue
+
+        try:
+            compacted[name] = int(attributes[name]['stringValue'])
+        except (KeyError, TypeError, ValueError):
+            # A bad attribute mustn't fail the batch the record is in
+            logger.warning('Ignoring invalid %s attribute: %s; record: %s',
+                           name, attributes[name].get('stringValue'),
+                           record['messageId'])
+
+    return compacted
+
+
+def _compact_body(body):
+    '''
+    Strips a CNM-R message down to its identifier and the name, uri and type
+    of its files; bodies which can't be parsed are passed through for
+    submit_to_sds to reject
+    '''
+    try:
+        message = json.loads(body)
+        files = [
+            {key: file[key] for key in FILE_KEYS if key in file}
+            for file in message['product']['files']
+        ]
+    except (json.JSONDecodeError, KeyError, TypeError):
+        return body
+
+    return json.dumps({
+        'identifier': message.get('identifier'),
+        'product': {'files': files}
+    }, separators=(',', ':'))
@@ -0,0 +1,115 @@
+'''
+Lambda to apply job status change notifications from the SDS to DynamoDB so
+that completions are recorded without waiting for the next poll
+'''
+import json
+from time import time
+from podaac.swodlr_ingest_to_sds import poll_status
+from podaac.swodlr_ingest_to_sds.job_types import (
+    INGEST_JOB_NAME, INGEST_TAG_PREFIX
+)
+from podaac.swodlr_ingest_to_sds.metrics import metrics
+from podaac.swodlr_ingest_to_sds.profiling import profiler
+from podaac.swodlr_ingest_to_sds.utilities import utils
+
+logger = utils.get_logger(__name__)
+
+
+@metrics.instrument('job_notifications')
+@profiler.profile('job_notifications')
+def lambda_handler(event, _context):
+    '''
+    Applies the job statuses in SQS or SNS records to the ingest and
+    available tiles tables the same way poll_status does. Returns the SQS
+    records whose status failed to be recorded so that only they are
+    redelivered
+    '''
+    results = []
+    message_ids = {}
+
+    for record in event['Records']:
+        try:
+            notification = _parse_notification(record)
+        except (ValueError, KeyError, TypeError):
+            # Redelivering these won't help, so they're dropped
+            logger.exception('Dropping unparsable notification: %s',
+                             record.get('messageId'))
+            continue
+
+        job_id = notification.get('job_id') or notification.get('payload_id')
+        granule_id = _extract_granule_id(notification)
+        if job_id is None or granule_id is None:
+            logger.debug('Ignoring notification for non-ingest job: %s',
+                         job_id)
+            continue
+
+        item = {'granule_id': granule_id, 'job_id': job_id}
+        info = {'status': notification['status']}
+        if 'traceback' in notification:
+            info['traceback'] = notification['traceback']
+        if isinstance(notification.get('job'), dict):
+            info['job'] = notification['job']
+
+        results.append((item, info))
+        message_ids[id(item)] = record.get('messageId')
+
+    updates = poll_status.record_statuses(results, time())
+    failures = [
+        {'itemIdentifier': message_ids[id(item)]}
+        for item, _ in results
+        if id(item) not in updates and message_ids[id(item)] is not None
+    ]
+
+    logger.info('Notifications: %d; recorded: %d; failed: %d',
+                len(event['Records']), len(updates), len(failures))
+    return {'batchItemFailures': failures}
+
+
+def _parse_notification(record):
+    '''
+    Parses a notification delivered by SQS, SNS, or SNS through SQS. Raises
+    ValueError if the notification isn't an object with a status
+    '''
+    if 'Sns' in record:
+        notification = json.loads(record['Sns']['Message'])
+    else:
+        notification = json.loads(record['body'])
+        if isinstance(notification, dict) \
+                and notification.get('Type') == 'Notification' \
+                and 'Message' in notification:
+            notification = json.loads(notification['Message'])
+
+    if not isinstance(notification, dict) \
+            or not isinstance(notification.get('status'), str):
+        raise ValueError('Notification has no status')
+
+    return notification
+
+
+def _extract_granule_id(notification):
+    '''
+    Returns the id of the granule an ingest job was submitted for, from the
+    notification's granule id, the job's tag, or the data file of an ingest
+    job; None for other jobs
+    '''
+    if 'granule_id' in notification:
+        return notification['granule_id']
+
+    filename = None
+    tags = notification.get('tags') or []
+    if 'tag' in notification:
+        tags = [notification['tag'], *tags]
+
+    for tag in tags:
+        if isinstance(tag, str) and tag.startswith(INGEST_TAG_PREFIX):
+            filename = tag[len(INGEST_TAG_PREFIX):]
+            break
+    else:
+        job = notification.get('job') or {}
+        if str(job.get('type', '')).startswith(INGEST_JOB_NAME):
+            filename = (job.get('params') or {}).get('data_file')
+
+    if not filename:
+        return None
+
+    return filename.split('.', 1)[0]
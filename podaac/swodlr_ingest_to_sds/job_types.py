@@ -0,0 +1,134 @@
+'''Cached resolution of SDS job types'''
+from contextlib import contextmanager
+import json
+from pathlib import Path
+from queue import Empty, SimpleQueue
+from threading import Lock, Thread
+from time import time
+from podaac.swodlr_ingest_to_sds.utilities import utils
+
+DEFAULT_TTL = 900  # seconds
+CACHE_DIR = Path('/tmp')
+INGEST_JOB_NAME = 'job-INGEST_STAGED'
+INGEST_TAG_PREFIX = 'ingest_file_otello__'
+
+logger = utils.get_logger(__name__)
+
+
+class JobTypeCache:
+    '''
+    Resolves the latest version of an SDS job type on first use and caches it
+    in memory and, if a cache path is given, on disk so that the resolution
+    survives sandbox reuse. Once the cached version is older than the TTL it
+    keeps being served while it is refreshed in the background.
+
+    Initialized job types hold their input params as state, so they are
+    checked out to one submission at a time and returned to a pool for reuse
+    '''
+
+    def __init__(self, job_name, ttl=DEFAULT_TTL, cache_path=None):
+        self.job_name = job_name
+        self.ttl = ttl
+        self.cache_path = cache_path
+
+        self._lock = Lock()
+        self._version = None
+        self._resolved_at = None
+        self._refreshing = False
+        self._pool = SimpleQueue()
+
+    @property
+    def version(self):
+        '''
+        The resolved job version; resolved on first use and refreshed in the
+        background once stale
+        '''
+        with self._lock:
+            if self._version is None:
+                self._load()
+
+            if self._version is None:
+                self._resolve()
+            elif time() - self._resolved_at > self.ttl \
+                    and not self._refreshing:
+                self._refreshing = True
+                Thread(target=self._refresh, daemon=True).start()
+
+            return self._version
+
+    @contextmanager
+    def checkout(self):
+        '''
+        Checks out an initialized job type of the current version
+        '''
+        version = self.version
+        job_type = None
+
+        while job_type is None:
+            try:
+                pooled_version, pooled_job_type = self._pool.get_nowait()
+            except Empty:
+                job_type = utils.mozart_client.get_job_type(version)
+                job_type.initialize()
+                break
+
+            if pooled_version == version:
+                job_type = pooled_job_type
+
+        try:
+            yield job_type
+        finally:
+            self._pool.put((version, job_type))
+
+    def _resolve(self):
+        self._version = utils.get_latest_job_version(self.job_name)
+        self._resolved_at = time()
+        logger.info('Resolved job version: %s', self._version)
+        self._save()
+
+    def _refresh(self):
+        try:
+            version = utils.get_latest_job_version(self.job_name)
+            with self._lock:
+                self._version = version
+                self._resolved_at = time()
+                self._save()
+        # Otello and the GRQ client raise very generic exceptions
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Failed to refresh job version: %s',
+                             self.job_name)
+        finally:
+            self._refreshing = False
+
+    def _load(self):
+        if self.cache_path is None:
+            return
+
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                cached = json.load(f)
+
+            if cached['job_name'] == self.job_name:
+                self._version = cached['version']
+                self._resolved_at = cached['resolved_at']
+                logger.debug('Loaded cached job version: %s', self._version)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError):
+            logger.warning('Ignoring unreadable job version cache: %s',
+                           self.cache_path)
+
+    def _save(self):
+        if self.cache_path is None:
+            return
+
+        try:
+            with open(self.cache_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'job_name': self.job_name,
+                    'version': self._version,
+                    'resolved_at': self._resolved_at
+                }, f)
+        except OSError:
+            logger.warning('Failed to write job version cache: %s',
+                           self.cache_path)
@@ -0,0 +1,7 @@
+'''Names of the message attributes of records on the ingest queue'''
+
+# Sets a granule's priority, overriding the priority policy
+PRIORITY_ATTRIBUTE = 'priority'
+
+# Counts the times a record has been requeued to the ingest queue
+REQUEUE_COUNT_ATTRIBUTE = 'requeue_count'
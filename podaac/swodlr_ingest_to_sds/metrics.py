@@ -0,0 +1,155 @@
+'''Per-invocation performance metrics in CloudWatch Embedded Metric Format'''
+from contextlib import contextmanager
+from functools import wraps
+import json
+import logging
+from threading import Lock
+from time import perf_counter, time
+from podaac.swodlr_ingest_to_sds.utilities import utils
+
+METRICS_ENABLED = (utils.get_param('metrics_enabled') or '').lower() == 'true'
+NAMESPACE = utils.get_param('metrics_namespace') or 'swodlr/ingest-to-sds'
+MAX_VALUES = 100  # per metric per record; the most EMF allows
+
+logger = utils.get_logger(__name__)
+
+
+class Metrics:
+    '''
+    Collects phase timings and counts over an invocation and emits them as
+    EMF records when flushed. Timings keep every value so that CloudWatch
+    can compute percentiles; counts are summed. When disabled, recording is
+    a no-op
+    '''
+
+    def __init__(self, namespace=NAMESPACE, enabled=METRICS_ENABLED):
+        self.namespace = namespace
+        self.enabled = enabled
+
+        self._lock = Lock()
+        self._timings = {}
+        self._counts = {}
+
+    @contextmanager
+    def timer(self, name):
+        '''
+        Records the time spent in the block as a timing of the phase
+        '''
+        if not self.enabled:
+            yield
+            return
+
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (perf_counter() - start) * 1000
+            with self._lock:
+                self._timings.setdefault(name, []).append(elapsed_ms)
+
+    def count(self, name, value=1):
+        '''
+        Adds to a count
+        '''
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + value
+
+    def flush(self, function):
+        '''
+        Emits the metrics recorded since the last flush as EMF records
+        dimensioned by function and resets them
+        '''
+        if not self.enabled:
+            return
+
+        with self._lock:
+            timings, self._timings = self._timings, {}
+            counts, self._counts = self._counts, {}
+
+        for record in self._records(function, timings, counts):
+            _emit(record)
+
+    def instrument(self, function):
+        '''
+        Decorates a lambda handler to time it and flush its metrics when it
+        returns. Time spent loading config, including on import during a
+        cold start, is recorded as ConfigLoad
+        '''
+        def decorator(handler):
+            @wraps(handler)
+            def wrapper(*args, **kwargs):
+                try:
+                    with self.timer('Handler'):
+                        return handler(*args, **kwargs)
+                finally:
+                    self._record_config_timings()
+                    self.flush(function)
+
+            return wrapper
+
+        return decorator
+
+    def _record_config_timings(self):
+        timings = utils.pop_config_timings()
+        if not self.enabled or not timings:
+            return
+
+        with self._lock:
+            self._timings.setdefault('ConfigLoad', []).extend(timings)
+
+    def _records(self, function, timings, counts):
+        '''
+        Yields EMF records, splitting timings with more than MAX_VALUES
+        values across records; counts are in the first record
+        '''
+        offset = 0
+        while offset == 0 or any(
+            len(values) > offset for values in timings.values()
+        ):
+            metrics = {
+                name: values[offset:offset + MAX_VALUES]
+                for name, values in timings.items()
+                if len(values) > offset
+            }
+            units = {name: 'Milliseconds' for name in metrics}
+            if offset == 0:
+                metrics.update(counts)
+                units.update({name: 'Count' for name in counts})
+
+            yield {
+                '_aws': {
+                    'Timestamp': int(time() * 1000),
+                    'CloudWatchMetrics': [{
+                        'Namespace': self.namespace,
+                        'Dimensions': [['Function']],
+                        'Metrics': [
+                            {'Name': name, 'Unit': unit}
+                            for name, unit in units.items()
+                        ]
+                    }]
+                },
+                'Function': function,
+                **metrics
+            }
+            offset += MAX_VALUES
+
+
+def _emit(record):
+    # CloudWatch only extracts metrics from log events which are entirely JSON
+    # so records are logged without the usual log format
+    logger.info('%s', json.dumps(record, separators=(',', ':')))
+
+
+def _configure_logger():
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+_configure_logger()
+metrics = Metrics()
@@ -0,0 +1,124 @@
+'''
+Compact encoding of the job sets passed between step function states
+
+Small job sets are passed as a plain list of job items. Larger job sets are
+encoded as columns of values, with the granule and job ids front coded
+against the previous id in the column, and the largest sets are additionally
+zlib compressed and base64 encoded to stay under the step function payload
+limit
+
+Encoded job sets are wrapped in a one item list so that every non-empty job
+set has a "$.jobs[0]", which step function executions started before the
+job_count field existed check to decide whether to keep polling
+'''
+from base64 import b64decode, b64encode
+import json
+import zlib
+
+COMPACT_MIN_JOBS = 100
+COMPRESS_MIN_JOBS = 1000
+FRONT_CODED_KEYS = ('granule_id', 'job_id')
+VERSION = 1
+
+
+def encode_job_set(jobs):
+    '''
+    Returns the step function event fields for a job set: the encoded jobs
+    and their count
+    '''
+    return {
+        'jobs': encode_jobs(jobs),
+        'job_count': len(jobs)
+    }
+
+
+def encode_jobs(jobs):
+    '''
+    Encodes a list of job items into the most compact form for its size
+    '''
+    if len(jobs) < COMPACT_MIN_JOBS:
+        return jobs
+
+    keys = []
+    for item in jobs:
+        for key in item:
+            if key not in keys:
+                keys.append(key)
+
+    columns = {}
+    for key in keys:
+        values = [item.get(key) for item in jobs]
+        columns[key] = _front_code(values) if key in FRONT_CODED_KEYS \
+            else values
+
+    if len(jobs) < COMPRESS_MIN_JOBS:
+        return [{'v': VERSION, 'columns': columns}]
+
+    data = json.dumps(columns, separators=(',', ':')).encode('utf-8')
+    return [{
+        'v': VERSION,
+        'zlib': b64encode(zlib.compress(data, 9)).decode('ascii')
+    }]
+
+
+def decode_jobs(encoded):
+    '''
+    Decodes a job set in any of its forms into a list of job items
+    '''
+    if isinstance(encoded, list):
+        # Job items never have a version, so a plain list is returned as is
+        if len(encoded) != 1 or 'v' not in encoded[0]:
+            return encoded
+
+        encoded = encoded[0]
+
+    if encoded.get('v') != VERSION:
+        raise ValueError(f'Unsupported job set version: {encoded.get("v")}')
+
+    if 'zlib' in encoded:
+        columns = json.loads(zlib.decompress(b64decode(encoded['zlib'])))
+    else:
+        columns = encoded['columns']
+
+    for key in FRONT_CODED_KEYS:
+        if key in columns:
+            columns[key] = _front_decode(columns[key])
+
+    count = len(next(iter(columns.values()), []))
+    jobs = [{} for _ in range(count)]
+    for key, values in columns.items():
+        for item, value in zip(jobs, values):
+            if value is not None:
+                item[key] = value
+
+    return jobs
+
+
+def _front_code(values):
+    '''
+    Replaces each string with the length of the prefix it shares with the
+    previous string and its remaining suffix, as "<length>|<suffix>"
+    '''
+    coded = []
+    previous = ''
+    for value in values:
+        shared = 0
+        limit = min(len(value), len(previous))
+        while shared < limit and value[shared] == previous[shared]:
+            shared += 1
+
+        coded.append(f'{shared}|{value[shared:]}')
+        previous = value
+
+    return coded
+
+
+def _front_decode(coded):
+    values = []
+    previous = ''
+    for entry in coded:
+        shared, suffix = entry.split('|', 1)
+        previous = previous[:int(shared)] + suffix
+        values.append(previous)
+
+    return values
@@ -1,103 +1,420 @@
 '''Lambda to poll SDS for job status and update DynamoDB'''
-from datetime import datetime
-from copy import deepcopy
-import re
+from concurrent.futures import (
+    ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
+)
+from datetime import datetime, timezone
+from time import monotonic, time
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
 from podaac.swodlr_common import sds_statuses
+from podaac.swodlr_ingest_to_sds import payload, schedule
+from podaac.swodlr_ingest_to_sds.metrics import metrics
+from podaac.swodlr_ingest_to_sds.profiling import profiler
+from podaac.swodlr_ingest_to_sds.products import extract_cpt
 from podaac.swodlr_ingest_to_sds.utilities import utils
 
+POLL_WORKERS = int(utils.get_param('poll_workers') or 8)
+POLL_INTERVAL_SCALE = float(utils.get_param('poll_interval_scale') or 1)
+DEADLINE_MARGIN_MS = 10000
+PARTIQL_BATCH_LIMIT = 25
 
-PRODUCT_REGEX = re.compile(
-    r'_(?P<product>PIXC(Vec)?)_(?P<cycle>\d{3})_(?P<pass>\d{3})_(?P<tile>\d{3})(?P<direction>(R|L))_'  # pylint: disable=line-too-long # noqa: E501
-)
+# Set on completed granules until their tile has been inserted, so that the
+# sweeper can retry tiles which failed to be inserted
+TILE_PENDING_ATTRIBUTE = 'tile_pending_since'
 
 logger = utils.get_logger(__name__)
+serializer = TypeSerializer()
 
 
-def lambda_handler(event, _context):
+@metrics.instrument('poll_status')
+@profiler.profile('poll_status')
+def lambda_handler(event, context):
     '''
-    Polls SDS for job status and updates DynamoDB. Returns the remaining jobs
-    that have not completed.
+    Polls SDS for the status of jobs which are due to be checked and updates
+    DynamoDB. Returns the remaining jobs that have not completed, including
+    any jobs which could not be checked before the lambda's deadline, and the
+    number of seconds to wait until the next job is due.
     '''
-    new_event = deepcopy(event)
+    now = time()
+    event_jobs = payload.decode_jobs(event['jobs'])
+    due = [item for item in event_jobs if schedule.is_due(item, now)]
+    updates = poll_jobs(due, get_deadline(context), now)
+
+    jobs = list(_pending_jobs(event_jobs, updates))
+    wait_seconds = schedule.wait_seconds(jobs, time())
+    logger.info('Jobs checked: %d; pending: %d; next check in: %ds',
+                len(updates), len(jobs), wait_seconds)
+
+    return {
+        **event,
+        **payload.encode_job_set(jobs),
+        'wait_seconds': wait_seconds
+    }
+
+
+def poll_jobs(items, deadline, now):
+    '''
+    Checks the status of jobs before the deadline and records them. Returns
+    the updates made by record_statuses
+    '''
+    with metrics.timer('JobStatusLookup'):
+        infos = _get_job_infos([item['job_id'] for item in items], deadline)
+    with metrics.timer('Check'):
+        results = _check_jobs(items, infos, deadline)
+
+    pool_stats = utils.get_sds_pool_stats()
+    logger.info('SDS connections opened: %d; requests: %d',
+                pool_stats['connections'], pool_stats['requests'])
+
+    return record_statuses(results, now)
+
 
-    for item in event['jobs']:
+def record_statuses(results, now):
+    '''
+    Writes the status changes in a list of (item, info) tuples to the ingest
+    table and inserts the tiles of successful jobs. Returns a dict of
+    rescheduled job items by id(item) of the original item; finished jobs
+    and stale statuses map to None and jobs whose status or tile failed to
+    be written are omitted
+    '''
+    with metrics.timer('StatusWrite'):
+        failed_writes, stale_writes = _write_statuses([
+            (item, info) for item, info in results
+            if info['status'] != item.get('status')
+        ])
+
+    updates = {}
+    tiles = {}
+    for item, info in results:
+        metrics.count(f'Status:{info["status"]}')
+        if item['granule_id'] in failed_writes:
+            continue  # Recheck and rewrite on the next poll
+
+        if item['granule_id'] in stale_writes:
+            # The granule has moved on to another job or another status
+            updates[id(item)] = None
+        elif _is_finished(item, info, tiles):
+            updates[id(item)] = None
+        else:
+            updates[id(item)] = schedule.schedule_job(
+                item, info['status'], now, POLL_INTERVAL_SCALE
+            )
+
+    with metrics.timer('TileWrite'):
+        tiles_put = _put_tiles(tiles)
+
+    if tiles_put:
+        _clear_tiles_pending([
+            item['granule_id']
+            for tile_items in tiles.values() for item in tile_items
+        ])
+    else:
+        # Keep the jobs queued so that their tiles are retried
+        for tile_items in tiles.values():
+            for item in tile_items:
+                del updates[id(item)]
+
+    metrics.count('Checked', len(results))
+    metrics.count('WriteFailed', len(failed_writes))
+    metrics.count('Stale', len(stale_writes))
+    return updates
+
+
+def _pending_jobs(jobs, updates):
+    '''
+    Yields the jobs which remain queued, replaced by their updated items
+    '''
+    for item in jobs:
+        item = updates.get(id(item), item)
+        if item is not None:
+            yield item
+
+
+def _check_jobs(items, infos, deadline):
+    '''
+    Returns a list of (item, info) tuples for the jobs checked before the
+    deadline. Jobs missing from the bulk lookup are checked individually on a
+    pool of workers
+    '''
+    results = []
+    missing = []
+    for item in items:
+        info = infos.get(item['job_id'])
+        if info is None:
+            missing.append(item)
+        else:
+            results.append((item, info))
+
+    if len(missing) == 0:
+        return results
+
+    executor = ThreadPoolExecutor(max_workers=POLL_WORKERS)
+    checked = 0
+    try:
+        futures = {
+            executor.submit(_get_job_info, item['job_id']): item
+            for item in missing
+        }
+
+        for future in as_completed(futures, timeout=_time_left(deadline)):
+            item = futures[future]
+            checked += 1
+            try:
+                results.append((item, future.result()))
+            # Otello raises very generic exceptions
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Failed to get status: %s', item['job_id'])
+    except FutureTimeoutError:
+        logger.warning(
+            'Deadline reached; jobs left unchecked: %d',
+            len(missing) - checked
+        )
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
+
+
+def get_deadline(context):
+    '''
+    Returns the monotonic time by which a lambda should stop polling, or None
+    if there is no lambda context
+    '''
+    if context is None:
+        return None
+
+    remaining_ms = context.get_remaining_time_in_millis() - DEADLINE_MARGIN_MS
+    return monotonic() + remaining_ms / 1000
+
+
+def _time_left(deadline):
+    if deadline is None:
+        return None
+
+    return max(deadline - monotonic(), 0)
+
+
+def _get_job_info(job_id):
+    with metrics.timer('GetInfo'):
+        return utils.mozart_client.get_job_by_id(job_id).get_info()
+
+
+def _write_statuses(results):
+    '''
+    Writes job statuses to the ingest table with batched PartiQL updates,
+    along with the time jobs started or finished, as reported by Mozart or
+    else as seen by the poll, and, for completed granules with a tile, the
+    time their tile became pending. Updates are conditional on the granule
+    having the same job and still being in flight or already in the written
+    status, so that late or reordered statuses can't overwrite a newer job
+    or move a granule out of a final status, while a retried status, e.g. a
+    completion whose tile failed to be inserted, is still applied. Returns a
+    tuple of the ids of granules whose status failed to be written and of
+    those whose status was stale
+    '''
+    timestamp = datetime.now().isoformat()
+    table = utils.ingest_table
+    statements = []
+
+    for item, info in results:
         granule_id = item['granule_id']
-        job_id = item['job_id']
+        logger.debug('granule id: %s; job id: %s; status: %s',
+                     granule_id, item['job_id'], info['status'])
+
+        statement = f'UPDATE "{table.name}" SET "status" = ?' \
+            ' SET "last_check" = ?'
+        parameters = [info['status'], timestamp]
+
+        if 'traceback' in info:
+            statement += ' SET "traceback" = ?'
+            parameters.append(info['traceback'])
+
+        # Mozart's own times are used when known, as a job may have changed
+        # status long before it was polled
+        started_at = _job_time(info, 'time_start')
+        if info['status'] in sds_statuses.ACTIVE:
+            statement += ' SET "started_at" = ?'
+            parameters.append(started_at or timestamp)
+        elif info['status'] in sds_statuses.SUCCESS \
+                or info['status'] in sds_statuses.FAIL:
+            if started_at is not None:
+                # The job may have started and finished between polls
+                statement += ' SET "started_at" = ?'
+                parameters.append(started_at)
+
+            statement += ' SET "finished_at" = ?'
+            parameters.append(_job_time(info, 'time_end') or timestamp)
+
+        if info['status'] in sds_statuses.SUCCESS \
+                and extract_cpt(granule_id) is not None:
+            statement += f' SET "{TILE_PENDING_ATTRIBUTE}" = ?'
+            parameters.append(timestamp)
 
+        expected = list(schedule.IN_FLIGHT_STATUSES)
+        if info['status'] not in expected:
+            expected.append(info['status'])
+
+        statement += ' WHERE "granule_id" = ? AND "job_id" = ?' \
+            f' AND "status" IN [{", ".join("?" for _ in expected)}]'
+        parameters.extend([granule_id, item['job_id'], *expected])
+
+        statements.append((granule_id, {
+            'Statement': statement,
+            'Parameters': [serializer.serialize(value)
+                           for value in parameters]
+        }))
+
+    failed = set()
+    stale = set()
+    for i in range(0, len(statements), PARTIQL_BATCH_LIMIT):
+        batch = statements[i:i + PARTIQL_BATCH_LIMIT]
         try:
-            job = utils.mozart_client.get_job_by_id(job_id)
-            info = job.get_info()
-            status = info['status']
-            timestamp = datetime.now().isoformat()
-            logger.debug('granule id: %s; job id: %s; status: %s',
-                         granule_id, job_id, status)
-
-            update_expression = (
-                'SET #status = :status'
-                ',#last_check = :last_check'
+            responses = table.meta.client.batch_execute_statement(
+                Statements=[statement for _, statement in batch]
+            )['Responses']
+        except ClientError:
+            logger.exception('Failed to write statuses')
+            failed.update(granule_id for granule_id, _ in batch)
+            continue
+
+        for (granule_id, _), response in zip(batch, responses):
+            if 'Error' not in response:
+                continue
+
+            if response['Error'].get('Code') == 'ConditionalCheckFailed':
+                logger.info('Dropping stale status: %s', granule_id)
+                stale.add(granule_id)
+            else:
+                logger.error('Failed to write status: %s; error: %s',
+                             granule_id, response['Error'])
+                failed.add(granule_id)
+
+    return failed, stale
+
+
+def _job_time(info, key):
+    '''
+    Returns a time from a job's Mozart job info as a naive UTC ISO timestamp,
+    like the ingest table's, or None if it's missing or invalid
+    '''
+    try:
+        value = info['job']['job_info'][key]
+        job_time = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (KeyError, TypeError, AttributeError, ValueError):
+        return None
+
+    if job_time.tzinfo is not None:
+        job_time = job_time.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return job_time.isoformat()
+
+
+def _is_finished(item, info, tiles):
+    '''
+    Returns True if the job has reached a terminal status, adding the items
+    of successful jobs to tiles by tile id
+    '''
+    granule_id = item['granule_id']
+    job_id = item['job_id']
+    status = info['status']
+
+    if status in sds_statuses.FAIL:
+        logger.error('Job id: %s; status: %s', job_id, status)
+        if 'traceback' in info:
+            logger.error(
+                'Job id: %s; traceback: %s', job_id, info['traceback']
             )
-            expression_attribute_names = {
-                '#status': 'status',
-                '#last_check': 'last_check'
-            }
-            expression_attribute_values = {
-                ':status': status,
-                ':last_check': timestamp
-            }
-
-            if 'traceback' in info:
-                update_expression += ',#traceback = :traceback'
-                expression_attribute_names['#traceback'] = 'traceback'
-                expression_attribute_values[':traceback'] = info['traceback']
-
-            utils.ingest_table.update_item(
-                Key={'granule_id': granule_id},
-                UpdateExpression=update_expression,
-                ExpressionAttributeNames=expression_attribute_names,
-                ExpressionAttributeValues=expression_attribute_values
+
+        return True
+
+    if status in sds_statuses.SUCCESS:
+        logger.info('Job id: %s; status: %s', job_id, status)
+
+        cpt = extract_cpt(granule_id)
+        if cpt is None:
+            logger.error(
+                'CPT not found: granule_id=%s, job_id=%s',
+                granule_id, job_id
             )
+        else:
+            tile_id = f'{cpt["product"]},{cpt["cycle"]},{cpt["pass"]},{cpt["tile"]}'  # pylint: disable=line-too-long # noqa: E501
+            tiles.setdefault(tile_id, []).append(item)
 
-            if status in sds_statuses.FAIL:
-                logger.error('Job id: %s; status: %s', job_id, status)
-                if 'traceback' in info:
-                    logger.error(
-                        'Job id: %s; traceback: %s', job_id, info['traceback']
-                    )
-
-                new_event['jobs'].remove(item)
-            elif status in sds_statuses.SUCCESS:
-                logger.info('Job id: %s; status: %s', job_id, status)
-
-                # Insert into available tiles table
-                cpt = _extract_cpt(granule_id)
-                if cpt is None:
-                    logger.error(
-                        'CPT not found: granule_id=%s, job_id=%s',
-                        granule_id, job_id
-                    )
-                else:
-                    tile_id = f'{cpt["product"]},{cpt["cycle"]},{cpt["pass"]},{cpt["tile"]}'  # pylint: disable=line-too-long # noqa: E501
-                    utils.available_tiles_table.put_item(
-                        Item={'tile_id': tile_id}
-                    )
-
-                new_event['jobs'].remove(item)  # Remove from queue
-        # Otello raises very generic exceptions
-        except Exception:  # pylint: disable=broad-except
-            logger.exception('Failed to get status: %s', job_id)
-
-    return new_event
-
-
-def _extract_cpt(granule_id):
-    parsed_id = PRODUCT_REGEX.search(granule_id)
-    if parsed_id is None:
-        return None
+        return True
 
-    return {
-        'product': parsed_id.group('product'),
-        'cycle': str(int(parsed_id.group('cycle'))),
-        'pass': str(int(parsed_id.group('pass'))),
-        'tile': str(int(parsed_id.group('tile')))
-        + parsed_id.group('direction')
-    }
+    return False
+
+
+def _put_tiles(tile_ids):
+    '''
+    Inserts each tile into the available tiles table once. Returns False if
+    the tiles failed to be inserted
+    '''
+    if len(tile_ids) == 0:
+        return True
+
+    try:
+        with utils.available_tiles_table.batch_writer() as batch:
+            for tile_id in tile_ids:
+                batch.put_item(Item={'tile_id': tile_id})
+    except ClientError:
+        logger.exception('Failed to insert available tiles')
+        return False
+
+    return True
+
+
+def _clear_tiles_pending(granule_ids):
+    '''
+    Removes the pending tile attribute of granules whose tiles have been
+    inserted. Failures are only logged; the sweeper reinserts their tiles
+    '''
+    table = utils.ingest_table
+    statements = [{
+        'Statement': f'UPDATE "{table.name}"'
+                     f' REMOVE "{TILE_PENDING_ATTRIBUTE}"'
+                     ' WHERE "granule_id" = ?',
+        'Parameters': [serializer.serialize(granule_id)]
+    } for granule_id in granule_ids]
+
+    for i in range(0, len(statements), PARTIQL_BATCH_LIMIT):
+        batch = statements[i:i + PARTIQL_BATCH_LIMIT]
+        try:
+            responses = table.meta.client.batch_execute_statement(
+                Statements=batch
+            )['Responses']
+        except ClientError:
+            logger.exception('Failed to clear pending tiles')
+            continue
+
+        for statement, response in zip(batch, responses):
+            if 'Error' in response:
+                logger.warning(
+                    'Failed to clear pending tile: %s; error: %s',
+                    statement['Parameters'][0]['S'], response['Error']
+                )
+
+
+def _get_job_infos(job_ids, deadline):
+    '''
+    Retrieves job infos in bulk before the deadline; jobs missing from the
+    result are looked up individually by the caller
+    '''
+    if len(job_ids) == 0:
+        return {}
+
+    # Run on a worker so that a slow lookup can be abandoned at the deadline
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        future = executor.submit(utils.get_job_statuses, job_ids,
+                                 timeout=_time_left(deadline))
+        return future.result(timeout=_time_left(deadline))
+    except FutureTimeoutError:
+        logger.warning('Deadline reached during bulk job status lookup')
+        return {}
+    # Fall back to per-job lookups on any failure of the bulk query
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('Failed to get job statuses in bulk')
+        return {}
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,82 @@
+'''Submission priority of ingest granules'''
+import json
+from threading import Lock
+from podaac.swodlr_ingest_to_sds.products import extract_cpt
+from podaac.swodlr_ingest_to_sds.utilities import utils
+
+MIN_PRIORITY = 0
+MAX_PRIORITY = 9  # the range of Mozart job priorities
+PASSES_PER_CYCLE = 584
+
+PRODUCT_PRIORITIES = json.loads(
+    utils.get_param('priority_products') or '{"PIXC": 3, "PIXCVec": 3}'
+)
+DEFAULT_PRIORITY = int(utils.get_param('priority_default') or 0)
+RECENT_PASSES = int(
+    utils.get_param('priority_recent_passes') or PASSES_PER_CYCLE
+)
+RECENT_BOOST = int(utils.get_param('priority_recent_boost') or 3)
+
+
+class PriorityPolicy:
+    '''
+    Assigns Mozart job priorities to granules. A granule's priority is its
+    product's priority, raised by recent_boost if its cycle and pass are
+    within recent_passes of the newest seen, so that near real time granules
+    go ahead of reprocessing of old cycles. The newest cycle and pass is
+    kept across warm invocations. A priority requested in the granule's
+    message overrides the policy
+    '''
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, products=None, default=DEFAULT_PRIORITY,
+                 recent_passes=RECENT_PASSES, recent_boost=RECENT_BOOST):
+        self.products = PRODUCT_PRIORITIES if products is None else products
+        self.default = default
+        self.recent_passes = recent_passes
+        self.recent_boost = recent_boost
+
+        self._lock = Lock()
+        self._newest = None
+
+    def prioritize(self, granules):
+        '''
+        Sets the priority of each granule and returns the granules ordered
+        from highest to lowest priority, otherwise keeping their order
+        '''
+        cpts = {granule['id']: extract_cpt(granule['id'])
+                for granule in granules}
+        newest = self._observe(
+            _pass_ordinal(cpt) for cpt in cpts.values() if cpt is not None
+        )
+
+        for granule in granules:
+            cpt = cpts[granule['id']]
+            if granule.get('requested_priority') is not None:
+                priority = granule['requested_priority']
+            elif cpt is None:
+                priority = self.default
+            else:
+                priority = self.products.get(cpt['product'], self.default)
+                if newest - _pass_ordinal(cpt) < self.recent_passes:
+                    priority += self.recent_boost
+
+            granule['priority'] = min(MAX_PRIORITY,
+                                      max(MIN_PRIORITY, int(priority)))
+
+        return sorted(granules, key=lambda granule: -granule['priority'])
+
+    def _observe(self, ordinals):
+        with self._lock:
+            for ordinal in ordinals:
+                if self._newest is None or ordinal > self._newest:
+                    self._newest = ordinal
+
+            return self._newest
+
+
+def _pass_ordinal(cpt):
+    return int(cpt['cycle']) * PASSES_PER_CYCLE + int(cpt['pass'])
+
+
+priority_policy = PriorityPolicy()
@@ -0,0 +1,24 @@
+'''Parsing of SWOT product granule ids'''
+import re
+
+PRODUCT_REGEX = re.compile(
+    r'_(?P<product>PIXC(Vec)?)_(?P<cycle>\d{3})_(?P<pass>\d{3})_(?P<tile>\d{3})(?P<direction>(R|L))_'  # pylint: disable=line-too-long # noqa: E501
+)
+
+
+def extract_cpt(granule_id):
+    '''
+    Returns the product, cycle, pass and tile of a granule id, or None if
+    the granule id isn't a PIXC or PIXCVec granule
+    '''
+    parsed_id = PRODUCT_REGEX.search(granule_id)
+    if parsed_id is None:
+        return None
+
+    return {
+        'product': parsed_id.group('product'),
+        'cycle': str(int(parsed_id.group('cycle'))),
+        'pass': str(int(parsed_id.group('pass'))),
+        'tile': str(int(parsed_id.group('tile')))
+        + parsed_id.group('direction')
+    }
@@ -0,0 +1,118 @@
+'''Opt-in profiling of a sampled fraction of lambda invocations'''
+from datetime import datetime, timezone
+from functools import wraps
+import io
+from pathlib import Path
+import random
+from urllib.parse import urlsplit
+from uuid import uuid4
+import boto3
+from podaac.swodlr_ingest_to_sds.utilities import utils
+
+PROFILE_SAMPLE_RATE = float(utils.get_param('profile_sample_rate') or 0)
+PROFILE_OUTPUT = utils.get_param('profile_output') or '/tmp/profiles'
+LOCAL_DIR = '/tmp/profiles'  # staging directory for uploads to S3
+TOP_FUNCTIONS = 50
+TOP_ALLOCATIONS = 25
+
+logger = utils.get_logger(__name__)
+
+
+class Profiler:
+    '''
+    Profiles a sampled fraction of invocations with cProfile and tracemalloc
+    and writes the stats to a directory or an s3:// prefix: a .prof file of
+    the raw cProfile stats and a .txt report of the slowest functions and
+    largest allocations. With a sample rate of zero, handlers are left
+    undecorated
+    '''
+
+    def __init__(self, sample_rate=PROFILE_SAMPLE_RATE, output=PROFILE_OUTPUT):
+        self.sample_rate = sample_rate
+        self.output = output
+
+    def profile(self, function):
+        '''
+        Decorates a lambda handler to profile sampled invocations
+        '''
+        def decorator(handler):
+            if self.sample_rate <= 0:
+                return handler
+
+            @wraps(handler)
+            def wrapper(event, context):
+                if random.random() >= self.sample_rate:
+                    return handler(event, context)
+
+                return self._run(function, handler, event, context)
+
+            return wrapper
+
+        return decorator
+
+    def _run(self, function, handler, event, context):
+        # Imported here so that handlers don't load the profilers unless an
+        # invocation is sampled
+        # pylint: disable=import-outside-toplevel
+        import cProfile
+        import tracemalloc
+
+        profile = cProfile.Profile()
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+
+        try:
+            return profile.runcall(handler, event, context)
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            if not tracing:
+                tracemalloc.stop()
+
+            # Profiling must never fail the invocation
+            try:
+                self._write(function, context, profile, snapshot)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception('Failed to write profile')
+
+    def _write(self, function, context, profile, snapshot):
+        request_id = getattr(context, 'aws_request_id', None) or uuid4()
+        timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+        name = f'{function}-{timestamp}-{request_id}'
+
+        url = urlsplit(self.output)
+        directory = Path(LOCAL_DIR if url.scheme == 's3' else self.output)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        paths = [directory.joinpath(f'{name}.prof'),
+                 directory.joinpath(f'{name}.txt')]
+        profile.dump_stats(paths[0])
+        paths[1].write_text(_report(profile, snapshot), encoding='utf-8')
+
+        if url.scheme == 's3':
+            s3 = boto3.client('s3')
+            prefix = url.path.strip('/')
+            for path in paths:
+                key = f'{prefix}/{path.name}' if prefix else path.name
+                s3.upload_file(str(path), url.netloc, key)
+                path.unlink()
+
+        logger.info('Wrote profile: %s/%s', self.output.rstrip('/'), name)
+
+
+def _report(profile, snapshot):
+    # pylint: disable-next=import-outside-toplevel
+    import pstats
+
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+
+    stream.write(f'Top {TOP_ALLOCATIONS} allocations by line\n\n')
+    for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+        stream.write(f'{stat}\n')
+
+    return stream.getvalue()
+
+
+profiler = Profiler()
@@ -0,0 +1,103 @@
+'''Token bucket rate limiting shared across lambda instances'''
+from decimal import Decimal
+from math import floor
+from threading import Lock
+from time import time
+from botocore.exceptions import ClientError
+from podaac.swodlr_ingest_to_sds.utilities import utils
+
+MAX_ATTEMPTS = 5
+
+logger = utils.get_logger(__name__)
+
+
+class TokenBucket:
+    '''
+    Token bucket whose state is a single DynamoDB item, so that every lambda
+    instance draws from the same bucket. Tokens refill at `rate` per second
+    up to `burst`; refilling and taking tokens is one conditional update on
+    the time the item was last updated, retried if another instance updated
+    it first.
+
+    To cut round trips, up to `lease` tokens beyond what is asked for are
+    taken from the bucket and kept locally for later calls
+    '''
+
+    def __init__(self, table, bucket_id, rate, burst, lease=0, clock=time):
+        self.table = table
+        self.bucket_id = bucket_id
+        self.rate = rate
+        self.burst = burst
+        self.lease = lease
+        self.clock = clock
+
+        self._lock = Lock()
+        self._local_tokens = 0
+
+    def acquire(self, count):
+        '''
+        Takes up to `count` tokens. Returns the number of tokens taken, which
+        is less than `count` if the bucket is short
+        '''
+        with self._lock:
+            granted = min(count, self._local_tokens)
+            self._local_tokens -= granted
+
+            if granted < count:
+                wanted = count - granted
+                taken = self._take(wanted + self.lease)
+                granted += min(wanted, taken)
+                self._local_tokens += max(0, taken - wanted)
+
+            return granted
+
+    def _take(self, wanted):
+        for _ in range(MAX_ATTEMPTS):
+            item = self.table.get_item(
+                Key={'bucket_id': self.bucket_id},
+                ConsistentRead=True
+            ).get('Item')
+
+            now = self.clock()
+            if item is None:
+                tokens = self.burst
+            else:
+                elapsed = max(0, now - float(item['updated_at']))
+                tokens = min(
+                    self.burst, float(item['tokens']) + elapsed * self.rate
+                )
+
+            taken = min(wanted, floor(tokens))
+            try:
+                self._put(tokens - taken, now, item)
+            except ClientError as e:
+                if e.response['Error']['Code'] != \
+                        'ConditionalCheckFailedException':
+                    raise
+                logger.debug('Token bucket contended: %s', self.bucket_id)
+                continue
+
+            return taken
+
+        logger.warning('Token bucket still contended after %d attempts: %s',
+                       MAX_ATTEMPTS, self.bucket_id)
+        return 0
+
+    def _put(self, tokens, now, previous):
+        if previous is None:
+            condition = 'attribute_not_exists(bucket_id)'
+            values = {}
+        else:
+            condition = 'updated_at = :previous'
+            values = {':previous': previous['updated_at']}
+
+        self.table.update_item(
+            Key={'bucket_id': self.bucket_id},
+            UpdateExpression='SET tokens = :tokens, updated_at = :now',
+            ConditionExpression=condition,
+            ExpressionAttributeValues={
+                ':tokens': Decimal(str(round(tokens, 6))),
+                ':now': Decimal(str(round(now, 6))),
+                **values
+            }
+        )
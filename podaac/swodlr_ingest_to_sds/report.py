@@ -0,0 +1,95 @@
+'''Granule latency report over the ingest table'''
+from datetime import datetime
+from math import ceil
+from podaac.swodlr_ingest_to_sds.products import extract_cpt
+from podaac.swodlr_ingest_to_sds.scan import SCAN_SEGMENTS, parallel_scan
+
+PERCENTILES = (50, 90, 99)
+
+# Latency: (start timestamp, end timestamp)
+LATENCIES = {
+    'queue': ('submitted_at', 'started_at'),
+    'run': ('started_at', 'finished_at'),
+    'total': ('first_seen', 'finished_at')
+}
+TIMESTAMPS = sorted({key for keys in LATENCIES.values() for key in keys})
+
+
+def scan_transitions(table, segments=SCAN_SEGMENTS):
+    '''
+    Yields the transition timestamps of every submitted granule in the
+    ingest table using a parallel scan split into segments
+    '''
+    yield from parallel_scan(
+        table, segments,
+        FilterExpression='attribute_exists(submitted_at)',
+        ProjectionExpression=', '.join(['granule_id', *TIMESTAMPS])
+    )
+
+
+def latency_report(items):
+    '''
+    Returns the percentiles of each latency, in seconds, of the granules by
+    (product, cycle, day submitted). Granules which aren't PIXC or PIXCVec
+    granules are skipped
+    '''
+    groups = {}
+    for item in items:
+        cpt = extract_cpt(item['granule_id'])
+        if cpt is None:
+            continue
+
+        key = (cpt['product'], int(cpt['cycle']), item['submitted_at'][:10])
+        latencies = groups.setdefault(key, {name: [] for name in LATENCIES})
+        for name, (start, end) in LATENCIES.items():
+            if start in item and end in item:
+                latencies[name].append((
+                    datetime.fromisoformat(item[end])
+                    - datetime.fromisoformat(item[start])
+                ).total_seconds())
+
+    return {
+        key: {name: _percentiles(values) for name, values in latencies.items()}
+        for key, latencies in sorted(groups.items())
+    }
+
+
+def format_report(report):
+    '''
+    Formats a latency report as a table, one row per group
+    '''
+    columns = [
+        f'{name}_p{percentile}'
+        for name in LATENCIES for percentile in PERCENTILES
+    ]
+    header = ['product', 'cycle', 'day', 'count', *columns]
+    rows = [header]
+
+    for (product, cycle, day), latencies in report.items():
+        row = [product, str(cycle), day,
+               str(max(stats['count'] for stats in latencies.values()))]
+        for name in LATENCIES:
+            for percentile in PERCENTILES:
+                value = latencies[name].get(f'p{percentile}')
+                row.append('-' if value is None else f'{value:.0f}')
+        rows.append(row)
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return '\n'.join(
+        '  '.join(value.rjust(width) for value, width in zip(row, widths))
+        for row in rows
+    )
+
+
+def _percentiles(values):
+    '''
+    Returns the count and nearest-rank percentiles of values
+    '''
+    values = sorted(values)
+    stats = {'count': len(values)}
+    if values:
+        for percentile in PERCENTILES:
+            rank = max(1, ceil(percentile / 100 * len(values)))
+            stats[f'p{percentile}'] = values[rank - 1]
+
+    return stats
@@ -0,0 +1,92 @@
+'''Recovery of failed and stuck granules in the ingest table'''
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from botocore.exceptions import ClientError
+from podaac.swodlr_ingest_to_sds.scan import SCAN_SEGMENTS, parallel_scan
+from podaac.swodlr_ingest_to_sds.schedule import IN_FLIGHT_STATUSES
+
+# Status in-flight granules are released to before being requeued, so that
+# submit_to_sds doesn't skip them as already being ingested
+RELEASED_STATUS = 'job-requeued'
+RELEASE_WORKERS = 16
+
+
+def scan_ingest_table(table, statuses, checked_before=None,
+                      segments=SCAN_SEGMENTS):
+    '''
+    Returns the items in the ingest table in one of the statuses, and last
+    checked before a timestamp if one is given, using a parallel scan split
+    into segments
+    '''
+    status_values = {
+        f':status{i}': {'S': status} for i, status in enumerate(statuses)
+    }
+    filter_expression = f'#status IN ({", ".join(status_values)})'
+    values = dict(status_values)
+
+    if checked_before is not None:
+        filter_expression += ' AND #last_check < :checked_before'
+        values[':checked_before'] = {'S': checked_before}
+
+    return list(parallel_scan(
+        table, segments,
+        FilterExpression=filter_expression,
+        ProjectionExpression='granule_id, s3_url, #status, #last_check',
+        ExpressionAttributeNames={
+            '#status': 'status',
+            '#last_check': 'last_check'
+        },
+        ExpressionAttributeValues=values
+    ))
+
+
+def release_granules(table, items, workers=RELEASE_WORKERS):
+    '''
+    Moves in-flight items to the released status, conditional on them not
+    having changed since they were scanned, on a pool of workers. Returns
+    the items which can be requeued, in order: every item not in flight and
+    every in-flight item released
+    '''
+    in_flight = [item for item in items
+                 if item['status'] in IN_FLIGHT_STATUSES]
+    if len(in_flight) == 0:
+        return list(items)
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(in_flight))) \
+            as executor:
+        released = dict(zip(
+            (id(item) for item in in_flight),
+            executor.map(partial(_release_granule, table), in_flight)
+        ))
+
+    return [item for item in items if released.get(id(item), True)]
+
+
+def _release_granule(table, item):
+    '''
+    Returns False if the item changed since it was scanned. Uses the client
+    rather than the table resource, which isn't thread safe
+    '''
+    try:
+        table.meta.client.update_item(
+            TableName=table.name,
+            Key={'granule_id': {'S': item['granule_id']}},
+            UpdateExpression='SET #status = :released',
+            ConditionExpression='#status = :status AND '
+                                '#last_check = :last_check',
+            ExpressionAttributeNames={
+                '#status': 'status',
+                '#last_check': 'last_check'
+            },
+            ExpressionAttributeValues={
+                ':released': {'S': RELEASED_STATUS},
+                ':status': {'S': item['status']},
+                ':last_check': {'S': item['last_check']}
+            }
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+
+    return True
@@ -0,0 +1,48 @@
+'''Parallel scans of DynamoDB tables'''
+from queue import Queue
+from threading import Thread
+from boto3.dynamodb.types import TypeDeserializer
+
+SCAN_SEGMENTS = 8
+
+deserializer = TypeDeserializer()
+
+
+def parallel_scan(table, segments=SCAN_SEGMENTS, **kwargs):
+    '''
+    Yields the deserialized items of a table as they are scanned, with the
+    scan split into segments which are paginated in parallel. Keyword
+    arguments are passed to each Scan call
+    '''
+    pages = Queue(maxsize=segments * 2)
+    done = object()
+
+    def _scan(segment):
+        try:
+            paginator = table.meta.client.get_paginator('scan')
+            for page in paginator.paginate(
+                TableName=table.name,
+                Segment=segment,
+                TotalSegments=segments,
+                **kwargs
+            ):
+                pages.put(page['Items'])
+        except Exception as e:  # pylint: disable=broad-except
+            pages.put(e)  # Reraised by the consumer
+        finally:
+            pages.put(done)
+
+    for segment in range(segments):
+        Thread(target=_scan, args=(segment,), daemon=True).start()
+
+    remaining = segments
+    while remaining > 0:
+        page = pages.get()
+        if page is done:
+            remaining -= 1
+        elif isinstance(page, Exception):
+            raise page
+        else:
+            for item in page:
+                yield {key: deserializer.deserialize(value)
+                       for key, value in item.items()}
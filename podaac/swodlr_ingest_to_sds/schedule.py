@@ -0,0 +1,65 @@
+'''Adaptive polling schedule for SDS jobs'''
+from math import ceil
+from podaac.swodlr_common import sds_statuses
+
+# Status: (initial interval, max interval) in seconds
+INTERVALS = {
+    **{status: (60, 900) for status in sds_statuses.QUEUED},
+    **{status: (30, 300) for status in sds_statuses.ACTIVE}
+}
+DEFAULT_INTERVAL = (60, 600)
+IN_FLIGHT_STATUSES = tuple(INTERVALS)
+
+INITIAL_WAIT = 60
+MIN_WAIT = 10
+MAX_WAIT = 900
+
+
+def schedule_job(item, status, now, scale=1):
+    '''
+    Returns a copy of a job's item with its latest status and the time of its
+    next check. The interval between checks doubles the longer the job stays
+    in the same status, up to the status's max interval; scale stretches the
+    whole schedule, e.g. when polling only backs up status notifications
+    '''
+    item = dict(item)
+    if item.get('status') != status or 'status_since' not in item:
+        item['status'] = status
+        item['status_since'] = int(now)
+
+    elapsed = now - item['status_since']
+    interval = next_interval(status, elapsed / scale) * scale
+    item['next_check'] = int(now + interval)
+    return item
+
+
+def next_interval(status, elapsed):
+    '''
+    Returns the largest doubling of the status's initial interval that does
+    not exceed the time the job has been in the status, capped at the
+    status's max interval
+    '''
+    interval, max_interval = INTERVALS.get(status, DEFAULT_INTERVAL)
+    while interval < max_interval and interval * 2 <= elapsed:
+        interval *= 2
+
+    return min(interval, max_interval)
+
+
+def is_due(item, now):
+    '''
+    Returns whether a job should be checked; jobs which have never been
+    checked are always due
+    '''
+    return item.get('next_check', 0) <= now
+
+
+def wait_seconds(jobs, now):
+    '''
+    Returns how long to wait until the next job is due to be checked
+    '''
+    if len(jobs) == 0:
+        return MIN_WAIT
+
+    next_check = min(item.get('next_check', 0) for item in jobs)
+    return min(max(ceil(next_check - now), MIN_WAIT), MAX_WAIT)
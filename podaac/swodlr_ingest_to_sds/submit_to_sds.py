@@ -1,88 +1,535 @@
 '''Lambda to submit granules to the SDS for ingestion'''
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import json
+from math import ceil
 from pathlib import PurePath
+import random
+from threading import Lock
+from time import sleep, time
 from urllib.parse import urlsplit, urlunsplit
 import boto3
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
 from podaac.swodlr_common import sds_statuses
+from podaac.swodlr_ingest_to_sds import payload, schedule
 from podaac.swodlr_ingest_to_sds.errors import DataNotFoundError
+from podaac.swodlr_ingest_to_sds.job_types import (
+    CACHE_DIR, DEFAULT_TTL, INGEST_JOB_NAME, INGEST_TAG_PREFIX, JobTypeCache
+)
+from podaac.swodlr_ingest_to_sds.message_attributes import (
+    PRIORITY_ATTRIBUTE, REQUEUE_COUNT_ATTRIBUTE
+)
+from podaac.swodlr_ingest_to_sds.metrics import metrics
+from podaac.swodlr_ingest_to_sds.priority import priority_policy
+from podaac.swodlr_ingest_to_sds.profiling import profiler
+from podaac.swodlr_ingest_to_sds.rate_limit import TokenBucket
+from podaac.swodlr_ingest_to_sds.requeue import RELEASED_STATUS
 from podaac.swodlr_ingest_to_sds.utilities import utils
 
 ACCEPTED_EXTS = ['nc']
 INGEST_QUEUE_URL = utils.get_param('ingest_queue_url')
 INGEST_TABLE_NAME = utils.get_param('ingest_table_name')
+SUBMIT_WORKERS = int(utils.get_param('submit_workers') or 1)
+POLLING_MODE = utils.get_param('polling_mode') or 'execution'
+
+BATCH_GET_LIMIT = 100
+LOOKUP_WORKERS = 4
+LOOKUP_MAX_ATTEMPTS = 6
+LOOKUP_BACKOFF_BASE = 0.05  # seconds
+LOOKUP_BACKOFF_CAP = 2      # seconds
+
+# Status an ingest table item is put in while its granule is being submitted;
+# claims older than the timeout are assumed to be abandoned
+CLAIM_STATUS = 'submitting'
+CLAIM_TIMEOUT = timedelta(minutes=15)
+
+# Granules submitted by this sandbox, kept across warm invocations
+RECENT_MAX_SIZE = int(utils.get_param('recent_cache_size') or 10000)
+RECENT_TTL = 3600  # seconds
+
+# Records whose submission failed are requeued to the ingest queue with a
+# delay, up to a max number of times
+REQUEUE_MAX = int(utils.get_param('requeue_max') or 5)
+REQUEUE_DELAY = 300  # seconds
+SEND_BATCH_LIMIT = 10
+MAX_DELAY = 900  # seconds; the most SQS allows
+
+# Submissions per second across all instances; granules over the limit are
+# deferred to the ingest queue. The limit is disabled if no rate is set
+SUBMIT_RATE = float(utils.get_param('submit_rate') or 0)
+SUBMIT_BURST = int(utils.get_param('submit_burst') or 100)
+SUBMIT_RATE_LEASE = int(utils.get_param('submit_rate_lease') or 10)
 
 dynamodb = boto3.client('dynamodb')
 sqs = boto3.client('sqs')
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
 
 logger = utils.get_logger(__name__)
-ingest_job_type = utils.mozart_client.get_job_type(
-    utils.get_latest_job_version('job-INGEST_STAGED')
+ingest_job_types = JobTypeCache(
+    INGEST_JOB_NAME,
+    ttl=int(utils.get_param('job_type_ttl') or DEFAULT_TTL),
+    cache_path=CACHE_DIR.joinpath('swodlr-ingest-to-sds-job-types.json')
 )
-ingest_job_type.initialize()
+submit_limiter = TokenBucket(
+    utils.rate_limit_table, 'submit_to_sds',
+    rate=SUBMIT_RATE, burst=SUBMIT_BURST, lease=SUBMIT_RATE_LEASE
+) if SUBMIT_RATE > 0 else None
+recent_granules = OrderedDict()
+recent_granules_lock = Lock()
 
 
+@metrics.instrument('submit_to_sds')
+@profiler.profile('submit_to_sds')
 def lambda_handler(event, _context):
     '''
     Lambda handler which submits granules to the SDS for ingestion if they are
-    not already ingested and inserts the granule and job info into DynamoDB
+    not already ingested or being ingested and inserts the granule and job
+    info into DynamoDB
     '''
 
     logger.debug('Records received: %d', len(event['Records']))
 
     granules = {}
-    for record in event['Records']:
-        try:
-            granule = _parse_record(record)
-            granules[granule['id']] = granule
-        except (DataNotFoundError, json.JSONDecodeError):
-            logger.exception('Failed to parse record')
-
-    lookup_results = dynamodb.batch_get_item(
-        RequestItems={
-            INGEST_TABLE_NAME: {
-                'Keys': [{'granule_id': {'S': granule['id']}}
-                         for granule in granules.values()],
-                'ProjectionExpression': 'granule_id, #status',
-                'ExpressionAttributeNames': {'#status': 'status'}
-            }
-        },
-        ReturnConsumedCapacity='NONE'
+    records = {}
+    poison = 0
+    with metrics.timer('Parse'):
+        for record in event['Records']:
+            try:
+                granule = _parse_record(record)
+                granules[granule['id']] = granule
+                records.setdefault(granule['id'], []).append(record)
+            except (DataNotFoundError, json.JSONDecodeError, KeyError,
+                    TypeError):
+                # Redelivering these won't help, so they're dropped
+                logger.exception('Failed to parse record: %s',
+                                 record.get('messageId'))
+                poison += 1
+
+    with metrics.timer('Lookup'):
+        statuses, consumed_capacity, unprocessed = \
+            _lookup_statuses(list(granules))
+    logger.info(
+        'Ingest table lookups: %d calls, %.1f capacity units consumed',
+        len(consumed_capacity),
+        sum(capacity.get('CapacityUnits', 0)
+            for capacity in consumed_capacity)
     )
 
-    for item in lookup_results['Responses'][INGEST_TABLE_NAME]:
-        granule_id = item['granule_id']['S']
-        status = item['status']['S']
-        if granule_id in granules and status in sds_statuses.SUCCESS:
+    failed = []
+    for granule_id in list(granules):
+        status = statuses.get(granule_id)
+        if granule_id in unprocessed:
+            # Its status is unknown, so submitting it could duplicate a job
+            logger.warning('Granule status lookup failed: %s', granule_id)
+            failed.extend(records[granule_id])
+            del granules[granule_id]
+        elif status in sds_statuses.SUCCESS:
             logger.info('Granule already ingested: %s', granule_id)
+            metrics.count('AlreadyIngested')
+            del granules[granule_id]
+        elif status in schedule.IN_FLIGHT_STATUSES:
+            logger.info('Granule already being ingested: %s', granule_id)
+            metrics.count('InFlight')
+            del granules[granule_id]
+        elif status in sds_statuses.FAIL or status == RELEASED_STATUS:
+            # Requeued after failing, so it must be resubmitted even if this
+            # sandbox submitted it recently
+            _forget_submitted(granule_id)
+        elif _recently_submitted(granule_id):
+            logger.info('Granule recently submitted: %s', granule_id)
+            metrics.count('RecentlySubmitted')
             del granules[granule_id]
 
+    # Highest priority first, so that granules over the rate limit are the
+    # least urgent
+    granules = priority_policy.prioritize(list(granules.values()))
+    granted = _acquire_submissions(len(granules))
+    granules, deferred = granules[:granted], granules[granted:]
+
     jobs = []
-    with utils.ingest_table.batch_writer() as batch:
-        for granule in granules.values():
-            try:
-                job = _ingest_granule(granule)
-                jobs.append({
-                    'granule_id': granule['id'],
-                    'job_id': job['job_id']
-                })
-
-                batch.put_item(
-                    Item={
-                        'granule_id': granule['id'],
-                        's3_url': granule['s3_url'],
-                        'job_id':  job['job_id'],
-                        'status': job['status'],
-                        'last_check': job['timestamp']
-                    }
-                )
-            # Otello throws generic Exceptions
-            except Exception:  # pylint: disable=broad-exception-caught
-                logger.exception(
-                    'Failed to ingest granule id: %s', granule['id']
-                )
-
-    return {'jobs': jobs}
+    items = []
+    with metrics.timer('Submit'):
+        for granule, job, error in _submit_granules(granules):
+            if error:
+                failed.extend(records[granule['id']])
+                continue
+
+            if job is None:
+                continue
+
+            jobs.append({
+                'granule_id': granule['id'],
+                'job_id': job['job_id'],
+                'status': job['status']
+            })
+            items.append({
+                'granule_id': granule['id'],
+                's3_url': granule['s3_url'],
+                'job_id':  job['job_id'],
+                'status': job['status'],
+                'last_check': job['timestamp'],
+                'first_seen': job['first_seen'],
+                'submitted_at': job['timestamp']
+            })
+
+    with metrics.timer('IngestWrite'), \
+            utils.ingest_table.batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+
+    pool_stats = utils.get_sds_pool_stats()
+    logger.info('SDS connections opened: %d; requests: %d',
+                pool_stats['connections'], pool_stats['requests'])
+
+    # Spread deferred granules out at the submission rate
+    deferrals, unsent = _requeue_records([
+        (records[granule['id']][0],
+         min(MAX_DELAY, ceil((i + 1) / SUBMIT_RATE)))
+        for i, granule in enumerate(deferred)
+    ], retry=False) if deferred else (0, [])
+    # Deferred records which failed to be sent are retried as failures
+    failed.extend(unsent)
+    requeued, lost = _requeue_records(
+        [(record, REQUEUE_DELAY) for record in failed]
+    ) if failed else (0, [])
+
+    logger.info('Records: %d; submitted: %d; poison: %d; failed: %d; '
+                'requeued: %d; deferred: %d', len(event['Records']),
+                len(jobs), poison, len(failed), requeued, deferrals)
+    metrics.count('Records', len(event['Records']))
+    metrics.count('Submitted', len(jobs))
+    metrics.count('Poison', poison)
+    metrics.count('Failed', len(failed))
+    metrics.count('Requeued', requeued)
+    metrics.count('RequeueFailed', len(lost))
+    metrics.count('Deferred', deferrals)
+
+    if POLLING_MODE == 'sweeper':
+        # Jobs are polled from the ingest table by the sweeper lambda
+        jobs = []
+
+    return {
+        **payload.encode_job_set(jobs),
+        'wait_seconds': schedule.INITIAL_WAIT
+    }
+
+
+def _lookup_statuses(granule_ids):
+    '''
+    Looks up the statuses of granules in the ingest table, BATCH_GET_LIMIT
+    keys per BatchGetItem call with the calls made concurrently. Returns a
+    tuple of a dict of granule id to status, a list of the consumed capacity
+    reported by each call, and a set of the granule ids which were still
+    unprocessed after LOOKUP_MAX_ATTEMPTS
+    '''
+    chunks = [
+        granule_ids[i:i + BATCH_GET_LIMIT]
+        for i in range(0, len(granule_ids), BATCH_GET_LIMIT)
+    ]
+    statuses = {}
+    consumed_capacity = []
+    unprocessed = set()
+
+    if len(chunks) == 0:
+        return statuses, consumed_capacity, unprocessed
+
+    workers = min(LOOKUP_WORKERS, len(chunks))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk_statuses, chunk_capacity, chunk_unprocessed in \
+                executor.map(_lookup_statuses_chunk, chunks):
+            statuses.update(chunk_statuses)
+            consumed_capacity.extend(chunk_capacity)
+            unprocessed.update(chunk_unprocessed)
+
+    return statuses, consumed_capacity, unprocessed
+
+
+def _lookup_statuses_chunk(granule_ids):
+    request_items = {
+        INGEST_TABLE_NAME: {
+            'Keys': [{'granule_id': {'S': granule_id}}
+                     for granule_id in granule_ids],
+            'ProjectionExpression': 'granule_id, #status',
+            'ExpressionAttributeNames': {'#status': 'status'}
+        }
+    }
+    statuses = {}
+    consumed_capacity = []
+
+    for attempt in range(LOOKUP_MAX_ATTEMPTS):
+        if attempt > 0:
+            # Exponential backoff with full jitter
+            sleep(random.uniform(0, min(
+                LOOKUP_BACKOFF_CAP, LOOKUP_BACKOFF_BASE * 2 ** attempt
+            )))
+
+        with metrics.timer('BatchGetItem'):
+            results = dynamodb.batch_get_item(
+                RequestItems=request_items,
+                ReturnConsumedCapacity='TOTAL'
+            )
+
+        for item in results['Responses'].get(INGEST_TABLE_NAME, []):
+            statuses[item['granule_id']['S']] = item['status']['S']
+        consumed_capacity.extend(results.get('ConsumedCapacity', []))
+
+        request_items = results.get('UnprocessedKeys')
+        if not request_items:
+            return statuses, consumed_capacity, []
+
+    unprocessed = [key['granule_id']['S']
+                   for key in request_items[INGEST_TABLE_NAME]['Keys']]
+    logger.warning(
+        'Ingest table lookup incomplete after %d attempts; unprocessed: %d',
+        LOOKUP_MAX_ATTEMPTS, len(unprocessed)
+    )
+    return statuses, consumed_capacity, unprocessed
+
+
+def _submit_granules(granules):
+    '''
+    Submits granules to the SDS, concurrently when more than one submit worker
+    is configured. Yields (granule, job, error) tuples in the order of
+    `granules`; job is None if the granule was claimed by another submission
+    or the submission failed, in which case error is True
+    '''
+    workers = min(SUBMIT_WORKERS, len(granules))
+    if workers <= 1:
+        for granule in granules:
+            yield (granule, *_try_ingest_granule(granule))
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for granule, result in zip(
+            granules, executor.map(_try_ingest_granule, granules)
+        ):
+            yield (granule, *result)
+
+
+def _try_ingest_granule(granule):
+    try:
+        claim = _claim_granule(granule)
+    except ClientError:
+        logger.exception('Failed to claim granule id: %s', granule['id'])
+        return None, True
+
+    if claim is None:
+        logger.info('Granule claimed by another submission: %s', granule['id'])
+        metrics.count('Claimed')
+        return None, False
+
+    try:
+        job = _ingest_granule(granule)
+    # Otello throws generic Exceptions
+    except Exception:  # pylint: disable=broad-exception-caught
+        logger.exception('Failed to ingest granule id: %s', granule['id'])
+        _release_granule(granule, claim)
+        return None, True
+
+    _remember_submitted(granule['id'])
+    timestamp, previous = claim
+    job['first_seen'] = (previous or {}).get('first_seen', timestamp)
+    return job, False
+
+
+def _acquire_submissions(count):
+    '''
+    Returns how many of `count` granules may be submitted now under the
+    submission rate limit
+    '''
+    if submit_limiter is None or count == 0:
+        return count
+
+    try:
+        return submit_limiter.acquire(count)
+    except ClientError:
+        # Failing open keeps ingestion going if the limiter is unavailable
+        logger.exception('Failed to acquire submission tokens')
+        return count
+
+
+def _requeue_records(records, retry=True):
+    '''
+    Sends (record, delay) tuples back to the ingest queue, SEND_BATCH_LIMIT
+    per call. Records being retried have their requeue count incremented and
+    are dropped once they have been requeued REQUEUE_MAX times. Returns a
+    tuple of the number of records requeued and the records which failed to
+    be sent
+    '''
+    entries = []
+    sending = []
+    for record, delay in records:
+        requeue_count = record.get(REQUEUE_COUNT_ATTRIBUTE, 0)
+        if retry:
+            requeue_count += 1
+        if requeue_count > REQUEUE_MAX:
+            logger.error('Dropping record after %d requeues: %s',
+                         REQUEUE_MAX, record['messageId'])
+            continue
+
+        attributes = {
+            REQUEUE_COUNT_ATTRIBUTE: {
+                'DataType': 'Number',
+                'StringValue': str(requeue_count)
+            }
+        }
+        if record.get(PRIORITY_ATTRIBUTE) is not None:
+            attributes[PRIORITY_ATTRIBUTE] = {
+                'DataType': 'Number',
+                'StringValue': str(record[PRIORITY_ATTRIBUTE])
+            }
+
+        entries.append({
+            'Id': str(len(entries)),
+            'MessageBody': record['body'],
+            'DelaySeconds': delay,
+            'MessageAttributes': attributes
+        })
+        sending.append(record)
+
+    requeued = 0
+    unsent = []
+    for i in range(0, len(entries), SEND_BATCH_LIMIT):
+        chunk = entries[i:i + SEND_BATCH_LIMIT]
+        try:
+            result = sqs.send_message_batch(
+                QueueUrl=INGEST_QUEUE_URL, Entries=chunk
+            )
+        except ClientError:
+            logger.exception('Failed to requeue records: %d', len(chunk))
+            unsent.extend(sending[i:i + SEND_BATCH_LIMIT])
+            continue
+
+        for failure in result.get('Failed', []):
+            logger.error('Failed to requeue record: %s',
+                         failure.get('Message'))
+            unsent.append(sending[int(failure['Id'])])
+        requeued += len(chunk) - len(result.get('Failed', []))
+
+    return requeued, unsent
+
+
+def _claim_granule(granule):
+    '''
+    Claims a granule for submission by conditionally putting its ingest table
+    item in the claim status, so that concurrent or redelivered submissions
+    of the same granule don't reach the SDS. Returns a tuple of the claim's
+    timestamp and the item it replaced, or None if the granule is already
+    ingested, being ingested, or freshly claimed
+    '''
+    now = datetime.now()
+    timestamp = now.isoformat()
+    taken_statuses = [*sds_statuses.SUCCESS, *schedule.IN_FLIGHT_STATUSES]
+    taken_values = {
+        f':taken{i}': status for i, status in enumerate(taken_statuses)
+    }
+
+    # Runs on the submit workers, so uses the client rather than the shared
+    # table resource, which isn't thread safe
+    try:
+        result = dynamodb.update_item(
+            TableName=INGEST_TABLE_NAME,
+            Key={'granule_id': {'S': granule['id']}},
+            UpdateExpression='SET #status = :claim, #last_check = :now, '
+                             's3_url = :s3_url, '
+                             'first_seen = if_not_exists(first_seen, :now)',
+            ConditionExpression=(
+                'attribute_not_exists(granule_id) OR ('
+                f'NOT #status IN ({", ".join(taken_values)}) AND NOT ('
+                '#status = :claim AND #last_check > :stale))'
+            ),
+            ExpressionAttributeNames={
+                '#status': 'status',
+                '#last_check': 'last_check'
+            },
+            ExpressionAttributeValues={
+                key: serializer.serialize(value) for key, value in {
+                    ':claim': CLAIM_STATUS,
+                    ':now': timestamp,
+                    ':s3_url': granule['s3_url'],
+                    ':stale': (now - CLAIM_TIMEOUT).isoformat(),
+                    **taken_values
+                }.items()
+            },
+            ReturnValues='ALL_OLD'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        raise
+
+    previous = result.get('Attributes')
+    if previous is not None:
+        previous = {key: deserializer.deserialize(value)
+                    for key, value in previous.items()}
+
+    return timestamp, previous
+
+
+def _release_granule(granule, claim):
+    '''
+    Restores the ingest table item a claim replaced, if the claim is still
+    held, so that the granule can be resubmitted
+    '''
+    timestamp, previous = claim
+    condition = {
+        'ConditionExpression': '#status = :claim AND #last_check = :now',
+        'ExpressionAttributeNames': {
+            '#status': 'status',
+            '#last_check': 'last_check'
+        },
+        'ExpressionAttributeValues': {
+            ':claim': {'S': CLAIM_STATUS},
+            ':now': {'S': timestamp}
+        }
+    }
+
+    try:
+        if previous:
+            dynamodb.put_item(
+                TableName=INGEST_TABLE_NAME,
+                Item={key: serializer.serialize(value)
+                      for key, value in previous.items()},
+                **condition
+            )
+        else:
+            dynamodb.delete_item(
+                TableName=INGEST_TABLE_NAME,
+                Key={'granule_id': {'S': granule['id']}}, **condition
+            )
+    except ClientError:
+        logger.exception('Failed to release claim on granule id: %s',
+                         granule['id'])
+
+
+def _recently_submitted(granule_id):
+    with recent_granules_lock:
+        submitted_at = recent_granules.get(granule_id)
+        if submitted_at is None:
+            return False
+
+        if time() - submitted_at > RECENT_TTL:
+            del recent_granules[granule_id]
+            return False
+
+        recent_granules.move_to_end(granule_id)
+        return True
+
+
+def _forget_submitted(granule_id):
+    with recent_granules_lock:
+        recent_granules.pop(granule_id, None)
+
+
+def _remember_submitted(granule_id):
+    with recent_granules_lock:
+        recent_granules[granule_id] = time()
+        recent_granules.move_to_end(granule_id)
+        while len(recent_granules) > RECENT_MAX_SIZE:
+            recent_granules.popitem(last=False)
 
 
 def _parse_record(record):
@@ -93,7 +540,8 @@ def _parse_record(record):
     return {
         'id': identifier,
         'filename': filename,
-        's3_url': s3_url
+        's3_url': s3_url,
+        'requested_priority': record.get(PRIORITY_ATTRIBUTE)
     }
 
 
@@ -104,14 +552,16 @@ def _ingest_granule(granule):
     logger.debug('Ingesting granule id: %s', granule['id'])
 
     job_params = _gen_mozart_job_params(filename, s3_url)
-    tag = f'ingest_file_otello__{filename}'
+    tag = f'{INGEST_TAG_PREFIX}{filename}'
 
-    ingest_job_type.set_input_params(job_params)
-    job = ingest_job_type.submit_job(tag=tag)
+    with ingest_job_types.checkout() as job_type:
+        job_type.set_input_params(job_params)
+        with metrics.timer('SubmitJob'):
+            job = job_type.submit_job(priority=granule['priority'], tag=tag)
     timestamp = datetime.now().isoformat()
     logger.info(
-        'Submitted to sds - granule id: %s, job id: %s',
-        granule['id'], job.job_id
+        'Submitted to sds - granule id: %s, job id: %s, priority: %d',
+        granule['id'], job.job_id, granule['priority']
     )
 
     return {
@@ -0,0 +1,156 @@
+'''
+Lambda to poll the SDS for the status of every in-flight job in the ingest
+table on a schedule, as an alternative to each step function execution
+polling its own jobs
+'''
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from time import time
+from boto3.dynamodb.types import TypeDeserializer
+from podaac.swodlr_common import sds_statuses
+from podaac.swodlr_ingest_to_sds import poll_status
+from podaac.swodlr_ingest_to_sds.metrics import metrics
+from podaac.swodlr_ingest_to_sds.profiling import profiler
+from podaac.swodlr_ingest_to_sds.schedule import IN_FLIGHT_STATUSES
+from podaac.swodlr_ingest_to_sds.utilities import utils
+
+STATUS_INDEX = utils.get_param('ingest_status_index') or 'status-last_check'
+
+# Boundaries of the last_check ranges each status is queried in parallel
+# over, as ages from the current time
+SEGMENT_AGES = (timedelta(days=7), timedelta(days=1), timedelta(hours=1))
+
+# How far back completed granules are checked for tiles which failed to be
+# inserted
+TILE_RETRY_AGE = timedelta(days=7)
+
+logger = utils.get_logger(__name__)
+deserializer = TypeDeserializer()
+
+
+@metrics.instrument('sweeper')
+@profiler.profile('sweeper')
+def lambda_handler(_event, context):
+    '''
+    Queries the ingest table for jobs in a non-terminal status, polls the
+    SDS for their status in one pass, and updates the ingest table. Tiles of
+    completed granules which failed to be inserted are inserted again
+    '''
+    with metrics.timer('Query'):
+        items = query_in_flight()
+        pending = query_tiles_pending()
+    updates = poll_status.poll_jobs(
+        items, poll_status.get_deadline(context), time()
+    )
+
+    # Their status is unchanged, so only their tiles are written
+    retried = poll_status.record_statuses(
+        [(item, {'status': item['status']}) for item in pending], time()
+    )
+
+    finished = sum(1 for item in updates.values() if item is None)
+    logger.info('In-flight jobs: %d; checked: %d; finished: %d; '
+                'tiles retried: %d', len(items), len(updates), finished,
+                len(retried))
+
+    return {
+        'in_flight': len(items),
+        'checked': len(updates),
+        'finished': finished,
+        'tiles_retried': len(retried)
+    }
+
+
+def query_in_flight():
+    '''
+    Returns the granule id, job id and status of every in-flight job by
+    querying the status index in parallel, one query per status and
+    last_check range
+    '''
+    segments = [
+        (status, key_condition)
+        for status in IN_FLIGHT_STATUSES
+        for key_condition in _key_conditions(datetime.now())
+    ]
+
+    statuses, key_conditions = zip(*segments)
+
+    items = {}
+    with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+        for segment_items in executor.map(_query, statuses, key_conditions):
+            for item in segment_items:
+                # Segments share their boundaries, so dedupe by granule
+                items[item['granule_id']] = item
+
+    return list(items.values())
+
+
+def query_tiles_pending():
+    '''
+    Returns the granule id, job id and status of every granule completed
+    within TILE_RETRY_AGE whose tile is still pending
+    '''
+    start = (datetime.now() - TILE_RETRY_AGE).isoformat()
+    key_condition = ('#last_check >= :start', {':start': start})
+
+    items = []
+    for status in sds_statuses.SUCCESS:
+        items.extend(_query(
+            status, key_condition,
+            f'attribute_exists({poll_status.TILE_PENDING_ATTRIBUTE})'
+        ))
+
+    return items
+
+
+def _key_conditions(now):
+    '''
+    Returns (expression, values) tuples of last_check conditions which
+    together cover all times
+    '''
+    boundaries = [(now - age).isoformat() for age in SEGMENT_AGES]
+
+    conditions = [('#last_check <= :end', {':end': boundaries[0]})]
+    for start, end in zip(boundaries, boundaries[1:]):
+        conditions.append((
+            '#last_check BETWEEN :start AND :end',
+            {':start': start, ':end': end}
+        ))
+    conditions.append(('#last_check >= :start', {':start': boundaries[-1]}))
+
+    return conditions
+
+
+def _query(status, key_condition, filter_expression=None):
+    expression, values = key_condition
+    paginator = utils.ingest_table.meta.client.get_paginator('query')
+    kwargs = {} if filter_expression is None \
+        else {'FilterExpression': filter_expression}
+    pages = paginator.paginate(
+        TableName=utils.ingest_table.name,
+        IndexName=STATUS_INDEX,
+        KeyConditionExpression=f'#status = :status AND {expression}',
+        ProjectionExpression='granule_id, job_id, #status',
+        ExpressionAttributeNames={
+            '#status': 'status',
+            '#last_check': 'last_check'
+        },
+        ExpressionAttributeValues={
+            ':status': {'S': status},
+            **{key: {'S': value} for key, value in values.items()}
+        },
+        **kwargs
+    )
+
+    items = []
+    for page in pages:
+        for item in page['Items']:
+            if 'job_id' not in item:
+                continue
+
+            items.append({
+                key: deserializer.deserialize(value)
+                for key, value in item.items()
+            })
+
+    return items
@@ -1,6 +1,10 @@
 '''Shared utilities for ingest-to-sds lambdas'''
+import json
+from os import getenv, replace
+from threading import RLock
+from time import monotonic, perf_counter, time
+from urllib.parse import urljoin
 import boto3
-from otello.mozart import Mozart
 
 from podaac.swodlr_common.utilities import BaseUtilities
 
@@ -9,16 +13,156 @@ class Utilities(BaseUtilities):
     '''Utility functions implemented as a singleton'''
     APP_NAME = 'swodlr'
     SERVICE_NAME = 'ingest-to-sds'
+    JOB_STATUS_SEARCH_PATH = 'mozart_es/job_status-current/_search'
+    JOB_STATUS_BATCH_SIZE = 500
+    JOB_TIME_FIELDS = ('job.job_info.time_start', 'job.job_info.time_end')
+    SDS_RETRIES = 3
+    SDS_RETRY_BACKOFF = 0.5  # seconds
+    SDS_RETRY_STATUSES = (429, 500, 502, 503, 504)
+    CONFIG_PATH = f'/service/{APP_NAME}/{SERVICE_NAME}/'
+    CONFIG_TTL = 300  # seconds
+    CONFIG_CACHE_ENV = 'SWODLR_CONFIG_CACHE'
 
     def __init__(self):
+        # Set before the base initializer, which may read params
+        self._config_lock = RLock()
+        self._config = None
+        self._secrets = {}
+        self._config_timings = []
+
         super().__init__(Utilities.APP_NAME, Utilities.SERVICE_NAME)
 
+    def get_param(self, name):
+        '''
+        Returns a config param. Outside of dev, every param on the service's
+        SSM path is loaded with one paginated GetParametersByPath call and
+        cached for config_ttl seconds, and in the file named by
+        SWODLR_CONFIG_CACHE if set. SecureString params are left out of the
+        bulk load; they are decrypted when first read and refreshed when
+        read after expiring
+        '''
+        # The env is read on every call, like the base class's params, so
+        # that it can be set after the singleton is created
+        if getenv(f'{self.APP_NAME.upper()}_ENV', 'prod') == 'dev':
+            return super().get_param(name)
+
+        with self._config_lock:
+            config = self._get_config()
+            if name in config['secrets']:
+                return self._get_secret(name)
+
+            return config['params'].get(name)
+
+    def pop_config_timings(self):
+        '''
+        Returns the times in milliseconds spent loading config since the last
+        call
+        '''
+        with self._config_lock:
+            timings, self._config_timings = self._config_timings, []
+
+        return timings
+
+    @property
+    def ssm(self):
+        '''
+        Lazily creates an SSM client
+        '''
+        if not hasattr(self, '_ssm'):
+            # pylint: disable=attribute-defined-outside-init
+            self._ssm = boto3.client('ssm')
+
+        return self._ssm
+
+    def _get_config(self):
+        now = time()
+        if self._config is not None \
+                and now - self._config['loaded_at'] < self._config_ttl():
+            return self._config
+
+        start = perf_counter()
+        config = self._read_config_cache(now)
+        if config is None:
+            config = self._load_config(now)
+            self._write_config_cache(config)
+
+        self._config = config
+        self._config_timings.append((perf_counter() - start) * 1000)
+        return config
+
+    def _config_ttl(self):
+        return int(self._config['params'].get('config_ttl')
+                   or self.CONFIG_TTL)
+
+    def _load_config(self, now):
+        params = {}
+        secrets = []
+        paginator = self.ssm.get_paginator('get_parameters_by_path')
+
+        for page in paginator.paginate(Path=self.CONFIG_PATH,
+                                       WithDecryption=False):
+            for param in page['Parameters']:
+                name = param['Name'][len(self.CONFIG_PATH):]
+                if param['Type'] == 'SecureString':
+                    secrets.append(name)
+                else:
+                    params[name] = param['Value']
+
+        return {'loaded_at': now, 'params': params, 'secrets': secrets}
+
+    def _get_secret(self, name):
+        secret = self._secrets.get(name)
+        if secret is None or time() - secret[1] >= self._config_ttl():
+            res = self.ssm.get_parameter(Name=self.CONFIG_PATH + name,
+                                         WithDecryption=True)
+            secret = (res['Parameter']['Value'], time())
+            self._secrets[name] = secret
+
+        return secret[0]
+
+    def _read_config_cache(self, now):
+        cache_path = getenv(self.CONFIG_CACHE_ENV)
+        if cache_path is None:
+            return None
+
+        try:
+            with open(cache_path, encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        ttl = int(config['params'].get('config_ttl') or self.CONFIG_TTL)
+        if now - config['loaded_at'] >= ttl:
+            return None
+
+        return config
+
+    def _write_config_cache(self, config):
+        cache_path = getenv(self.CONFIG_CACHE_ENV)
+        if cache_path is None:
+            return
+
+        # Written then renamed so concurrent readers never see a partial file
+        tmp_path = f'{cache_path}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(config, f)
+            replace(tmp_path, cache_path)
+        except OSError:
+            self.get_logger(__name__).exception(
+                'Failed to write config cache'
+            )
+
     @property
     def mozart_client(self):
         '''
-        Lazily creates a Mozart client
+        Lazily creates a Mozart client. otello is imported here so that
+        handlers which never talk to Mozart don't load it
         '''
         if not hasattr(self, '_mozart_client'):
+            # pylint: disable-next=import-outside-toplevel
+            from otello.mozart import Mozart
+
             host = self.get_param('sds_host')
             username = self.get_param('sds_username')
             cfg = {
@@ -28,10 +172,95 @@ class Utilities(BaseUtilities):
             }
 
             # pylint: disable=attribute-defined-outside-init
-            self._mozart_client = Mozart(cfg, session=self._get_sds_session())
+            self._mozart_client = Mozart(cfg, session=self.sds_session)
 
         return self._mozart_client
 
+    @property
+    def sds_session(self):
+        '''
+        Lazily creates an authenticated session for the SDS with a connection
+        pool large enough for every submit and poll worker to keep its
+        connection alive, and which retries idempotent requests on throttling
+        and server errors with backoff
+        '''
+        if not hasattr(self, '_sds_session'):
+            # pylint: disable=import-outside-toplevel
+            from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            pool_size = int(self.get_param('sds_pool_size') or max(
+                DEFAULT_POOLSIZE,
+                int(self.get_param('submit_workers') or 1),
+                int(self.get_param('poll_workers') or 1)
+            ))
+            retries = Retry(
+                total=self.SDS_RETRIES,
+                backoff_factor=self.SDS_RETRY_BACKOFF,
+                status_forcelist=self.SDS_RETRY_STATUSES,
+                raise_on_status=False
+            )
+
+            # pylint: disable=attribute-defined-outside-init
+            self._sds_adapter = HTTPAdapter(
+                pool_connections=pool_size,
+                pool_maxsize=pool_size,
+                max_retries=retries
+            )
+            self._sds_session = self._get_sds_session()
+            self._sds_session.mount('https://', self._sds_adapter)
+            self._sds_session.mount('http://', self._sds_adapter)
+
+        return self._sds_session
+
+    def get_sds_pool_stats(self):
+        '''
+        Returns the number of connections opened and requests made through
+        the SDS session's connection pools; requests beyond the connections
+        opened reused a kept-alive connection
+        '''
+        stats = {'connections': 0, 'requests': 0}
+        if not hasattr(self, '_sds_adapter'):
+            return stats
+
+        pools = self._sds_adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            stats['connections'] += pool.num_connections
+            stats['requests'] += pool.num_requests
+
+        return stats
+
+    def get_job_statuses(self, job_ids, timeout=None):
+        '''
+        Retrieves the status info of many jobs from Mozart's job status index
+        using one query per JOB_STATUS_BATCH_SIZE job ids, within timeout
+        seconds if given. Returns a dict of job id to job info; jobs missing
+        from the index, or not looked up before the timeout, are omitted
+        '''
+        url = urljoin(self.get_param('sds_host'), self.JOB_STATUS_SEARCH_PATH)
+        end = None if timeout is None else monotonic() + timeout
+        job_ids = list(job_ids)
+        infos = {}
+
+        for i in range(0, len(job_ids), self.JOB_STATUS_BATCH_SIZE):
+            remaining = None if end is None else end - monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+
+            batch = job_ids[i:i + self.JOB_STATUS_BATCH_SIZE]
+            res = self.sds_session.post(url, json={
+                'query': {'ids': {'values': batch}},
+                '_source': ['status', 'traceback', *self.JOB_TIME_FIELDS],
+                'size': len(batch)
+            }, timeout=remaining)
+            res.raise_for_status()
+
+            for hit in res.json()['hits']['hits']:
+                infos[hit['_id']] = hit['_source']
+
+        return infos
+
     @property
     def ingest_table(self):
         '''
@@ -60,5 +289,19 @@ class Utilities(BaseUtilities):
 
         return self._available_tiles_table
 
+    @property
+    def rate_limit_table(self):
+        '''
+        Lazily creates a DynamoDB table resource
+        '''
+        if not hasattr(self, '_rate_limit_table'):
+            dynamodb = boto3.resource('dynamodb')
+            # pylint: disable=attribute-defined-outside-init
+            self._rate_limit_table = dynamodb.Table(
+                self.get_param('rate_limit_table_name')
+            )
+
+        return self._rate_limit_table
+
 
 utils = Utilities()
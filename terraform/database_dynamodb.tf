@@ -9,3 +9,14 @@ data "aws_dynamodb_table" "ingest" {
 data "aws_dynamodb_table" "available_tiles" {
   name = "${local.app_prefix}-available-tiles"
 }
+
+resource "aws_dynamodb_table" "rate_limits" {
+  name = "${local.service_prefix}-rate-limits"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key = "bucket_id"
+
+  attribute {
+    name = "bucket_id"
+    type = "S"
+  }
+}
@@ -44,6 +44,60 @@ resource "aws_lambda_function" "poll_status" {
   }
 }
 
+resource "aws_lambda_function" "sweeper" {
+  function_name = "${local.service_prefix}-sweeper"
+  handler = "podaac.swodlr_ingest_to_sds.sweeper.lambda_handler"
+  timeout = 300
+
+  role = aws_iam_role.lambda.arn
+  runtime = "python3.9"
+
+  filename = "${path.module}/../dist/${local.name}-${local.version}.zip"
+  source_code_hash = filebase64sha256("${path.module}/../dist/${local.name}-${local.version}.zip")
+
+  vpc_config {
+    security_group_ids = [aws_security_group.default.id]
+    subnet_ids = data.aws_subnets.private.ids
+  }
+}
+
+resource "aws_lambda_function" "job_notifications" {
+  function_name = "${local.service_prefix}-job_notifications"
+  handler = "podaac.swodlr_ingest_to_sds.job_notifications.lambda_handler"
+  timeout = 60
+
+  role = aws_iam_role.lambda.arn
+  runtime = "python3.9"
+
+  filename = "${path.module}/../dist/${local.name}-${local.version}.zip"
+  source_code_hash = filebase64sha256("${path.module}/../dist/${local.name}-${local.version}.zip")
+
+  vpc_config {
+    security_group_ids = [aws_security_group.default.id]
+    subnet_ids = data.aws_subnets.private.ids
+  }
+}
+
+# -- Schedules --
+resource "aws_cloudwatch_event_rule" "sweeper" {
+  name = "${local.service_prefix}-sweeper"
+  schedule_expression = var.sweeper_schedule
+  state = var.polling_mode == "sweeper" ? "ENABLED" : "DISABLED"
+}
+
+resource "aws_cloudwatch_event_target" "sweeper" {
+  rule = aws_cloudwatch_event_rule.sweeper.name
+  arn = aws_lambda_function.sweeper.arn
+}
+
+resource "aws_lambda_permission" "sweeper" {
+  statement_id = "AllowExecutionFromEventBridge"
+  action = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.sweeper.function_name
+  principal = "events.amazonaws.com"
+  source_arn = aws_cloudwatch_event_rule.sweeper.arn
+}
+
 # -- IAM --
 resource "aws_iam_policy" "ssm_parameters_read" {
   name = "SSMParametersReadOnlyAccess"
@@ -164,13 +218,36 @@ resource "aws_iam_role" "lambda" {
           Action = [
             "dynamodb:BatchGetItem",
             "dynamodb:BatchWriteItem",
+            "dynamodb:DeleteItem",
             "dynamodb:GetItem",
+            "dynamodb:PartiQLUpdate",
             "dynamodb:PutItem",
             "dynamodb:UpdateItem"
           ]
           Effect   = "Allow"
           Resource = data.aws_dynamodb_table.ingest.arn
         },
+        {
+          Sid = ""
+          Action = [
+            "dynamodb:GetItem",
+            "dynamodb:UpdateItem"
+          ]
+          Effect   = "Allow"
+          Resource = aws_dynamodb_table.rate_limits.arn
+        },
+        {
+          Sid = ""
+          Action = "sqs:SendMessage"
+          Effect   = "Allow"
+          Resource = data.aws_sqs_queue.ingest.arn
+        },
+        {
+          Sid = ""
+          Action = "dynamodb:Query"
+          Effect   = "Allow"
+          Resource = "${data.aws_dynamodb_table.ingest.arn}/index/*"
+        },
         {
           Sid = ""
           Action = [
@@ -186,6 +263,54 @@ resource "aws_iam_role" "lambda" {
   }
 }
 
+resource "aws_iam_role_policy" "status_notifications" {
+  count = var.status_notification_queue_name == null ? 0 : 1
+  name = "StatusNotificationsPolicy"
+  role = aws_iam_role.lambda.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [{
+      Sid = ""
+      Action = [
+        "sqs:ReceiveMessage",
+        "sqs:DeleteMessage",
+        "sqs:GetQueueAttributes"
+      ]
+      Effect   = "Allow"
+      Resource = data.aws_sqs_queue.status_notifications[0].arn
+    }]
+  })
+}
+
+resource "aws_iam_policy" "profile_output" {
+  count = local.profile_output_s3 ? 1 : 0
+  name = "ProfileOutputWriteAccess"
+  path = "${local.service_path}/"
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [{
+      Sid = ""
+      Action = "s3:PutObject"
+      Effect   = "Allow"
+      Resource = "arn:aws:s3:::${trimsuffix(trimprefix(var.profile_output, "s3://"), "/")}/*"
+    }]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "bootstrap_profile_output" {
+  count = local.profile_output_s3 ? 1 : 0
+  role = aws_iam_role.bootstrap.name
+  policy_arn = aws_iam_policy.profile_output[0].arn
+}
+
+resource "aws_iam_role_policy_attachment" "lambda_profile_output" {
+  count = local.profile_output_s3 ? 1 : 0
+  role = aws_iam_role.lambda.name
+  policy_arn = aws_iam_policy.profile_output[0].arn
+}
+
 # -- SSM Parameters --
 resource "aws_ssm_parameter" "sds_pcm_release_tag" {
   count = var.sds_pcm_release_tag == null ? 0 : 1
@@ -218,6 +343,91 @@ resource "aws_ssm_parameter" "sds_ca_cert" {
   value = local.sds_ca_cert
 }
 
+resource "aws_ssm_parameter" "submit_workers" {
+  name  = "${local.service_path}/submit_workers"
+  type  = "String"
+  value = var.submit_workers
+}
+
+resource "aws_ssm_parameter" "poll_workers" {
+  name  = "${local.service_path}/poll_workers"
+  type  = "String"
+  value = var.poll_workers
+}
+
+resource "aws_ssm_parameter" "poll_interval_scale" {
+  name  = "${local.service_path}/poll_interval_scale"
+  type  = "String"
+  value = var.status_notification_queue_name == null ? 1 : var.poll_interval_scale
+}
+
+resource "aws_ssm_parameter" "polling_mode" {
+  name  = "${local.service_path}/polling_mode"
+  type  = "String"
+  value = var.polling_mode
+}
+
+resource "aws_ssm_parameter" "execution_max_records" {
+  name  = "${local.service_path}/execution_max_records"
+  type  = "String"
+  value = var.ingest_batch_size
+}
+
+resource "aws_ssm_parameter" "submit_rate" {
+  name  = "${local.service_path}/submit_rate"
+  type  = "String"
+  value = var.submit_rate
+}
+
+resource "aws_ssm_parameter" "submit_burst" {
+  name  = "${local.service_path}/submit_burst"
+  type  = "String"
+  value = var.submit_burst
+}
+
+resource "aws_ssm_parameter" "metrics_enabled" {
+  name  = "${local.service_path}/metrics_enabled"
+  type  = "String"
+  value = var.metrics_enabled
+}
+
+resource "aws_ssm_parameter" "config_ttl" {
+  name  = "${local.service_path}/config_ttl"
+  type  = "String"
+  value = var.config_ttl
+}
+
+resource "aws_ssm_parameter" "priority_products" {
+  name  = "${local.service_path}/priority_products"
+  type  = "String"
+  value = jsonencode(var.priority_products)
+}
+
+resource "aws_ssm_parameter" "priority_recent_passes" {
+  name  = "${local.service_path}/priority_recent_passes"
+  type  = "String"
+  value = var.priority_recent_passes
+}
+
+resource "aws_ssm_parameter" "priority_recent_boost" {
+  name  = "${local.service_path}/priority_recent_boost"
+  type  = "String"
+  value = var.priority_recent_boost
+}
+
+resource "aws_ssm_parameter" "profile_sample_rate" {
+  name  = "${local.service_path}/profile_sample_rate"
+  type  = "String"
+  value = var.profile_sample_rate
+}
+
+resource "aws_ssm_parameter" "profile_output" {
+  count = var.profile_output == null ? 0 : 1
+  name  = "${local.service_path}/profile_output"
+  type  = "String"
+  value = var.profile_output
+}
+
 resource "aws_ssm_parameter" "stepfunction_arn" {
   name  = "${local.service_path}/stepfunction_arn"
   type  = "String"
@@ -236,6 +446,12 @@ resource "aws_ssm_parameter" "ingest_table_name" {
   value = data.aws_dynamodb_table.ingest.name
 }
 
+resource "aws_ssm_parameter" "rate_limit_table_name" {
+  name  = "${local.service_path}/rate_limit_table_name"
+  type  = "String"
+  value = aws_dynamodb_table.rate_limits.name
+}
+
 resource "aws_ssm_parameter" "available_tiles_table_name" {
   name  = "${local.service_path}/available_tiles_table_name"
   type  = "String"
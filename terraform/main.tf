@@ -41,6 +41,7 @@ locals {
   service_path    = "/service/${var.app_name}/${var.service_name}"
 
   sds_ca_cert = file(var.sds_ca_cert_path)
+  profile_output_s3 = var.profile_output == null ? false : substr(var.profile_output, 0, 5) == "s3://"
 
   account_id = data.aws_caller_identity.current.account_id
 
@@ -6,8 +6,26 @@ data "aws_sqs_queue" "ingest" {
   name = "${local.app_prefix}-ingest-queue"
 }
 
+data "aws_sqs_queue" "status_notifications" {
+  count = var.status_notification_queue_name == null ? 0 : 1
+  name = var.status_notification_queue_name
+}
+
 # -- Event Mapping --
 resource "aws_lambda_event_source_mapping" "ingest_queue" {
   event_source_arn = data.aws_sqs_queue.ingest.arn
   function_name = aws_lambda_function.bootstrap.arn
+
+  batch_size = var.ingest_batch_size
+  maximum_batching_window_in_seconds = var.ingest_batching_window
+
+  function_response_types = ["ReportBatchItemFailures"]
+}
+
+resource "aws_lambda_event_source_mapping" "status_notifications" {
+  count = var.status_notification_queue_name == null ? 0 : 1
+  event_source_arn = data.aws_sqs_queue.status_notifications[0].arn
+  function_name = aws_lambda_function.job_notifications.arn
+
+  function_response_types = ["ReportBatchItemFailures"]
 }
@@ -15,8 +15,8 @@ resource "aws_sfn_state_machine" "ingest_to_sds" {
       CheckJobs = {
         Type = "Choice",
         Choices = [{
-            Variable = "$.jobs[0]"
-            IsPresent = true
+            Variable = "$.job_count"
+            NumericGreaterThan = 0
             Next = "Wait"
         }],
         Default = "Done"
@@ -24,7 +24,7 @@ resource "aws_sfn_state_machine" "ingest_to_sds" {
 
       Wait = {
         Type = "Wait"
-        Seconds = 60
+        SecondsPath = "$.wait_seconds"
         Next = "PollStatus"
       }
 
@@ -45,3 +45,100 @@ variable "sds_ca_cert_path" {
     type = string
     default = "/etc/ssl/certs/JPLICA.Root.pem"
 }
+
+variable "submit_workers" {
+    type = number
+    default = 4
+}
+
+variable "poll_workers" {
+    type = number
+    default = 8
+}
+
+variable "polling_mode" {
+    type = string
+    default = "execution"
+
+    validation {
+        condition = contains(["execution", "sweeper"], var.polling_mode)
+        error_message = "polling_mode must be either \"execution\" or \"sweeper\""
+    }
+}
+
+variable "sweeper_schedule" {
+    type = string
+    default = "rate(2 minutes)"
+}
+
+variable "ingest_batch_size" {
+    type = number
+    default = 500
+}
+
+variable "ingest_batching_window" {
+    type = number
+    default = 20
+}
+
+// Queue subscribed to the SDS's job status notifications; when set, statuses
+// are recorded as they change and polling only acts as a fallback
+variable "status_notification_queue_name" {
+    type = string
+    default = null
+}
+
+variable "poll_interval_scale" {
+    type = number
+    default = 10
+}
+
+// Granule submissions per second across all submit_to_sds instances; 0
+// disables the limit
+variable "submit_rate" {
+    type = number
+    default = 0
+}
+
+variable "submit_burst" {
+    type = number
+    default = 100
+}
+
+variable "metrics_enabled" {
+    type = bool
+    default = true
+}
+
+variable "config_ttl" {
+    type = number
+    default = 300
+}
+
+variable "priority_products" {
+    type = map(number)
+    default = {
+        PIXC = 3
+        PIXCVec = 3
+    }
+}
+
+variable "priority_recent_passes" {
+    type = number
+    default = 584
+}
+
+variable "priority_recent_boost" {
+    type = number
+    default = 3
+}
+
+variable "profile_sample_rate" {
+    type = number
+    default = 0
+}
+
+variable "profile_output" {
+    type = string
+    default = null
+}
@@ -0,0 +1,245 @@
+'''
+In-process stand-in for Mozart's HTTP API with configurable latency,
+failure rate and job state progression, and a client for it in place of
+otello's
+'''
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+from threading import Lock, Thread
+from time import sleep
+from urllib.parse import parse_qs, urljoin, urlsplit
+
+SUBMIT_PATH = 'mozart/api/v0.1/job/submit'
+INFO_PATH = 'mozart/api/v0.1/job/info'
+SPEC_PATH = 'mozart/api/v0.1/job/spec/type'
+SEARCH_PATH = 'mozart_es/job_status-current/_search'
+
+
+class Clock:
+    '''Virtual clock which the harness advances instead of sleeping'''
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeMozart:
+    '''
+    Fake Mozart server. Jobs are queued for queue_time seconds and run for
+    run_time seconds of the virtual clock before completing, or failing with
+    job_failure_rate. Every request is delayed by latency seconds and fails
+    with a 503 at failure_rate
+    '''
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, clock, latency=0, failure_rate=0, queue_time=120,
+                 run_time=300, job_failure_rate=0, seed=0):
+        self.clock = clock
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.queue_time = queue_time
+        self.run_time = run_time
+        self.job_failure_rate = job_failure_rate
+
+        self.jobs = {}
+        self.requests = Counter()
+        self._random = random.Random(seed)
+        self._lock = Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _handler(self))
+        self._server.daemon_threads = True
+
+    @property
+    def host(self):
+        '''Base url of the server'''
+        return f'http://127.0.0.1:{self._server.server_port}/'
+
+    def start(self):
+        '''Starts serving in the background'''
+        Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        '''Stops serving'''
+        self._server.shutdown()
+        self._server.server_close()
+
+    def submit(self, params, tag):
+        '''Queues a job and returns its id'''
+        with self._lock:
+            job_id = f'job-{len(self.jobs)}'
+            self.jobs[job_id] = {
+                'submitted': self.clock(),
+                'fails': self._random.random() < self.job_failure_rate,
+                'tag': tag,
+                'params': params
+            }
+        return job_id
+
+    def status(self, job_id):
+        '''Returns a job's status at the current virtual time'''
+        job = self.jobs[job_id]
+        elapsed = self.clock() - job['submitted']
+        if elapsed < self.queue_time:
+            return 'job-queued'
+        if elapsed < self.queue_time + self.run_time:
+            return 'job-started'
+        return 'job-failed' if job['fails'] else 'job-completed'
+
+    def info(self, job_id):
+        '''
+        Returns a job's status and the job info times Mozart reports at the
+        current virtual time
+        '''
+        job = self.jobs[job_id]
+        status = self.status(job_id)
+        job_info = {}
+        if status != 'job-queued':
+            job_info['time_start'] = _iso(job['submitted'] + self.queue_time)
+        if status not in ('job-queued', 'job-started'):
+            job_info['time_end'] = _iso(
+                job['submitted'] + self.queue_time + self.run_time
+            )
+
+        return {'status': status, 'job': {'job_info': job_info}}
+
+    def should_fail(self):
+        '''Returns True if a request should fail'''
+        with self._lock:
+            return self._random.random() < self.failure_rate
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() \
+        .replace('+00:00', 'Z')
+
+
+def _handler(mozart):
+    class _MozartHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            '''Serves job info and job specs'''
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            if not self._admit(url.path):
+                return
+
+            if url.path == f'/{INFO_PATH}':
+                job_id = query['id'][0]
+                if job_id not in mozart.jobs:
+                    self._respond(404, {'message': 'Not found'})
+                else:
+                    self._respond(200, {'result': mozart.info(job_id)})
+            elif url.path == f'/{SPEC_PATH}':
+                self._respond(200, {'result': {'params': []}})
+            else:
+                self._respond(404, {})
+
+        def do_POST(self):  # pylint: disable=invalid-name
+            '''Serves job submissions and job status searches'''
+            url = urlsplit(self.path)
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not self._admit(url.path):
+                return
+
+            if url.path == f'/{SUBMIT_PATH}':
+                job_id = mozart.submit(body['params'], body.get('tag'))
+                self._respond(200, {'result': job_id})
+            elif url.path == f'/{SEARCH_PATH}':
+                hits = [
+                    {'_id': job_id, '_source': mozart.info(job_id)}
+                    for job_id in body['query']['ids']['values']
+                    if job_id in mozart.jobs
+                ]
+                self._respond(200, {'hits': {'hits': hits}})
+            else:
+                self._respond(404, {})
+
+        def _admit(self, path):
+            mozart.requests[path] += 1
+            if mozart.latency:
+                sleep(mozart.latency)
+            if mozart.should_fail():
+                self._respond(503, {'message': 'Unavailable'})
+                return False
+            return True
+
+        def _respond(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *_):  # pylint: disable=arguments-differ
+            '''Silences request logging'''
+
+    return _MozartHandler
+
+
+class MozartClient:
+    '''
+    Client for the fake Mozart server with the parts of otello's Mozart
+    interface the lambdas use, making its requests through a session
+    '''
+
+    def __init__(self, host, session):
+        self.host = host
+        self.session = session
+
+    def get_job_type(self, job_type):
+        '''Returns a job type'''
+        return _JobType(self, job_type)
+
+    def get_job_by_id(self, job_id):
+        '''Returns a job'''
+        return _Job(self, job_id)
+
+    def request(self, method, path, **kwargs):
+        '''Makes a request to the server, returning its result'''
+        res = self.session.request(method, urljoin(self.host, path), **kwargs)
+        res.raise_for_status()
+        return res.json()['result']
+
+
+class _JobType:
+    def __init__(self, client, job_type):
+        self.client = client
+        self.job_type = job_type
+        self.params = {}
+
+    def initialize(self):
+        '''Fetches the job type's spec'''
+        self.client.request('GET', SPEC_PATH, params={'id': self.job_type})
+
+    def set_input_params(self, params):
+        '''Sets the params of the next submission'''
+        self.params = dict(params)
+
+    def submit_job(self, queue=None, priority=0, tag=None):
+        '''Submits a job'''
+        job_id = self.client.request('POST', SUBMIT_PATH, json={
+            'type': self.job_type,
+            'queue': queue,
+            'priority': priority,
+            'tag': tag,
+            'params': self.params
+        })
+        return _Job(self.client, job_id)
+
+
+class _Job:
+    def __init__(self, client, job_id):
+        self.client = client
+        self.job_id = job_id
+
+    def get_info(self):
+        '''Returns the job's info'''
+        return self.client.request('GET', INFO_PATH,
+                                   params={'id': self.job_id})
@@ -0,0 +1,211 @@
+'''
+Load test harness which drives submit_to_sds and poll_status end to end
+against a fake Mozart server and local DynamoDB tables, reporting wall
+time, throughput, request counts and peak memory per scenario.
+
+Run from the repository root:
+
+    poetry run python tests/benchmark/harness.py [scenario ...] \
+        [--granules N] [--json]
+'''
+from argparse import ArgumentParser
+from collections import OrderedDict
+from contextlib import ExitStack
+import json
+import logging
+from os import environ
+import sys
+from time import perf_counter
+import tracemalloc
+from unittest.mock import patch
+
+from fake_mozart import Clock, FakeMozart, MozartClient
+from local_dynamodb import LocalDynamoDB
+
+# The lambdas read their config when imported
+environ.setdefault('SWODLR_ENV', 'dev')
+environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+environ.setdefault('SWODLR_ingest_table_name', 'benchmark-ingest')
+environ.setdefault('SWODLR_sds_username', 'benchmark')
+environ.setdefault('SWODLR_sds_password', 'benchmark')
+
+# pylint: disable=wrong-import-position
+from podaac.swodlr_ingest_to_sds import poll_status, submit_to_sds  # noqa: E402,E501
+from podaac.swodlr_ingest_to_sds.job_types import (  # noqa: E402
+    INGEST_JOB_NAME, JobTypeCache
+)
+from podaac.swodlr_ingest_to_sds.utilities import utils  # noqa: E402
+
+EXECUTION_RECORDS = 500
+MAX_POLL_ROUNDS = 1000
+
+SCENARIOS = {
+    'baseline-1k': {'granules': 1000},
+    'latency-1k': {'granules': 1000, 'latency': 0.005},
+    'flaky-1k': {'granules': 1000, 'failure_rate': 0.05,
+                 'job_failure_rate': 0.02},
+    'baseline-10k': {'granules': 10000}
+}
+
+
+class _LocalSqs:
+    '''Stand-in for the SQS client which records requeued messages'''
+
+    def __init__(self):
+        self.messages = []
+
+    def send_message_batch(self, QueueUrl, Entries):  # pylint: disable=invalid-name,unused-argument # noqa: E501
+        '''Stand-in for send_message_batch'''
+        self.messages.extend(Entries)
+        return {'Successful': Entries, 'Failed': []}
+
+
+# pylint: disable-next=too-many-arguments,too-many-locals
+def run_scenario(name, granules, latency=0, failure_rate=0,
+                 job_failure_rate=0, submit_workers=4, poll_workers=8):
+    '''
+    Submits granules and polls their jobs to completion, returning the
+    scenario's measurements
+    '''
+    clock = Clock()
+    mozart = FakeMozart(clock, latency=latency, failure_rate=failure_rate,
+                        job_failure_rate=job_failure_rate)
+    db = LocalDynamoDB()
+    sqs = _LocalSqs()
+
+    with ExitStack() as stack:
+        mozart.start()
+        stack.callback(mozart.stop)
+
+        for patcher in (
+            patch.dict(environ, {'SWODLR_sds_host': mozart.host}),
+            patch.object(utils, '_ingest_table', db.table(
+                submit_to_sds.INGEST_TABLE_NAME, 'granule_id'
+            ), create=True),
+            patch.object(utils, '_available_tiles_table', db.table(
+                'benchmark-available-tiles', 'tile_id'
+            ), create=True),
+            patch.object(utils, '_mozart_client', MozartClient(
+                mozart.host, utils.sds_session
+            ), create=True),
+            patch.object(utils, 'get_latest_job_version',
+                         return_value=f'{INGEST_JOB_NAME}:benchmark'),
+            patch.object(submit_to_sds, 'dynamodb', db.client),
+            patch.object(submit_to_sds, 'sqs', sqs),
+            patch.object(submit_to_sds, 'ingest_job_types',
+                         JobTypeCache(INGEST_JOB_NAME)),
+            patch.object(submit_to_sds, 'recent_granules', OrderedDict()),
+            patch.object(submit_to_sds, 'SUBMIT_WORKERS', submit_workers),
+            patch.object(poll_status, 'POLL_WORKERS', poll_workers),
+            patch.object(poll_status, 'time', clock)
+        ):
+            stack.enter_context(patcher)
+
+        logging.disable(logging.ERROR)
+        stack.callback(logging.disable, logging.NOTSET)
+
+        records = [_record(i) for i in range(granules)]
+        tracemalloc.start()
+        stack.callback(tracemalloc.stop)
+
+        started = perf_counter()
+        events = [
+            submit_to_sds.lambda_handler(
+                {'Records': records[i:i + EXECUTION_RECORDS]}, None
+            )
+            for i in range(0, len(records), EXECUTION_RECORDS)
+        ]
+        submit_seconds = perf_counter() - started
+
+        started = perf_counter()
+        rounds = 0
+        events = [event for event in events if event['job_count'] > 0]
+        while events and rounds < MAX_POLL_ROUNDS:
+            clock.now += min(event['wait_seconds'] for event in events)
+            events = [
+                event for event in (
+                    poll_status.lambda_handler(event, None)
+                    for event in events
+                )
+                if event['job_count'] > 0
+            ]
+            rounds += 1
+        poll_seconds = perf_counter() - started
+
+        _, peak_memory = tracemalloc.get_traced_memory()
+
+    statuses = [item.get('status') for item in
+                db.tables[submit_to_sds.INGEST_TABLE_NAME].items.values()]
+    return {
+        'scenario': name,
+        'granules': granules,
+        'submitted': len(mozart.jobs),
+        'completed': statuses.count('job-completed'),
+        'failed': statuses.count('job-failed'),
+        'requeued': len(sqs.messages),
+        'submit_seconds': round(submit_seconds, 3),
+        'poll_seconds': round(poll_seconds, 3),
+        'poll_rounds': rounds,
+        'granules_per_second': round(
+            granules / (submit_seconds + poll_seconds), 1
+        ),
+        'http_requests': dict(mozart.requests),
+        'dynamodb_calls': dict(db.calls),
+        'peak_memory_mib': round(peak_memory / 2 ** 20, 1)
+    }
+
+
+def _record(i):
+    granule_id = f'SWOT_L2_HR_PIXC_{i // 10000 + 1:03d}_' \
+        f'{i // 100 % 100:03d}_{i % 100:03d}L_20230101T000000_01'
+    return {
+        'messageId': str(i),
+        'body': json.dumps({
+            'identifier': granule_id,
+            'product': {'files': [{
+                'name': f'{granule_id}.nc',
+                'uri': f's3://benchmark/{granule_id}.nc',
+                'type': 'data'
+            }]}
+        })
+    }
+
+
+def main():
+    '''
+    Runs the selected scenarios and prints their measurements
+    '''
+    parser = ArgumentParser()
+    parser.add_argument('scenarios', nargs='*', default=list(SCENARIOS),
+                        choices=[[], *SCENARIOS])
+    parser.add_argument('--granules', type=int,
+                        help='overrides the number of granules per scenario')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    results = []
+    for name in args.scenarios:
+        options = dict(SCENARIOS[name])
+        if args.granules is not None:
+            options['granules'] = args.granules
+        results.append(run_scenario(name, **options))
+
+        if not args.json:
+            result = results[-1]
+            print(
+                f"{name}: {result['granules']} granules; "
+                f"submit {result['submit_seconds']}s; "
+                f"poll {result['poll_seconds']}s "
+                f"({result['poll_rounds']} rounds); "
+                f"{result['granules_per_second']} granules/s; "
+                f"{sum(result['http_requests'].values())} SDS requests; "
+                f"{sum(result['dynamodb_calls'].values())} DynamoDB calls; "
+                f"peak memory {result['peak_memory_mib']} MiB"
+            )
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
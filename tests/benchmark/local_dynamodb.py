@@ -0,0 +1,378 @@
+'''
+In-memory stand-in for the DynamoDB tables the lambdas use, supporting the
+subset of the table resource, client and expression syntax they rely on
+'''
+from collections import Counter
+from contextlib import contextmanager
+import re
+from threading import Lock
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+TOKEN_REGEX = re.compile(r'\s*(<>|<=|>=|[=<>(),]|[#:]?\w+)')
+COMPARATORS = {
+    '=': lambda a, b: a == b,
+    '<>': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b
+}
+PARTIQL_REGEX = re.compile(
+    r'UPDATE "(?P<table>[^"]+)"(?P<sets>( SET "\w+" = \?)*)'
+    r'(?P<removes>( REMOVE "\w+")*)'
+    r' WHERE "(?P<key>\w+)" = \?(?P<equals>( AND "\w+" = \?)*)'
+    r'( AND "(?P<in>\w+)" IN \[(?P<options>\?(, \?)*)\])?'
+)
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+
+class LocalDynamoDB:
+    '''
+    Set of local tables and a client for the item, batch and PartiQL calls
+    made on them. Counts calls by operation
+    '''
+
+    def __init__(self):
+        self.tables = {}
+        self.calls = Counter()
+        self._lock = Lock()
+
+    def table(self, name, key):
+        '''Returns a table resource stand-in, creating the table if needed'''
+        if name not in self.tables:
+            self.tables[name] = LocalTable(self, name, key)
+        return self.tables[name]
+
+    def count(self, operation):
+        '''Counts a call to an operation'''
+        with self._lock:
+            self.calls[operation] += 1
+
+    @property
+    def client(self):
+        '''Client stand-in shared by the tables'''
+        return _LocalClient(self)
+
+
+class LocalTable:
+    '''Stand-in for a DynamoDB table resource'''
+
+    def __init__(self, db, name, key):
+        self.db = db
+        self.name = name
+        self.key = key
+        self.items = {}
+        self.lock = Lock()
+
+    @property
+    def meta(self):
+        '''Stand-in for the resource's meta, exposing its client'''
+        return _Meta(self.db.client)
+
+    def get(self, key_value):
+        '''Returns a copy of an item, or None'''
+        with self.lock:
+            item = self.items.get(key_value)
+            return None if item is None else dict(item)
+
+    def put_item(self, Item, ConditionExpression=None,  # pylint: disable=invalid-name # noqa: E501
+                 ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None):
+        '''Stand-in for Table.put_item'''
+        self.db.count('PutItem')
+        with self.lock:
+            self._check(self.items.get(Item[self.key]), ConditionExpression,
+                        ExpressionAttributeNames, ExpressionAttributeValues)
+            self.items[Item[self.key]] = dict(Item)
+
+    def delete_item(self, Key, ConditionExpression=None,  # pylint: disable=invalid-name # noqa: E501
+                    ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None):
+        '''Stand-in for Table.delete_item'''
+        self.db.count('DeleteItem')
+        with self.lock:
+            self._check(self.items.get(Key[self.key]), ConditionExpression,
+                        ExpressionAttributeNames, ExpressionAttributeValues)
+            self.items.pop(Key[self.key], None)
+
+    # pylint: disable-next=invalid-name,too-many-arguments
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None,
+                    ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE'):
+        '''Stand-in for Table.update_item supporting SET updates'''
+        self.db.count('UpdateItem')
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+
+        with self.lock:
+            previous = self.items.get(Key[self.key])
+            self._check(previous, ConditionExpression, names, values)
+
+            item = dict(previous or Key)
+            for name, value in _parse_update(UpdateExpression, names, values,
+                                             item):
+                item[name] = value
+            self.items[Key[self.key]] = item
+
+        if ReturnValues == 'ALL_OLD' and previous is not None:
+            return {'Attributes': dict(previous)}
+        return {}
+
+    @contextmanager
+    def batch_writer(self):
+        '''Stand-in for Table.batch_writer, writing items 25 at a time'''
+        batch = _BatchWriter(self)
+        yield batch
+        batch.flush()
+
+    def _check(self, item, condition, names, values):
+        if condition is None:
+            return
+
+        if not _evaluate(condition, names or {}, values or {}, item or {}):
+            raise ClientError(
+                {'Error': {'Code': 'ConditionalCheckFailedException'}},
+                'ConditionalCheck'
+            )
+
+
+class _BatchWriter:
+    def __init__(self, table):
+        self.table = table
+        self.pending = []
+
+    def put_item(self, Item):  # pylint: disable=invalid-name
+        '''Buffers an item to be written'''
+        self.pending.append(Item)
+        if len(self.pending) >= 25:
+            self.flush()
+
+    def flush(self):
+        '''Writes the buffered items'''
+        if not self.pending:
+            return
+
+        self.table.db.count('BatchWriteItem')
+        with self.table.lock:
+            for item in self.pending:
+                self.table.items[item[self.table.key]] = dict(item)
+        self.pending = []
+
+
+class _Meta:
+    def __init__(self, client):
+        self.client = client
+
+
+class _LocalClient:
+    '''Stand-in for the DynamoDB client's item, batch and PartiQL calls'''
+
+    def __init__(self, db):
+        self.db = db
+
+    def batch_get_item(self, RequestItems, **_):  # pylint: disable=invalid-name # noqa: E501
+        '''Stand-in for batch_get_item, ignoring projections'''
+        self.db.count('BatchGetItem')
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.db.tables[name]
+            items = []
+            for key in request['Keys']:
+                item = table.get(deserializer.deserialize(key[table.key]))
+                if item is not None:
+                    items.append({
+                        attr: serializer.serialize(value)
+                        for attr, value in item.items()
+                    })
+            responses[name] = items
+
+        return {'Responses': responses, 'ConsumedCapacity': []}
+
+    def update_item(self, TableName, Key, ExpressionAttributeValues=None,  # pylint: disable=invalid-name # noqa: E501
+                    **kwargs):
+        '''Stand-in for update_item, with typed values'''
+        result = self.db.tables[TableName].update_item(
+            Key=_deserialize(Key),
+            ExpressionAttributeValues=_deserialize(ExpressionAttributeValues),
+            **kwargs
+        )
+        if 'Attributes' in result:
+            return {'Attributes': _serialize(result['Attributes'])}
+        return result
+
+    def put_item(self, TableName, Item, ExpressionAttributeValues=None,  # pylint: disable=invalid-name # noqa: E501
+                 **kwargs):
+        '''Stand-in for put_item, with typed values'''
+        self.db.tables[TableName].put_item(
+            Item=_deserialize(Item),
+            ExpressionAttributeValues=_deserialize(ExpressionAttributeValues),
+            **kwargs
+        )
+        return {}
+
+    def delete_item(self, TableName, Key, ExpressionAttributeValues=None,  # pylint: disable=invalid-name # noqa: E501
+                    **kwargs):
+        '''Stand-in for delete_item, with typed values'''
+        self.db.tables[TableName].delete_item(
+            Key=_deserialize(Key),
+            ExpressionAttributeValues=_deserialize(ExpressionAttributeValues),
+            **kwargs
+        )
+        return {}
+
+    def batch_execute_statement(self, Statements):  # pylint: disable=invalid-name # noqa: E501
+        '''
+        Stand-in for batch_execute_statement supporting SET and REMOVE
+        updates with equality and IN conditions
+        '''
+        self.db.count('BatchExecuteStatement')
+        responses = []
+        for statement in Statements:
+            match = PARTIQL_REGEX.fullmatch(statement['Statement'])
+            table = self.db.tables[match.group('table')]
+            params = [deserializer.deserialize(param)
+                      for param in statement['Parameters']]
+            names = re.findall(r'SET "(\w+)"', match.group('sets'))
+            removes = re.findall(r'REMOVE "(\w+)"', match.group('removes'))
+            equals = re.findall(r'AND "(\w+)"', match.group('equals'))
+            values = params[:len(names)]
+            key = params[len(names)]
+            expected = params[len(names) + 1:len(names) + 1 + len(equals)]
+            options = params[len(names) + 1 + len(equals):]
+
+            with table.lock:
+                item = table.items.get(key)
+                if item is None or any(
+                    item.get(name) != value
+                    for name, value in zip(equals, expected)
+                ) or (match.group('in') is not None
+                      and item.get(match.group('in')) not in options):
+                    responses.append({'Error': {
+                        'Code': 'ConditionalCheckFailed'
+                    }})
+                    continue
+
+                item.update(zip(names, values))
+                for name in removes:
+                    item.pop(name, None)
+            responses.append({})
+
+        return {'Responses': responses}
+
+
+def _serialize(values):
+    return {key: serializer.serialize(value) for key, value in values.items()}
+
+
+def _deserialize(values):
+    if values is None:
+        return None
+
+    return {key: deserializer.deserialize(value)
+            for key, value in values.items()}
+
+
+def _tokenize(expression):
+    tokens = TOKEN_REGEX.findall(expression)
+    if ''.join(tokens) != re.sub(r'\s', '', expression):
+        raise ValueError(f'Unsupported expression: {expression}')
+    return tokens
+
+
+def _parse_update(expression, names, values, item):
+    '''
+    Yields (name, value) tuples of the assignments in a SET update
+    '''
+    tokens = _tokenize(expression)
+    if tokens[0] != 'SET':
+        raise ValueError(f'Unsupported update: {expression}')
+
+    i = 1
+    while i < len(tokens):
+        name = names.get(tokens[i], tokens[i])
+        assert tokens[i + 1] == '='
+        if tokens[i + 2] == 'if_not_exists':
+            # if_not_exists ( path , value )
+            path = names.get(tokens[i + 4], tokens[i + 4])
+            value = item.get(path, values[tokens[i + 6]])
+            i += 8
+        else:
+            value = values[tokens[i + 2]]
+            i += 3
+
+        yield name, value
+        i += 1  # Comma
+
+
+def _evaluate(expression, names, values, item):
+    '''
+    Evaluates a condition expression against an item
+    '''
+    tokens = _tokenize(expression)
+    position = 0
+
+    def _peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def _next():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def _operand():
+        token = _next()
+        if token.startswith(':'):
+            return values[token]
+        return item.get(names.get(token, token))
+
+    def _primary():
+        if _peek() == '(':
+            _next()
+            result = _or()
+            assert _next() == ')'
+            return result
+
+        if _peek() == 'attribute_not_exists':
+            _next()
+            assert _next() == '('
+            name = _next()
+            assert _next() == ')'
+            return names.get(name, name) not in item
+
+        left = _operand()
+        operator = _next()
+        if operator == 'IN':
+            assert _next() == '('
+            options = [_operand()]
+            while _next() == ',':
+                options.append(_operand())
+            return left in options
+
+        return COMPARATORS[operator](left, _operand())
+
+    def _not():
+        if _peek() == 'NOT':
+            _next()
+            return not _not()
+        return _primary()
+
+    def _and():
+        result = _not()
+        while _peek() == 'AND':
+            _next()
+            right = _not()
+            result = result and right
+        return result
+
+    def _or():
+        result = _and()
+        while _peek() == 'OR':
+            _next()
+            right = _and()
+            result = result or right
+        return result
+
+    return _or()
@@ -0,0 +1,7 @@
+'''Shared configuration of the tests'''
+from os import environ
+
+# Params are read from the environment in dev rather than from SSM. The
+# lambdas read params both when imported and when invoked, so dev is set for
+# the whole session instead of around each module's imports
+environ['SWODLR_ENV'] = 'dev'
@@ -0,0 +1,43 @@
+'''Tests for the load test harness'''
+from os import environ, pathsep
+from pathlib import Path
+import json
+import subprocess
+import sys
+from unittest import TestCase
+
+HARNESS_PATH = Path(__file__).parent.joinpath('benchmark', 'harness.py')
+ROOT_PATH = Path(__file__).parent.parent
+
+
+class TestBenchmark(TestCase):
+    '''Tests for the load test harness'''
+
+    def test_scenario(self):
+        '''
+        Test a small flaky scenario end to end, verifying that every granule
+        is either requeued or submitted and brought to a final status. The
+        harness runs in its own interpreter since the lambdas read their
+        config on import
+        '''
+        python_path = pathsep.join(
+            path for path in (str(ROOT_PATH), environ.get('PYTHONPATH'))
+            if path
+        )
+        output = subprocess.run(
+            [sys.executable, str(HARNESS_PATH), 'flaky-1k',
+             '--granules', '50', '--json'],
+            capture_output=True, check=True, timeout=120,
+            env={**environ, 'PYTHONPATH': python_path}
+        ).stdout
+
+        [result] = json.loads(output)
+        self.assertEqual(result['scenario'], 'flaky-1k')
+        self.assertEqual(result['granules'], 50)
+        self.assertEqual(result['submitted'] + result['requeued'], 50)
+        self.assertEqual(result['completed'] + result['failed'],
+                         result['submitted'])
+        self.assertGreater(result['poll_rounds'], 0)
+        self.assertEqual(
+            result['http_requests']['/mozart/api/v0.1/job/submit'], 50
+        )
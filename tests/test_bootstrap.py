@@ -1,7 +1,10 @@
 '''Tests for the bootstrap module'''
+import json
 import os
+from pathlib import Path
 from unittest import TestCase
 from unittest.mock import patch
+from botocore.exceptions import ClientError
 
 TEST_ARN = 'ABC123'
 
@@ -17,26 +20,125 @@ with (
 
 class TestBootstrap(TestCase):
     '''Tests for the bootstrap module'''
+    data_path = Path(__file__).parent.joinpath('data')
+    valid_event_path = data_path.joinpath('valid_sqs_event.json')
+    with open(valid_event_path, encoding='utf-8') as f:
+        valid_event = json.load(f)
 
     def test_bootstrap(self):
         '''
-        Test the lambda handler of the bootstrap module by submitting an event
-        and checking output for the transformed event
+        Test the lambda handler of the bootstrap module by submitting an SQS
+        event and checking the step function input for the compacted records
         '''
-        event = {
-            'a': 42,
-            'b': True,
-            'c': 'ipsum lorem'
-        }
+        with (
+            patch.object(
+                bootstrap.stepfunctions,
+                'start_execution'
+            ) as mock_exec
+        ):
+            bootstrap.lambda_handler(self.valid_event, None)
+
+        mock_exec.assert_called_once()
+        self.assertEqual(
+            mock_exec.call_args.kwargs['stateMachineArn'], TEST_ARN
+        )
+
+        sf_input = json.loads(mock_exec.call_args.kwargs['input'])
+        self.assertEqual(len(sf_input['Records']), 3)
+        self.assertDictEqual(sf_input['Records'][0], {
+            'messageId': 'MessageID_1',
+            'body': '{"identifier":"test-1","product":{"files":['
+                    '{"name":"test-1.json","uri":"https://domain.test/bucket'
+                    '/test/test-1.json","type":"metadata"},'
+                    '{"name":"test-1.nc","uri":"https://domain.test/bucket'
+                    '/test/test-1.nc","type":"data"}]}}'
+        })
+
+    def test_bootstrap_coalescing(self):
+        '''
+        Test the lambda handler of the bootstrap module by submitting more
+        records than fit in one execution, verifying that the records are
+        split across executions within the limits and that unparsable bodies
+        are passed through
+        '''
+        records = [
+            {**self.valid_event['Records'][0], 'messageId': str(i)}
+            for i in range(25)
+        ]
+        records.append({'messageId': 'invalid', 'body': 'not json'})
 
         with (
+            patch.object(bootstrap, 'EXECUTION_MAX_RECORDS', 10),
             patch.object(
                 bootstrap.stepfunctions,
                 'start_execution'
             ) as mock_exec
         ):
-            bootstrap.lambda_handler(event, None)
-            mock_exec.assert_called_once_with(
-                stateMachineArn=TEST_ARN,
-                input='{"a":42,"b":true,"c":"ipsum lorem"}'
-            )
+            bootstrap.lambda_handler({'Records': records}, None)
+
+        inputs = [json.loads(call.kwargs['input'])
+                  for call in mock_exec.call_args_list]
+        self.assertListEqual(
+            [len(sf_input['Records']) for sf_input in inputs], [10, 10, 6]
+        )
+        self.assertDictEqual(
+            inputs[-1]['Records'][-1],
+            {'messageId': 'invalid', 'body': 'not json'}
+        )
+
+        with (
+            patch.object(bootstrap, 'EXECUTION_MAX_BYTES', 1000),
+            patch.object(
+                bootstrap.stepfunctions,
+                'start_execution'
+            ) as mock_exec
+        ):
+            bootstrap.lambda_handler({'Records': records}, None)
+
+        for call in mock_exec.call_args_list:
+            self.assertLessEqual(len(call.kwargs['input']), 1000)
+        self.assertEqual(sum(
+            len(json.loads(call.kwargs['input'])['Records'])
+            for call in mock_exec.call_args_list
+        ), 26)
+
+    def test_bootstrap_partial_failure(self):
+        '''
+        Test the lambda handler of the bootstrap module by failing to start
+        one of several executions, verifying that only its records are
+        reported as batch item failures, that requeue counts and priorities
+        are kept, and that invalid attributes are ignored
+        '''
+        records = [
+            {**self.valid_event['Records'][0], 'messageId': str(i)}
+            for i in range(4)
+        ]
+        records[3]['messageAttributes'] = {
+            'requeue_count': {'stringValue': '2', 'dataType': 'Number'},
+            'priority': {'stringValue': '7', 'dataType': 'Number'}
+        }
+        records[2]['messageAttributes'] = {
+            'priority': {'stringValue': 'high', 'dataType': 'String'}
+        }
+
+        with (
+            patch.object(bootstrap, 'EXECUTION_MAX_RECORDS', 2),
+            patch.object(
+                bootstrap.stepfunctions,
+                'start_execution',
+                side_effect=[
+                    ClientError({'Error': {'Code': 'ThrottlingException'}},
+                                'StartExecution'),
+                    {'executionArn': 'arn'}
+                ]
+            ) as mock_exec
+        ):
+            result = bootstrap.lambda_handler({'Records': records}, None)
+
+        self.assertDictEqual(result, {'batchItemFailures': [
+            {'itemIdentifier': '0'}, {'itemIdentifier': '1'}
+        ]})
+        sf_input = json.loads(mock_exec.call_args.kwargs['input'])
+        self.assertEqual(sf_input['Records'][1]['requeue_count'], 2)
+        self.assertEqual(sf_input['Records'][1]['priority'], 7)
+        self.assertNotIn('priority', sf_input['Records'][0])
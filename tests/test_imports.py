@@ -0,0 +1,67 @@
+'''Tests for the import time of the lambda handlers'''
+from os import environ
+from pathlib import Path
+import subprocess
+import sys
+from unittest import TestCase
+
+ROOT_PATH = Path(__file__).parent.parent
+PACKAGE = 'podaac.swodlr_ingest_to_sds'
+
+# Cumulative import time budgets in milliseconds; generous enough for slow
+# CI hosts while still catching a heavy dependency loaded on import
+IMPORT_BUDGETS = {
+    'bootstrap': 1000,
+    'submit_to_sds': 1500,
+    'poll_status': 1000,
+    'sweeper': 1000,
+    'job_notifications': 1000
+}
+LAZY_MODULES = ('otello', 'cProfile', 'pstats', 'tracemalloc')
+
+
+def _import_times(module):
+    '''
+    Imports a module in a fresh interpreter with -X importtime and returns a
+    dict of each imported module's cumulative import time in milliseconds
+    '''
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, check=True, cwd=ROOT_PATH, text=True,
+        timeout=60, env={
+            **environ,
+            'SWODLR_ENV': 'dev',
+            'AWS_DEFAULT_REGION': 'us-west-2'
+        }
+    ).stderr
+
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1000
+
+    return times
+
+
+class TestImports(TestCase):
+    '''Tests for the import time of the lambda handlers'''
+
+    def test_import_budgets(self):
+        '''
+        Test that each handler imports within its budget on a cold
+        interpreter and without loading the dependencies that are only
+        needed on first use
+        '''
+        for handler, budget in IMPORT_BUDGETS.items():
+            with self.subTest(handler=handler):
+                module = f'{PACKAGE}.{handler}'
+                times = _import_times(module)
+
+                self.assertLess(times[module], budget)
+                self.assertListEqual([
+                    name for name in times
+                    if name.split('.')[0] in LAZY_MODULES
+                ], [])
@@ -0,0 +1,172 @@
+'''Tests for the job_notifications module'''
+from unittest import TestCase
+from unittest.mock import patch
+from os import environ
+import json
+from podaac.swodlr_ingest_to_sds.utilities import utils
+
+with (
+    patch.dict(environ, {
+        'SWODLR_ENV': 'dev',
+        'SWODLR_sds_username': 'test_username',
+        'SWODLR_sds_password': 'test_password'
+    })
+):
+    from podaac.swodlr_ingest_to_sds import job_notifications
+
+
+class _NotificationSource:
+    '''
+    Local stand-in for the SDS's job status topic and its subscribed queue
+    '''
+
+    def __init__(self):
+        self._messages = []
+
+    def publish(self, notification):
+        '''Publishes a notification to the topic'''
+        self._messages.append(json.dumps(notification))
+
+    def receive(self):
+        '''Returns the queued notifications as an SQS event'''
+        records = [
+            {
+                'messageId': f'message_{i}',
+                'body': json.dumps({
+                    'Type': 'Notification',
+                    'Message': message
+                })
+            }
+            for i, message in enumerate(self._messages)
+        ]
+        self._messages = []
+        return {'Records': records}
+
+
+class TestJobNotifications(TestCase):
+    '''Tests for the job_notifications module'''
+
+    def setUp(self):
+        '''
+        Replace the DynamoDB tables with mocks
+        '''
+        patchers = [
+            patch.object(utils, '_ingest_table', create=True),
+            patch.object(utils, '_available_tiles_table', create=True)
+        ]
+        self.mock_ingest_table, self.mock_tiles_table = [
+            patcher.start() for patcher in patchers
+        ]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+        self.source = _NotificationSource()
+
+    def test_job_notifications(self):
+        '''
+        Test the lambda handler for the job_notifications module by
+        publishing notifications for ingest jobs, a job of another type and
+        malformed messages, verifying that the ingest jobs' statuses and
+        tiles are recorded, that other and stale notifications are dropped,
+        and that only records whose status failed to be written are reported
+        as failures
+        '''
+        granule_id = 'SWOT_L2_HR_PIXC_001_002_003L_20230101T000000_01'
+        self.source.publish({
+            'payload_id': 'job_id_1',
+            'status': 'job-completed',
+            'tags': [f'ingest_file_otello__{granule_id}.nc']
+        })
+        self.source.publish({
+            'payload_id': 'job_id_2',
+            'status': 'job-failed',
+            'traceback': 'Error',
+            'job': {
+                'type': 'job-INGEST_STAGED:release',
+                'params': {'data_file': 'granule_id_2.nc'}
+            }
+        })
+        self.source.publish({
+            'payload_id': 'job_id_3',
+            'status': 'job-started',
+            'job': {'type': 'job-OTHER:release', 'params': {}}
+        })
+        self.source.publish({'granule_id': 'granule_id_4',
+                             'job_id': 'job_id_4',
+                             'status': 'job-started'})
+        self.source.publish({'granule_id': 'granule_id_5',
+                             'job_id': 'job_id_5',
+                             'status': 'job-started'})
+        self.source.publish({'granule_id': 'granule_id_6',
+                             'job_id': 'job_id_6'})
+        self.source.publish(['job-completed'])
+        event = self.source.receive()
+        event['Records'].append({'messageId': 'message_x', 'body': '{'})
+
+        errors = {
+            'granule_id_4': 'ProvisionedThroughputExceeded',
+            'granule_id_5': 'ConditionalCheckFailed'
+        }
+
+        def _mock_batch_execute_statement(**kwargs):
+            responses = []
+            for statement in kwargs['Statements']:
+                granule = statement['Parameters'][
+                    statement['Statement'].count('SET')
+                ]['S']
+                responses.append(
+                    {'Error': {'Code': errors[granule]}}
+                    if granule in errors else {}
+                )
+            return {'Responses': responses}
+
+        client = self.mock_ingest_table.meta.client
+        client.batch_execute_statement.side_effect = \
+            _mock_batch_execute_statement
+
+        result = job_notifications.lambda_handler(event, None)
+
+        self.assertDictEqual(result, {
+            'batchItemFailures': [{'itemIdentifier': 'message_3'}]
+        })
+
+        statements = client.batch_execute_statement.call_args_list[0].kwargs[
+            'Statements'
+        ]
+        written = {
+            statement['Parameters'][
+                statement['Statement'].count('SET')
+            ]['S']: statement['Parameters'][0]['S']
+            for statement in statements
+        }
+        self.assertDictEqual(written, {
+            granule_id: 'job-completed',
+            'granule_id_2': 'job-failed',
+            'granule_id_4': 'job-started',
+            'granule_id_5': 'job-started'
+        })
+        self.assertIn('traceback', statements[1]['Statement'])
+
+        # pylint: disable=unnecessary-dunder-call
+        self.mock_tiles_table.batch_writer().__enter__().put_item\
+            .assert_called_once_with(Item={'tile_id': 'PIXC,1,2,3L'})
+
+    def test_sns_records(self):
+        '''
+        Test the lambda handler for the job_notifications module with
+        records delivered directly by SNS
+        '''
+        self.mock_ingest_table.meta.client.batch_execute_statement\
+            .return_value = {'Responses': [{}]}
+
+        result = job_notifications.lambda_handler({'Records': [{
+            'Sns': {'Message': json.dumps({
+                'payload_id': 'job_id_1',
+                'status': 'job-started',
+                'tags': ['ingest_file_otello__granule_id_1.nc']
+            })}
+        }]}, None)
+
+        self.assertDictEqual(result, {'batchItemFailures': []})
+        self.mock_ingest_table.meta.client.batch_execute_statement\
+            .assert_called_once()
@@ -0,0 +1,106 @@
+'''Tests for the job_types module'''
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+from os import environ
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import sleep, time
+import json
+
+with (
+    patch.dict(environ, {
+        'SWODLR_ENV': 'dev',
+        'SWODLR_sds_username': 'test_username',
+        'SWODLR_sds_password': 'test_password'
+    })
+):
+    from podaac.swodlr_ingest_to_sds.job_types import JobTypeCache
+
+
+class TestJobTypes(TestCase):
+    '''Tests for the job_types module'''
+
+    def setUp(self):
+        '''
+        Resolve job versions to a fixed version and give each test its own
+        cache path
+        '''
+        self.tmp_dir = TemporaryDirectory()  # pylint: disable=consider-using-with # noqa: E501
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.cache_path = Path(self.tmp_dir.name).joinpath('cache.json')
+
+        patcher = patch(
+            'podaac.swodlr_common.utilities.BaseUtilities.get_latest_job_version',  # pylint: disable=line-too-long # noqa: E501
+            return_value='job-TEST:1'
+        )
+        self.mock_get_version = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lazy_resolution(self):
+        '''
+        Test that the job version is only resolved on first use, persisted to
+        the cache path, and reused by a new cache on the same path
+        '''
+        cache = JobTypeCache('job-TEST', cache_path=self.cache_path)
+        self.mock_get_version.assert_not_called()
+
+        self.assertEqual(cache.version, 'job-TEST:1')
+        self.assertEqual(cache.version, 'job-TEST:1')
+        self.mock_get_version.assert_called_once_with('job-TEST')
+
+        with open(self.cache_path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['version'], 'job-TEST:1')
+
+        self.mock_get_version.reset_mock()
+        cache = JobTypeCache('job-TEST', cache_path=self.cache_path)
+        self.assertEqual(cache.version, 'job-TEST:1')
+        self.mock_get_version.assert_not_called()
+
+    def test_stale_refresh(self):
+        '''
+        Test that a stale version is served while it is refreshed in the
+        background
+        '''
+        with open(self.cache_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'job_name': 'job-TEST',
+                'version': 'job-TEST:0',
+                'resolved_at': time() - 3600
+            }, f)
+
+        cache = JobTypeCache('job-TEST', ttl=60, cache_path=self.cache_path)
+        self.assertEqual(cache.version, 'job-TEST:0')
+
+        for _ in range(100):
+            if cache.version == 'job-TEST:1':
+                break
+            sleep(0.01)
+
+        self.assertEqual(cache.version, 'job-TEST:1')
+        self.mock_get_version.assert_called_once_with('job-TEST')
+
+    def test_checkout(self):
+        '''
+        Test that checked in job types are reused and that job types of an
+        outdated version are discarded
+        '''
+        cache = JobTypeCache('job-TEST')
+
+        with patch('otello.mozart.Mozart.get_job_type',
+                   side_effect=lambda _: MagicMock()) as mock_get_job_type:
+            with cache.checkout() as first:
+                pass
+            with cache.checkout() as second:
+                pass
+
+            self.assertIs(first, second)
+            first.initialize.assert_called_once_with()
+            mock_get_job_type.assert_called_once_with('job-TEST:1')
+
+            # pylint: disable-next=protected-access
+            cache._version = 'job-TEST:2'
+            with cache.checkout() as third:
+                pass
+
+            self.assertIsNot(first, third)
+            mock_get_job_type.assert_called_with('job-TEST:2')
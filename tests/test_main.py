@@ -0,0 +1,85 @@
+'''Tests for the ingest command line tool'''
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+import json
+
+with patch('boto3.client'):
+    from podaac.swodlr_ingest_to_sds import __main__ as cli
+
+
+class TestMain(TestCase):
+    '''Tests for the ingest command line tool'''
+
+    def setUp(self):
+        '''
+        Create a temporary directory for url and checkpoint files
+        '''
+        tmp_dir = TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_path = Path(tmp_dir.name)
+
+    def test_bulk_ingest(self):
+        '''
+        Test the bulk mode of the ingest tool by publishing urls from a file
+        with one failing publish, verifying that messages are published in
+        batches of ten and that resuming from the checkpoint only publishes
+        the failed url
+        '''
+        s3_urls = [f's3://bucket/test/test-{i}.nc' for i in range(25)]
+        urls_path = self.tmp_path.joinpath('urls.txt')
+        urls_path.write_text(
+            '# Test granules\n' + '\n'.join(s3_urls) + '\n\n',
+            encoding='utf-8'
+        )
+        checkpoint_path = self.tmp_path.joinpath('checkpoint.txt')
+
+        def _mock_publish_batch(TopicArn, PublishBatchRequestEntries):  # pylint: disable=invalid-name # noqa: E501
+            self.assertEqual(TopicArn, 'test_topic')
+            results = {'Successful': [], 'Failed': []}
+            for entry in PublishBatchRequestEntries:
+                message = json.loads(entry['Message'])
+                if message['identifier'] == 'test-7' and not failed_once:
+                    failed_once.append(True)
+                    results['Failed'].append({'Id': entry['Id']})
+                else:
+                    results['Successful'].append({'Id': entry['Id']})
+            return results
+
+        failed_once = []
+        with patch.object(cli, 'sns') as mock_sns:
+            mock_publish = mock_sns.return_value.publish_batch
+            mock_publish.side_effect = _mock_publish_batch
+            result = cli.publish_bulk(
+                'test_topic', cli._read_urls(urls_path),  # pylint: disable=protected-access # noqa: E501
+                workers=2, checkpoint_path=checkpoint_path
+            )
+
+        self.assertTupleEqual(result, (24, 1))
+        self.assertListEqual(sorted(
+            len(call.kwargs['PublishBatchRequestEntries'])
+            for call in mock_publish.call_args_list
+        ), [5, 10, 10])
+
+        with patch.object(cli, 'sns') as mock_sns:
+            mock_publish = mock_sns.return_value.publish_batch
+            mock_publish.side_effect = _mock_publish_batch
+            result = cli.publish_bulk(
+                'test_topic', s3_urls, checkpoint_path=checkpoint_path
+            )
+
+        self.assertTupleEqual(result, (1, 0))
+        entries = mock_publish.call_args.kwargs['PublishBatchRequestEntries']
+        self.assertEqual(len(entries), 1)
+        self.assertDictEqual(json.loads(entries[0]['Message']), {
+            'identifier': 'test-7',
+            'product': {'files': [{
+                'name': 'test-7.nc',
+                'uri': 's3://bucket/test/test-7.nc',
+                'type': 'data'
+            }]}
+        })
+        self.assertEqual(
+            len(checkpoint_path.read_text(encoding='utf-8').splitlines()), 25
+        )
@@ -0,0 +1,80 @@
+'''Tests for the metrics module'''
+import json
+from time import perf_counter
+from unittest import TestCase
+from unittest.mock import patch
+from podaac.swodlr_ingest_to_sds import metrics as metrics_module
+from podaac.swodlr_ingest_to_sds.metrics import Metrics
+
+
+class TestMetrics(TestCase):
+    '''Tests for the metrics module'''
+
+    def _capture(self, metrics, handler, *args):
+        with self.assertLogs(metrics_module.logger, 'INFO') as logs:
+            result = metrics.instrument('test_function')(handler)(*args)
+
+        records = [json.loads(record.getMessage()) for record in logs.records]
+        return result, records
+
+    def test_metrics(self):
+        '''
+        Test the metrics of an instrumented handler, verifying that timings
+        and counts are emitted as EMF records dimensioned by function, that
+        timings with more values than fit in a record are split across
+        records, and that metrics are reset between invocations
+        '''
+        metrics = Metrics(namespace='test', enabled=True)
+
+        def _handler(count):
+            for _ in range(count):
+                with metrics.timer('Phase'):
+                    pass
+            metrics.count('Granules', count)
+            metrics.count('Granules')
+            return 'result'
+
+        result, records = self._capture(metrics, _handler, 150)
+
+        self.assertEqual(result, 'result')
+        self.assertEqual(len(records), 2)
+        self.assertDictEqual(records[0]['_aws']['CloudWatchMetrics'][0], {
+            'Namespace': 'test',
+            'Dimensions': [['Function']],
+            'Metrics': [
+                {'Name': 'Phase', 'Unit': 'Milliseconds'},
+                {'Name': 'Handler', 'Unit': 'Milliseconds'},
+                {'Name': 'Granules', 'Unit': 'Count'}
+            ]
+        })
+        self.assertEqual(records[0]['Function'], 'test_function')
+        self.assertEqual(records[0]['Granules'], 151)
+        self.assertEqual(len(records[0]['Phase']), 100)
+        self.assertEqual(len(records[0]['Handler']), 1)
+        self.assertEqual(len(records[1]['Phase']), 50)
+        self.assertNotIn('Granules', records[1])
+
+        _, records = self._capture(metrics, _handler, 1)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(len(records[0]['Phase']), 1)
+        self.assertEqual(records[0]['Granules'], 2)
+
+    def test_disabled_metrics(self):
+        '''
+        Test disabled metrics, verifying that nothing is emitted and that
+        recording is cheap
+        '''
+        metrics = Metrics(enabled=False)
+
+        start = perf_counter()
+        for _ in range(10000):
+            with metrics.timer('Phase'):
+                pass
+            metrics.count('Granules')
+        elapsed = perf_counter() - start
+
+        with patch.object(metrics_module, '_emit') as mock_emit:
+            metrics.flush('test_function')
+        mock_emit.assert_not_called()
+
+        self.assertLess(elapsed / 10000, 20e-6)
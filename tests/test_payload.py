@@ -0,0 +1,93 @@
+'''Tests for the payload module'''
+from unittest import TestCase
+from uuid import uuid4
+import json
+from podaac.swodlr_ingest_to_sds import payload
+
+STATE_LIMIT = 256 * 1024
+
+
+class TestPayload(TestCase):
+    '''Tests for the payload module'''
+
+    @staticmethod
+    def _jobs(count):
+        jobs = [
+            {
+                'granule_id': f'SWOT_L2_HR_PIXC_{i // 1000:03}_{i % 584:03}'
+                              f'_{i % 308:03}L_20230412T000000_20230412T000010'
+                              '_PIB0_01',
+                'job_id': str(uuid4()),
+                'status': 'job-queued'
+            }
+            for i in range(count)
+        ]
+        # Jobs which have been polled carry schedule fields
+        for i, item in enumerate(jobs[::2]):
+            item['status_since'] = 1681257600 + i
+            item['next_check'] = 1681257660 + i
+
+        return jobs
+
+    def test_round_trip(self):
+        '''
+        Test that job sets of every size decode to the jobs they were encoded
+        from and that missing keys stay missing
+        '''
+        for count in (0, 5, payload.COMPACT_MIN_JOBS,
+                      payload.COMPRESS_MIN_JOBS):
+            jobs = self._jobs(count)
+            job_set = json.loads(json.dumps(payload.encode_job_set(jobs)))
+
+            self.assertEqual(job_set['job_count'], count)
+            self.assertListEqual(payload.decode_jobs(job_set['jobs']), jobs)
+
+    def test_forms(self):
+        '''
+        Test that the encoding used depends on the size of the job set
+        '''
+        self.assertIsInstance(payload.encode_jobs(self._jobs(5)), list)
+        self.assertIn('columns', payload.encode_jobs(
+            self._jobs(payload.COMPACT_MIN_JOBS)
+        )[0])
+        self.assertIn('zlib', payload.encode_jobs(
+            self._jobs(payload.COMPRESS_MIN_JOBS)
+        )[0])
+
+    def test_legacy_choice(self):
+        '''
+        Test that every non-empty job set has a first item, which executions
+        of the previous step function definition check for before polling,
+        and that an unwrapped encoded job set still decodes
+        '''
+        for count in (0, 5, payload.COMPACT_MIN_JOBS,
+                      payload.COMPRESS_MIN_JOBS):
+            encoded = payload.encode_jobs(self._jobs(count))
+            self.assertEqual(len(encoded) > 0, count > 0)
+
+        jobs = self._jobs(payload.COMPACT_MIN_JOBS)
+        self.assertListEqual(
+            payload.decode_jobs(payload.encode_jobs(jobs)[0]), jobs
+        )
+
+    def test_state_limit(self):
+        '''
+        Test that a job set several times larger than fits in the state limit
+        as a plain list fits once encoded
+        '''
+        jobs = self._jobs(5000)
+        plain = json.dumps({'jobs': jobs}, separators=(',', ':'))
+        encoded = json.dumps(payload.encode_job_set(jobs),
+                             separators=(',', ':'))
+
+        self.assertGreater(len(plain), STATE_LIMIT * 2)
+        self.assertLess(len(encoded), STATE_LIMIT)
+
+    def test_unsupported_version(self):
+        '''
+        Test that job sets of an unknown version are rejected
+        '''
+        with self.assertRaises(ValueError):
+            payload.decode_jobs({'v': 0, 'columns': {}})
+        with self.assertRaises(ValueError):
+            payload.decode_jobs([{'v': 0, 'columns': {}}])
@@ -1,9 +1,14 @@
 '''Tests for the poll_status module'''
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from pathlib import Path
 import json
+import logging
+import re
 from os import environ
+from threading import Event
+from time import perf_counter, time
+from botocore.exceptions import ClientError
 from podaac.swodlr_ingest_to_sds.utilities import utils
 
 with (
@@ -16,6 +21,13 @@ with (
     from podaac.swodlr_ingest_to_sds import poll_status
 
 
+def _granule_id(statement):
+    '''
+    Returns the granule id a PartiQL update is conditioned on
+    '''
+    return statement['Parameters'][statement['Statement'].count('SET')]['S']
+
+
 class TestPollStatus(TestCase):
     '''Tests for the poll_status module'''
     data_path = Path(__file__).parent.joinpath('data')
@@ -23,48 +35,423 @@ class TestPollStatus(TestCase):
     with open(poll_event_path, encoding='utf-8') as f:
         poll_event = json.load(f)
 
-    @patch('boto3.resource')
-    def test_poll_status(self, _):
+    def setUp(self):
+        '''
+        Replace the DynamoDB tables with mocks
+        '''
+        self.mock_ingest_table = self._patch_table('_ingest_table')
+        self.mock_tiles_table = self._patch_table('_available_tiles_table')
+        self.mock_ingest_table.meta.client.batch_execute_statement\
+            .side_effect = lambda **kwargs: {
+                'Responses': [{} for _ in kwargs['Statements']]
+            }
+
+    def test_poll_status(self):
         '''
         Test the lambda handler for the poll_status module by submitting two
         jobs, polling their status, verifying that the correct jobs are
         updated in the database, and verifying that remaining jobs are
         returned in the event.
         '''
-        _statuses = [
-            {'status': 'job-completed'},
-            {'status': 'job-started'}
-        ]
+        _statuses = {
+            'job_id_1': {'status': 'job-started'},
+            'job_id_2': {'status': 'job-completed'}
+        }
 
-        def _mock_get_info():
-            nonlocal _statuses
-            return _statuses.pop()
+        def _mock_get_job_by_id(job_id):
+            return MagicMock(**{'get_info.return_value': _statuses[job_id]})
 
         event = None
         with (
-            patch('otello.mozart.Mozart.get_job_by_id') as mock_get_job_by_id,
+            patch.object(utils, 'get_job_statuses', return_value={}),
+            patch('otello.mozart.Mozart.get_job_by_id',
+                  side_effect=_mock_get_job_by_id),
         ):
-            mock_get_job_by_id().get_info.side_effect = _mock_get_info
             event = poll_status.lambda_handler(self.poll_event, None)
 
         self.assertEqual(len(event['jobs']), 1)
-        self.assertDictEqual(event['jobs'][0], {
+        self.assertEqual(event['jobs'][0]['job_id'], 'job_id_1')
+        self.assertEqual(event['jobs'][0]['granule_id'], 'granule_id_1')
+        self.assertEqual(event['jobs'][0]['status'], 'job-started')
+
+        self.assertDictEqual(self._written_statuses(), {
+            'granule_id_1': ['job-started'],
+            'granule_id_2': ['job-completed']
+        })
+
+        # Transitions are timestamped
+        statements = {
+            _granule_id(statement): statement['Statement']
+            for call in self.mock_ingest_table.meta.client
+            .batch_execute_statement.call_args_list
+            for statement in call.kwargs['Statements']
+        }
+        self.assertIn('SET "started_at" = ?', statements['granule_id_1'])
+        self.assertIn('SET "finished_at" = ?', statements['granule_id_2'])
+
+    def test_poll_status_bulk(self):
+        '''
+        Test the lambda handler for the poll_status module by returning the
+        status of one job from the bulk lookup, verifying that only the
+        missing job falls back to an individual lookup and that both jobs are
+        updated in the database.
+        '''
+        with (
+            patch.object(utils, 'get_job_statuses', return_value={
+                'job_id_2': {'status': 'job-failed', 'traceback': 'Error'}
+            }) as mock_get_job_statuses,
+            patch('otello.mozart.Mozart.get_job_by_id') as mock_get_job_by_id
+        ):
+            mock_get_job_by_id.return_value.get_info.return_value = {
+                'status': 'job-started'
+            }
+            event = poll_status.lambda_handler(self.poll_event, None)
+
+        mock_get_job_statuses.assert_called_once_with(
+            ['job_id_1', 'job_id_2'], timeout=None
+        )
+        mock_get_job_by_id.assert_called_once_with('job_id_1')
+
+        self.assertEqual(len(event['jobs']), 1)
+        self.assertEqual(event['jobs'][0]['job_id'], 'job_id_1')
+
+        self.assertDictEqual(self._written_statuses(), {
+            'granule_id_1': ['job-started'],
+            'granule_id_2': ['job-failed', 'Error']
+        })
+
+    def test_poll_status_deadline(self):
+        '''
+        Test the lambda handler for the poll_status module by stalling the
+        status check of one job past the lambda's deadline, verifying that
+        the handler returns without waiting for it and that the unchecked
+        job is returned in the event.
+        '''
+        release = Event()
+
+        def _mock_get_job_by_id(job_id):
+            if job_id == 'job_id_1':
+                release.wait(5)
+            return MagicMock(**{
+                'get_info.return_value': {'status': 'job-completed'}
+            })
+
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = \
+            poll_status.DEADLINE_MARGIN_MS + 200
+
+        try:
+            with (
+                patch.object(utils, 'get_job_statuses', return_value={}),
+                patch('otello.mozart.Mozart.get_job_by_id',
+                      side_effect=_mock_get_job_by_id)
+            ):
+                event = poll_status.lambda_handler(self.poll_event, context)
+        finally:
+            release.set()
+
+        self.assertListEqual(event['jobs'], [{
             'job_id': 'job_id_1',
             'granule_id': 'granule_id_1'
+        }])
+        self.assertDictEqual(self._written_statuses(), {
+            'granule_id_2': ['job-completed']
         })
 
-        valid_statuses = {
-            'granule_id_1': 'job-started',
-            'granule_id_2': 'job-completed'
-        }
+    def test_poll_status_bulk_deadline(self):
+        '''
+        Test the lambda handler for the poll_status module by stalling the
+        bulk status lookup past the lambda's deadline, verifying that the
+        lookup is given the time left as its timeout, that the handler returns
+        without waiting for it and that the jobs are returned in the event.
+        '''
+        release = Event()
+
+        def _mock_get_job_statuses(_job_ids, timeout):
+            release.wait(5)
+            return {}
+
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = \
+            poll_status.DEADLINE_MARGIN_MS + 200
+
+        try:
+            with (
+                patch.object(utils, 'get_job_statuses',
+                             side_effect=_mock_get_job_statuses)
+                as mock_get_job_statuses,
+                patch('otello.mozart.Mozart.get_job_by_id')
+                as mock_get_job_by_id
+            ):
+                mock_get_job_by_id.return_value.get_info.return_value = {
+                    'status': 'job-started'
+                }
+                start = perf_counter()
+                event = poll_status.lambda_handler(self.poll_event, context)
+                elapsed = perf_counter() - start
+        finally:
+            release.set()
+
+        self.assertLess(elapsed, 2)
+        self.assertLessEqual(
+            mock_get_job_statuses.call_args.kwargs['timeout'], 0.2
+        )
+        self.assertEqual(event['job_count'], 2)
+
+    def test_poll_status_schedule(self):
+        '''
+        Test the lambda handler for the poll_status module by submitting one
+        job which is due and one which is not, verifying that only the due job
+        is checked and rescheduled and that the wait until the next check is
+        returned.
+        '''
+        now = int(time())
+        event = {'jobs': [
+            {'granule_id': 'granule_id_1', 'job_id': 'job_id_1',
+             'status': 'job-queued', 'status_since': now - 500,
+             'next_check': now - 1},
+            {'granule_id': 'granule_id_2', 'job_id': 'job_id_2',
+             'status': 'job-queued', 'status_since': now - 100,
+             'next_check': now + 120}
+        ]}
+
+        with (
+            patch.object(utils, 'get_job_statuses', return_value={
+                'job_id_1': {'status': 'job-queued'}
+            }) as mock_get_job_statuses
+        ):
+            event = poll_status.lambda_handler(event, None)
+
+        mock_get_job_statuses.assert_called_once_with(['job_id_1'],
+                                                      timeout=None)
+        self.assertEqual(len(event['jobs']), 2)
+
+        # Queued for 500s: interval doubles from 60s up to 480s
+        rescheduled = event['jobs'][0]
+        self.assertEqual(rescheduled['status_since'], now - 500)
+        self.assertAlmostEqual(rescheduled['next_check'], now + 480, delta=2)
+        self.assertAlmostEqual(event['wait_seconds'], 120, delta=2)
+
+        # Unchanged status is not rewritten
+        self.mock_ingest_table.meta.client.batch_execute_statement\
+            .assert_not_called()
+
+    def test_poll_status_writes(self):
+        '''
+        Test the lambda handler for the poll_status module by completing many
+        jobs for the same few tiles, verifying that statuses are written in
+        batches conditional on the granule's job still being in flight, that
+        each tile is inserted once, that jobs whose status failed to be
+        written are kept in the queue, and that stale statuses are dropped
+        without inserting tiles.
+        '''
+        granule_ids = [
+            f'SWOT_L2_HR_PIXC_001_002_{i % 3:03}L_20230101T000000_{i}'
+            for i in range(30)
+        ]
+        event = {'jobs': [
+            {'granule_id': granule_id, 'job_id': f'job_id_{i}'}
+            for i, granule_id in enumerate(granule_ids)
+        ]}
+
+        def _mock_batch_execute_statement(**kwargs):
+            return {'Responses': [
+                {'Error': {'Code': 'ProvisionedThroughputExceeded'}}
+                if _granule_id(statement) == granule_ids[0] else
+                {'Error': {'Code': 'ConditionalCheckFailed'}}
+                if _granule_id(statement) == granule_ids[1] else {}
+                for statement in kwargs['Statements']
+            ]}
+
+        self.mock_ingest_table.meta.client.batch_execute_statement\
+            .side_effect = _mock_batch_execute_statement
+
+        with (
+            patch.object(utils, 'get_job_statuses', return_value={
+                f'job_id_{i}': {'status': 'job-completed'}
+                for i in range(30)
+            })
+        ):
+            event = poll_status.lambda_handler(event, None)
+
+        self.assertEqual(len(event['jobs']), 1)
+        self.assertEqual(event['jobs'][0]['granule_id'], granule_ids[0])
+
+        calls = self.mock_ingest_table.meta.client.batch_execute_statement\
+            .call_args_list
+        batch_sizes = [len(call.kwargs['Statements']) for call in calls]
+        self.assertListEqual(batch_sizes, [25, 5, 25, 3])
+
+        statement = calls[1].kwargs['Statements'][0]
+        self.assertTrue(statement['Statement'].endswith(
+            ' WHERE "granule_id" = ? AND "job_id" = ?'
+            ' AND "status" IN [?, ?, ?]'
+        ))
+        self.assertIn(' SET "tile_pending_since" = ?', statement['Statement'])
+        self.assertListEqual(statement['Parameters'][-4:], [
+            {'S': 'job_id_25'}, {'S': 'job-queued'}, {'S': 'job-started'},
+            {'S': 'job-completed'}
+        ])
+
+        # pylint: disable=unnecessary-dunder-call
+        put_item_calls = self.mock_tiles_table.batch_writer().__enter__()\
+            .put_item.call_args_list
+        self.assertSetEqual(
+            {call.kwargs['Item']['tile_id'] for call in put_item_calls},
+            {'PIXC,1,2,0L', 'PIXC,1,2,1L', 'PIXC,1,2,2L'}
+        )
+        self.assertEqual(len(put_item_calls), 3)
+
+    def test_poll_status_job_times(self):
+        '''
+        Test the lambda handler for the poll_status module by completing a
+        job which was never seen running, verifying that Mozart's start and
+        end times are written as its started_at and finished_at in UTC.
+        '''
+        event = {'jobs': [{'granule_id': 'granule_id_1', 'job_id': 'job_id_1',
+                           'status': 'job-queued'}]}
+        with (
+            patch.object(utils, 'get_job_statuses', return_value={
+                'job_id_1': {'status': 'job-completed', 'job': {'job_info': {
+                    'time_start': '2023-04-12T00:01:00.000000Z',
+                    'time_end': '2023-04-12T02:06:00+02:00'
+                }}}
+            })
+        ):
+            poll_status.lambda_handler(event, None)
+
+        statement = self.mock_ingest_table.meta.client\
+            .batch_execute_statement.call_args_list[0].kwargs['Statements'][0]
+        times = dict(zip(
+            re.findall(r'SET "(\w+)"', statement['Statement']),
+            [param['S'] for param in statement['Parameters']]
+        ))
+        self.assertEqual(times['started_at'], '2023-04-12T00:01:00')
+        self.assertEqual(times['finished_at'], '2023-04-12T00:06:00')
+
+    def test_poll_status_tile_retry(self):
+        '''
+        Test the lambda handler for the poll_status module by failing to
+        insert the tile of a completed job once, verifying that the job is
+        kept, that its completion is rewritten on the next poll despite the
+        granule already being completed, and that its tile is then inserted.
+        '''
+        granule_id = 'SWOT_L2_HR_PIXC_001_002_003L_20230101T000000_0'
+        rows = {granule_id: {'job_id': 'job_id_1', 'status': 'job-queued'}}
+
+        def _mock_batch_execute_statement(**kwargs):
+            responses = []
+            for statement in kwargs['Statements']:
+                values = [param['S'] for param in statement['Parameters']]
+                sets = statement['Statement'].count('SET')
+                row = rows[values[sets]]
+                if 'REMOVE' in statement['Statement']:
+                    row.pop('tile_pending_since', None)
+                    responses.append({})
+                    continue
+
+                if row['job_id'] != values[sets + 1] \
+                        or row['status'] not in values[sets + 2:]:
+                    responses.append(
+                        {'Error': {'Code': 'ConditionalCheckFailed'}}
+                    )
+                else:
+                    row['status'] = values[0]
+                    row['tile_pending_since'] = values[1]
+                    responses.append({})
+
+            return {'Responses': responses}
+
+        self.mock_ingest_table.meta.client.batch_execute_statement\
+            .side_effect = _mock_batch_execute_statement
+        writer = MagicMock()
+        self.mock_tiles_table.batch_writer.return_value.__enter__\
+            .side_effect = [
+                ClientError({'Error': {'Code': 'InternalServerError'}},
+                            'BatchWriteItem'),
+                writer
+            ]
+
+        event = {'jobs': [{'granule_id': granule_id, 'job_id': 'job_id_1'}]}
+        with (
+            patch.object(utils, 'get_job_statuses', return_value={
+                'job_id_1': {'status': 'job-completed'}
+            })
+        ):
+            event = poll_status.lambda_handler(event, None)
+            self.assertEqual(event['job_count'], 1)
+            self.assertIn('tile_pending_since', rows[granule_id])
+            writer.put_item.assert_not_called()
+
+            event = poll_status.lambda_handler(event, None)
+
+        self.assertEqual(event['job_count'], 0)
+        self.assertDictEqual(rows[granule_id], {
+            'job_id': 'job_id_1', 'status': 'job-completed'
+        })
+        writer.put_item.assert_called_once_with(
+            Item={'tile_id': 'PIXC,1,2,3L'}
+        )
+
+    def test_poll_status_scaling(self):
+        '''
+        Micro-benchmark the lambda handler for the poll_status module by
+        polling 1,000 and 10,000 jobs of which half have finished, verifying
+        that the per-job cost stays flat as the number of jobs grows.
+        '''
+        def _per_job_seconds(count):
+            event = {'jobs': [
+                {'granule_id': f'granule_id_{i}', 'job_id': f'job_id_{i}'}
+                for i in range(count)
+            ]}
+            statuses = {
+                f'job_id_{i}': {
+                    'status': 'job-failed' if i % 2 else 'job-started'
+                }
+                for i in range(count)
+            }
+
+            logging.disable(logging.CRITICAL)
+            try:
+                with patch.object(utils, 'get_job_statuses',
+                                  return_value=statuses):
+                    start = perf_counter()
+                    event = poll_status.lambda_handler(event, None)
+                    elapsed = perf_counter() - start
+            finally:
+                logging.disable(logging.NOTSET)
+
+            self.assertEqual(event['job_count'], count // 2)
+            return elapsed / count
+
+        _per_job_seconds(1000)  # Warm up
+        small = min(_per_job_seconds(1000) for _ in range(3))
+        large = min(_per_job_seconds(10000) for _ in range(3))
+
+        self.assertLess(large, small * 3)
+
+    def _patch_table(self, attribute):
+        patcher = patch.object(utils, attribute, create=True)
+        mock_table = patcher.start()
+        self.addCleanup(patcher.stop)
+        return mock_table
+
+    def _written_statuses(self):
+        '''
+        Returns the parameters set by each PartiQL update by granule id,
+        less the last_check and transition timestamps
+        '''
+        client = self.mock_ingest_table.meta.client
+        written = {}
+        for call in client.batch_execute_statement.call_args_list:
+            for statement in call.kwargs['Statements']:
+                if 'REMOVE' in statement['Statement']:
+                    continue
 
-        # pylint: disable=no-member
-        update_item_calls = utils.ingest_table.update_item.call_args_list
-        self.assertEqual(len(update_item_calls), 2)
-        for call in update_item_calls:
-            kwargs = call.kwargs
-            key = kwargs['Key']['granule_id']
-            status = kwargs['ExpressionAttributeValues'][':status']
+                values = [param['S'] for param in statement['Parameters']]
+                sets = statement['Statement'].count('SET')
+                written[values[sets]] = [values[0]] + [
+                    value for value in values[2:sets] if value != values[1]
+                ]
 
-            self.assertEqual(status, valid_statuses[key])
-            del valid_statuses[key]
+        return written
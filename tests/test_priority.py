@@ -0,0 +1,54 @@
+'''Tests for the priority module'''
+from unittest import TestCase
+from podaac.swodlr_ingest_to_sds.priority import PriorityPolicy
+
+
+def _granule(cycle, pass_, product='PIXC', **kwargs):
+    return {
+        'id': f'SWOT_L2_HR_{product}_{cycle:03d}_{pass_:03d}_100L_'
+              '20240101T000000_20240101T000100_PIC0_01',
+        **kwargs
+    }
+
+
+class TestPriority(TestCase):
+    '''Tests for the priority module'''
+
+    def test_prioritize(self):
+        '''
+        Test the priority policy, verifying that granules are prioritized by
+        product, that granules within the recent window of the newest cycle
+        and pass seen are boosted, that requested priorities override the
+        policy and are clamped to Mozart's range, and that granules of equal
+        priority keep their order
+        '''
+        policy = PriorityPolicy(
+            products={'PIXC': 3, 'PIXCVec': 2}, default=0,
+            recent_passes=10, recent_boost=4
+        )
+
+        granules = policy.prioritize([
+            _granule(1, 5),
+            _granule(1, 6),
+            {'id': 'test-1'},
+            _granule(2, 1, 'PIXCVec'),
+            _granule(1, 20, requested_priority=12),
+            _granule(2, 2)
+        ])
+
+        self.assertListEqual([
+            (granule['id'][:27], granule['priority']) for granule in granules
+        ], [
+            ('SWOT_L2_HR_PIXC_001_020_100', 9),
+            ('SWOT_L2_HR_PIXC_002_002_100', 7),
+            ('SWOT_L2_HR_PIXCVec_002_001_', 6),
+            ('SWOT_L2_HR_PIXC_001_005_100', 3),
+            ('SWOT_L2_HR_PIXC_001_006_100', 3),
+            ('test-1', 0)
+        ])
+
+        # The newest cycle and pass is kept across batches
+        [granule] = policy.prioritize([_granule(2, 1)])
+        self.assertEqual(granule['priority'], 7)
+        [granule] = policy.prioritize([_granule(1, 500)])
+        self.assertEqual(granule['priority'], 3)
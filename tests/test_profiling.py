@@ -0,0 +1,78 @@
+'''Tests for the profiling module'''
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+from podaac.swodlr_ingest_to_sds import profiling
+from podaac.swodlr_ingest_to_sds.profiling import Profiler
+
+
+def _handler(event, _context):
+    return [str(i) for i in range(event['count'])]
+
+
+class TestProfiling(TestCase):
+    '''Tests for the profiling module'''
+
+    def setUp(self):
+        '''
+        Create a temporary directory for profiles
+        '''
+        tmp_dir = TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_path = Path(tmp_dir.name)
+
+    def test_profile(self):
+        '''
+        Test a profiled handler, verifying that sampled invocations write
+        cProfile stats and a report of functions and allocations named by
+        the request id, and that unsampled invocations write nothing
+        '''
+        profiler = Profiler(sample_rate=0.5, output=str(self.tmp_path))
+        handler = profiler.profile('test_function')(_handler)
+        context = MagicMock(aws_request_id='test-request')
+
+        with patch('random.random', return_value=0.7):
+            self.assertEqual(len(handler({'count': 10}, context)), 10)
+        self.assertListEqual(list(self.tmp_path.iterdir()), [])
+
+        with patch('random.random', return_value=0.2):
+            self.assertEqual(len(handler({'count': 10}, context)), 10)
+
+        paths = sorted(self.tmp_path.iterdir())
+        self.assertListEqual([path.suffix for path in paths],
+                             ['.prof', '.txt'])
+        self.assertTrue(paths[0].name.startswith('test_function-'))
+        self.assertTrue(paths[0].stem.endswith('-test-request'))
+
+        report = paths[1].read_text(encoding='utf-8')
+        self.assertIn('_handler', report)
+        self.assertIn('allocations by line', report)
+
+    def test_profile_s3(self):
+        '''
+        Test a profiled handler with an S3 output, verifying that profiles
+        are uploaded under the prefix and removed locally
+        '''
+        profiler = Profiler(sample_rate=1, output='s3://test-bucket/profiles/')
+        handler = profiler.profile('test_function')(_handler)
+
+        with patch.object(profiling, 'LOCAL_DIR', str(self.tmp_path)), \
+                patch('boto3.client') as mock_client:
+            handler({'count': 10}, None)
+
+        upload_file = mock_client.return_value.upload_file
+        self.assertEqual(upload_file.call_count, 2)
+        for call in upload_file.call_args_list:
+            _, bucket, key = call.args
+            self.assertEqual(bucket, 'test-bucket')
+            self.assertTrue(key.startswith('profiles/test_function-'))
+        self.assertListEqual(list(self.tmp_path.iterdir()), [])
+
+    def test_disabled_profile(self):
+        '''
+        Test a disabled profiler, verifying that handlers are left
+        undecorated
+        '''
+        profiler = Profiler(sample_rate=0)
+        self.assertIs(profiler.profile('test_function')(_handler), _handler)
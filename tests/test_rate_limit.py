@@ -0,0 +1,154 @@
+'''Tests for the rate_limit module'''
+from copy import deepcopy
+from threading import Lock, Thread
+from unittest import TestCase
+from botocore.exceptions import ClientError
+from podaac.swodlr_ingest_to_sds.rate_limit import TokenBucket
+
+
+class _LocalTable:
+    '''
+    Local stand-in for a DynamoDB table which supports the conditional
+    updates the token bucket makes
+    '''
+
+    def __init__(self):
+        self.items = {}
+        self.updates = 0
+        self.conflicts = 0
+        self.before_update = None
+        self._lock = Lock()
+
+    def get_item(self, Key, ConsistentRead):  # pylint: disable=invalid-name
+        '''Stand-in for Table.get_item'''
+        assert ConsistentRead
+        with self._lock:
+            item = self.items.get(Key['bucket_id'])
+            return {} if item is None else {'Item': deepcopy(item)}
+
+    # pylint: disable-next=invalid-name,too-many-arguments
+    def update_item(self, Key, UpdateExpression, ConditionExpression,
+                    ExpressionAttributeValues):
+        '''Stand-in for Table.update_item'''
+        assert UpdateExpression == 'SET tokens = :tokens, updated_at = :now'
+        if self.before_update is not None:
+            self.before_update()
+
+        with self._lock:
+            item = self.items.get(Key['bucket_id'])
+            if ConditionExpression == 'attribute_not_exists(bucket_id)':
+                passed = item is None
+            else:
+                assert ConditionExpression == 'updated_at = :previous'
+                passed = item is not None and item['updated_at'] == \
+                    ExpressionAttributeValues[':previous']
+
+            if not passed:
+                self.conflicts += 1
+                raise ClientError(
+                    {'Error': {'Code': 'ConditionalCheckFailedException'}},
+                    'UpdateItem'
+                )
+
+            self.updates += 1
+            self.items[Key['bucket_id']] = {
+                **Key,
+                'tokens': ExpressionAttributeValues[':tokens'],
+                'updated_at': ExpressionAttributeValues[':now']
+            }
+
+
+class _Clock:
+    '''Manually advanced clock'''
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimit(TestCase):
+    '''Tests for the rate_limit module'''
+
+    def setUp(self):
+        '''
+        Create a local table and clock shared by the buckets under test
+        '''
+        self.table = _LocalTable()
+        self.clock = _Clock()
+
+    def _bucket(self, **kwargs):
+        return TokenBucket(self.table, 'test', clock=self.clock, **kwargs)
+
+    def test_token_bucket(self):
+        '''
+        Test the token bucket by draining it, verifying that requests beyond
+        the burst are denied and that tokens refill at the configured rate
+        up to the burst
+        '''
+        bucket = self._bucket(rate=2, burst=10)
+
+        self.assertEqual(bucket.acquire(4), 4)
+        self.assertEqual(bucket.acquire(10), 6)
+        self.assertEqual(bucket.acquire(1), 0)
+
+        self.clock.now += 2.5
+        self.assertEqual(bucket.acquire(10), 5)
+
+        self.clock.now += 3600
+        self.assertEqual(bucket.acquire(100), 10)
+
+    def test_shared_bucket(self):
+        '''
+        Test the token bucket with several instances drawing from the same
+        item concurrently and contending for updates, verifying that no more
+        tokens are granted in total than the bucket holds
+        '''
+        buckets = [self._bucket(rate=1, burst=50) for _ in range(4)]
+        granted = []
+        granted_lock = Lock()
+
+        def _acquire(bucket):
+            for _ in range(20):
+                count = bucket.acquire(1)
+                with granted_lock:
+                    granted.append(count)
+
+        threads = [Thread(target=_acquire, args=(bucket,))
+                   for bucket in buckets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLessEqual(sum(granted), 50)
+        self.assertEqual(sum(granted) + buckets[0].acquire(100), 50)
+
+        self.table.items = {}
+        conflicting = self._bucket(rate=1, burst=50)
+        self.table.before_update = lambda: (
+            setattr(self.table, 'before_update', None),
+            conflicting.acquire(5)
+        )
+        self.assertEqual(self._bucket(rate=1, burst=50).acquire(10), 10)
+        self.assertEqual(self.table.conflicts, 1)
+        self.assertEqual(float(self.table.items['test']['tokens']), 35)
+
+    def test_local_lease(self):
+        '''
+        Test the token bucket's local lease, verifying that leased tokens are
+        served without a round trip to the table
+        '''
+        bucket = self._bucket(rate=1, burst=100, lease=10)
+
+        self.assertEqual(bucket.acquire(1), 1)
+        self.assertEqual(self.table.updates, 1)
+        self.assertEqual(float(self.table.items['test']['tokens']), 89)
+
+        for _ in range(10):
+            self.assertEqual(bucket.acquire(1), 1)
+        self.assertEqual(self.table.updates, 1)
+
+        self.assertEqual(bucket.acquire(1), 1)
+        self.assertEqual(self.table.updates, 2)
@@ -0,0 +1,82 @@
+'''Tests for the report module'''
+from datetime import datetime, timedelta
+from unittest import TestCase
+from unittest.mock import MagicMock
+from podaac.swodlr_ingest_to_sds import report
+
+GRANULE_ID = 'SWOT_L2_HR_{product}_{cycle:03d}_002_003L_20230101T000000_{i}'
+
+
+class TestReport(TestCase):
+    '''Tests for the report module'''
+
+    def test_latency_report(self):
+        '''
+        Test the latency report by scanning granules of two products and
+        cycles from a segmented table, verifying the percentiles of each
+        group and that granules which haven't started or finished only count
+        towards the latencies they have timestamps for
+        '''
+        submitted_at = datetime(2023, 1, 1, 0, 0, 10)
+        items = []
+        for i in range(100):
+            # Queued for i + 1 seconds and running for 100 - i seconds
+            started_at = submitted_at + timedelta(seconds=i + 1)
+            items.append({
+                'granule_id': GRANULE_ID.format(product='PIXC', cycle=1, i=i),
+                'first_seen': '2023-01-01T00:00:00',
+                'submitted_at': submitted_at.isoformat(),
+                'started_at': started_at.isoformat(),
+                'finished_at': (submitted_at + timedelta(seconds=101))
+                .isoformat()
+            })
+        items.append({
+            'granule_id': GRANULE_ID.format(product='PIXCVec', cycle=2, i=0),
+            'first_seen': '2023-01-02T00:00:00',
+            'submitted_at': '2023-01-02T00:00:00',
+            'started_at': '2023-01-02T00:01:00'
+        })
+        items.append({
+            'granule_id': 'not_a_swot_granule',
+            'submitted_at': '2023-01-02T00:00:00'
+        })
+
+        table = MagicMock()
+        paginator = table.meta.client.get_paginator.return_value
+        paginator.paginate.side_effect = lambda **kwargs: [{'Items': [
+            {key: {'S': value} for key, value in item.items()}
+            for item in items[kwargs['Segment']::kwargs['TotalSegments']]
+        ]}]
+
+        result = report.latency_report(report.scan_transitions(table, 3))
+
+        self.assertEqual(paginator.paginate.call_count, 3)
+        self.assertListEqual(list(result), [
+            ('PIXC', 1, '2023-01-01'), ('PIXCVec', 2, '2023-01-02')
+        ])
+
+        pixc = result[('PIXC', 1, '2023-01-01')]
+        self.assertDictEqual(pixc['queue'], {
+            'count': 100, 'p50': 50, 'p90': 90, 'p99': 99
+        })
+        self.assertDictEqual(pixc['run'], {
+            'count': 100, 'p50': 50, 'p90': 90, 'p99': 99
+        })
+        self.assertDictEqual(pixc['total'], {
+            'count': 100, 'p50': 111, 'p90': 111, 'p99': 111
+        })
+
+        pixcvec = result[('PIXCVec', 2, '2023-01-02')]
+        self.assertDictEqual(pixcvec['queue'], {
+            'count': 1, 'p50': 60, 'p90': 60, 'p99': 60
+        })
+        self.assertDictEqual(pixcvec['run'], {'count': 0})
+
+        lines = report.format_report(result).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertListEqual(lines[0].split()[:5],
+                             ['product', 'cycle', 'day', 'count', 'queue_p50'])
+        self.assertListEqual(lines[2].split(), [
+            'PIXCVec', '2', '2023-01-02', '1', '60', '60', '60',
+            '-', '-', '-', '-', '-', '-'
+        ])
@@ -0,0 +1,103 @@
+'''Tests for the requeue module'''
+from unittest import TestCase
+from unittest.mock import MagicMock
+from botocore.exceptions import ClientError
+from podaac.swodlr_ingest_to_sds import requeue
+
+
+class TestRequeue(TestCase):
+    '''Tests for the requeue module'''
+
+    def test_scan_ingest_table(self):
+        '''
+        Test the ingest table scan of the requeue module, verifying that
+        every segment is scanned with the status and age filter and that the
+        items of every segment and page are returned
+        '''
+        table = MagicMock()
+        table.name = 'test_ingest_table'
+
+        def _mock_paginate(**kwargs):
+            segment = kwargs['Segment']
+            return [
+                {'Items': [{
+                    'granule_id': {'S': f'granule_{segment}_{page}'},
+                    's3_url': {'S': f's3://bucket/granule_{segment}_{page}'},
+                    'status': {'S': 'job-failed'}
+                }]}
+                for page in range(2)
+            ]
+
+        paginator = table.meta.client.get_paginator.return_value
+        paginator.paginate.side_effect = _mock_paginate
+
+        items = requeue.scan_ingest_table(
+            table, ['job-failed', 'job-queued'],
+            checked_before='2024-01-01T00:00:00', segments=4
+        )
+
+        self.assertEqual(len(items), 8)
+        self.assertIn({
+            'granule_id': 'granule_3_1',
+            's3_url': 's3://bucket/granule_3_1',
+            'status': 'job-failed'
+        }, items)
+
+        segments = sorted(call.kwargs['Segment']
+                          for call in paginator.paginate.call_args_list)
+        self.assertListEqual(segments, [0, 1, 2, 3])
+
+        kwargs = paginator.paginate.call_args.kwargs
+        self.assertEqual(kwargs['TotalSegments'], 4)
+        self.assertEqual(
+            kwargs['FilterExpression'],
+            '#status IN (:status0, :status1) AND '
+            '#last_check < :checked_before'
+        )
+        self.assertDictEqual(kwargs['ExpressionAttributeValues'], {
+            ':status0': {'S': 'job-failed'},
+            ':status1': {'S': 'job-queued'},
+            ':checked_before': {'S': '2024-01-01T00:00:00'}
+        })
+
+    def test_release_granules(self):
+        '''
+        Test the release of granules by the requeue module, verifying that
+        failed granules are requeued as-is, that in-flight granules are moved
+        to the released status in parallel through the client, and that
+        in-flight granules which changed since the scan are left alone
+        '''
+        table = MagicMock()
+        table.name = 'test_ingest_table'
+        client = table.meta.client
+
+        def _mock_update_item(**kwargs):
+            if kwargs['Key']['granule_id']['S'] == 'granule_3':
+                raise ClientError(
+                    {'Error': {'Code': 'ConditionalCheckFailedException'}},
+                    'UpdateItem'
+                )
+
+        client.update_item.side_effect = _mock_update_item
+        items = [
+            {'granule_id': 'granule_1', 'status': 'job-failed',
+             'last_check': '2024-01-01T00:00:00'},
+            {'granule_id': 'granule_2', 'status': 'job-queued',
+             'last_check': '2024-01-01T00:00:00'},
+            {'granule_id': 'granule_3', 'status': 'job-started',
+             'last_check': '2024-01-01T00:00:00'},
+            {'granule_id': 'granule_4', 'status': 'job-started',
+             'last_check': '2024-01-01T00:00:00'}
+        ]
+
+        released = requeue.release_granules(table, items, workers=2)
+
+        self.assertListEqual(released, [items[0], items[1], items[3]])
+        self.assertEqual(client.update_item.call_count, 3)
+        table.update_item.assert_not_called()
+        for call in client.update_item.call_args_list:
+            self.assertEqual(call.kwargs['TableName'], 'test_ingest_table')
+            self.assertEqual(
+                call.kwargs['ExpressionAttributeValues'][':released'],
+                {'S': requeue.RELEASED_STATUS}
+            )
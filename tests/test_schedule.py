@@ -0,0 +1,54 @@
+'''Tests for the schedule module'''
+from unittest import TestCase
+from podaac.swodlr_ingest_to_sds import schedule
+
+
+class TestSchedule(TestCase):
+    '''Tests for the schedule module'''
+
+    def test_next_interval(self):
+        '''
+        Test that the interval between checks doubles with the time spent in
+        a status and is capped at the status's max interval
+        '''
+        self.assertEqual(schedule.next_interval('job-queued', 0), 60)
+        self.assertEqual(schedule.next_interval('job-queued', 119), 60)
+        self.assertEqual(schedule.next_interval('job-queued', 120), 120)
+        self.assertEqual(schedule.next_interval('job-queued', 500), 480)
+        self.assertEqual(schedule.next_interval('job-queued', 10000), 900)
+        self.assertEqual(schedule.next_interval('job-started', 10000), 300)
+        self.assertEqual(schedule.next_interval('unknown', 10000), 600)
+
+    def test_schedule_job(self):
+        '''
+        Test that a job's time in status resets only when its status changes
+        '''
+        original = {'job_id': 'job_id_1'}
+        item = schedule.schedule_job(original, 'job-queued', 1000)
+        self.assertDictEqual(original, {'job_id': 'job_id_1'})
+        self.assertDictEqual(item, {
+            'job_id': 'job_id_1', 'status': 'job-queued',
+            'status_since': 1000, 'next_check': 1060
+        })
+
+        item = schedule.schedule_job(item, 'job-queued', 1300)
+        self.assertEqual(item['status_since'], 1000)
+        self.assertEqual(item['next_check'], 1300 + 240)
+
+        item = schedule.schedule_job(item, 'job-started', 1600)
+        self.assertEqual(item['status_since'], 1600)
+        self.assertEqual(item['next_check'], 1630)
+
+    def test_wait_seconds(self):
+        '''
+        Test that the wait is until the earliest due job, bounded by the min
+        and max waits
+        '''
+        self.assertEqual(schedule.wait_seconds([], 0), schedule.MIN_WAIT)
+        self.assertEqual(schedule.wait_seconds([{}], 100), schedule.MIN_WAIT)
+        self.assertEqual(schedule.wait_seconds(
+            [{'next_check': 400}, {'next_check': 250}], 100
+        ), 150)
+        self.assertEqual(schedule.wait_seconds(
+            [{'next_check': 100000}], 100
+        ), schedule.MAX_WAIT)
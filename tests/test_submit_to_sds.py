@@ -1,16 +1,17 @@
 '''Tests for the submit_to_sds module'''
+from collections import OrderedDict
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from pathlib import Path
 import json
 from os import environ
+import threading
+import time
+from botocore.exceptions import ClientError
 
 
 with (
     patch('boto3.client'),
-    patch('otello.mozart.Mozart.get_job_type'),
-    patch('podaac.swodlr_common.utilities.BaseUtilities.get_latest_job_version'),  # pylint: disable-next=line-too-long # noqa: E501
-    patch('podaac.swodlr_ingest_to_sds.utilities.utils.get_grq_es_client') as mock_es_client,  # pylint: disable-next=line-too-long # noqa: E501
     patch.dict(environ, {
         'SWODLR_ENV': 'dev',
         'SWODLR_sds_username': 'test_username',
@@ -22,6 +23,7 @@ with (
     })
 ):
     from podaac.swodlr_ingest_to_sds import submit_to_sds
+    from podaac.swodlr_ingest_to_sds.job_types import JobTypeCache
 
 
 class TestSubmitToSds(TestCase):
@@ -35,8 +37,7 @@ class TestSubmitToSds(TestCase):
     with open(invalid_event_path, encoding='utf-8') as f:
         invalid_event = json.load(f)
 
-    @patch('boto3.resource')
-    def test_valid_submit(self, _):
+    def test_valid_submit(self):
         '''
         Test the lambda handler for the submit_to_sds module by submitting
         three jobs, verifying all jobs are submitted, and verifying that
@@ -46,13 +47,11 @@ class TestSubmitToSds(TestCase):
         submit_to_sds.lambda_handler(self.valid_event, None)
 
         # pylint: disable=no-member
-        submit_calls = submit_to_sds.ingest_job_type.submit_job.call_args_list
-        # pylint: disable=no-member
-        input_calls = submit_to_sds.ingest_job_type.set_input_params\
-            .call_args_list
-        # pylint: disable=no-member,unnecessary-dunder-call
-        put_item_calls = submit_to_sds.utils.ingest_table.batch_writer()\
-            .__enter__().put_item.call_args_list
+        submit_calls = self.job_type.submit_job.call_args_list
+        input_calls = self.job_type.set_input_params.call_args_list
+        # pylint: disable=unnecessary-dunder-call
+        put_item_calls = self.mock_table.batch_writer().__enter__()\
+            .put_item.call_args_list
 
         self.assertEqual(len(input_calls), 3)
         self.assertEqual(len(submit_calls), 3)
@@ -93,6 +92,9 @@ class TestSubmitToSds(TestCase):
 
             _valid_granule_ids.remove(call.kwargs['Item']['granule_id'])
             _valid_urls.remove(call.kwargs['Item']['s3_url'])
+            self.assertEqual(call.kwargs['Item']['submitted_at'],
+                             call.kwargs['Item']['last_check'])
+            self.assertIn('first_seen', call.kwargs['Item'])
 
         # submit_job calls
         _valid_tags = valid_tags.copy()
@@ -113,9 +115,357 @@ class TestSubmitToSds(TestCase):
                     'ExpressionAttributeNames': {'#status': 'status'}
                 }
             },
-            ReturnConsumedCapacity='NONE'
+            ReturnConsumedCapacity='TOTAL'
+        )
+
+    def test_concurrent_submit(self):
+        '''
+        Test the lambda handler for the submit_to_sds module with multiple
+        submit workers, verifying that every worker submits with its own job
+        type and that each job is submitted with its own input params.
+        '''
+        job_types = []
+        job_types_lock = threading.Lock()
+
+        class _JobType:
+            def __init__(self, *_):
+                self.params = None
+                self.submitted = []
+                with job_types_lock:
+                    job_types.append(self)
+
+            def initialize(self):
+                '''Stand-in for JobType.initialize'''
+
+            def set_input_params(self, params):
+                '''Stand-in for JobType.set_input_params'''
+                self.params = params
+                time.sleep(0.01)  # Give other workers a chance to interleave
+
+            def submit_job(self, priority, tag):  # pylint: disable=unused-argument # noqa: E501
+                '''Stand-in for JobType.submit_job'''
+                self.submitted.append((tag, self.params['data_file']))
+                return MagicMock(job_id=f'job-{self.params["data_file"]}')
+
+        with (
+            patch.object(submit_to_sds, 'SUBMIT_WORKERS', 3),
+            patch('otello.mozart.Mozart.get_job_type', side_effect=_JobType)
+        ):
+            event = submit_to_sds.lambda_handler(self.valid_event, None)
+            # pylint: disable=unnecessary-dunder-call
+            put_item_calls = self.mock_table.batch_writer().__enter__()\
+                .put_item.call_args_list
+
+        self.assertListEqual(event['jobs'], [
+            {'granule_id': 'test-1', 'job_id': 'job-test-1.nc',
+             'status': 'job-queued'},
+            {'granule_id': 'test-2', 'job_id': 'job-test-2.nc',
+             'status': 'job-queued'},
+            {'granule_id': 'test-3', 'job_id': 'job-test-3.nc',
+             'status': 'job-queued'}
+        ])
+        self.assertEqual(len(put_item_calls), 3)
+
+        self.assertLessEqual(len(job_types), 3)
+        submitted = [item for job_type in job_types
+                     for item in job_type.submitted]
+        self.assertEqual(len(submitted), 3)
+        for tag, data_file in submitted:
+            self.assertEqual(tag, f'ingest_file_otello__{data_file}')
+
+    def test_lookup_statuses(self):
+        '''
+        Test the ingest table lookup of the submit_to_sds module by looking up
+        more keys than fit in a single BatchGetItem call and returning some
+        keys as unprocessed, verifying that keys are chunked, unprocessed
+        keys are retried, and consumed capacity is returned for every call.
+        '''
+        granule_ids = [f'test-{i}' for i in range(150)]
+
+        def _mock_batch_get_item(**kwargs):
+            keys = kwargs['RequestItems']['test_ingest_table_name']['Keys']
+            processed, unprocessed = keys[:25], keys[25:]
+
+            results = {
+                'Responses': {'test_ingest_table_name': [
+                    {'granule_id': key['granule_id'],
+                     'status': {'S': 'job-completed'}}
+                    for key in processed
+                ]},
+                'ConsumedCapacity': [{'CapacityUnits': len(processed) / 2}]
+            }
+            if unprocessed:
+                results['UnprocessedKeys'] = {
+                    'test_ingest_table_name': {'Keys': unprocessed}
+                }
+
+            return results
+
+        with (
+            patch.object(submit_to_sds.dynamodb, 'batch_get_item',
+                         side_effect=_mock_batch_get_item) as mock_get,
+            patch.object(submit_to_sds, 'sleep') as mock_sleep
+        ):
+            statuses, consumed_capacity, unprocessed = \
+                submit_to_sds._lookup_statuses(granule_ids)  # pylint: disable=protected-access # noqa: E501
+
+        self.assertDictEqual(
+            statuses, {granule_id: 'job-completed'
+                       for granule_id in granule_ids}
+        )
+        key_counts = sorted(
+            len(call.kwargs['RequestItems']['test_ingest_table_name']['Keys'])
+            for call in mock_get.call_args_list
+        )
+        self.assertListEqual(key_counts, [25, 25, 50, 50, 75, 100])
+        self.assertSetEqual(unprocessed, set())
+        self.assertEqual(mock_sleep.call_count, 4)
+        self.assertEqual(len(consumed_capacity), 6)
+        self.assertEqual(
+            sum(capacity['CapacityUnits'] for capacity in consumed_capacity),
+            75
+        )
+
+    def test_incomplete_lookup_submit(self):
+        '''
+        Test the lambda handler for the submit_to_sds module when some keys
+        are still unprocessed after every lookup attempt, verifying that their
+        granules are requeued instead of being submitted
+        '''
+        def _mock_batch_get_item(**kwargs):
+            keys = kwargs['RequestItems']['test_ingest_table_name']['Keys']
+            return {
+                'Responses': {'test_ingest_table_name': []},
+                'UnprocessedKeys': {'test_ingest_table_name': {
+                    'Keys': [key for key in keys
+                             if key['granule_id']['S'] != 'test-1']
+                }}
+            }
+
+        with (
+            patch.object(submit_to_sds.dynamodb, 'batch_get_item',
+                         side_effect=_mock_batch_get_item),
+            patch.object(submit_to_sds, 'sleep'),
+            patch.object(submit_to_sds.sqs, 'send_message_batch',
+                         return_value={'Failed': []}) as mock_send
+        ):
+            event = submit_to_sds.lambda_handler(self.valid_event, None)
+
+        self.assertListEqual(
+            [job['granule_id'] for job in event['jobs']], ['test-1']
+        )
+        self.assertEqual(self.job_type.submit_job.call_count, 1)
+        self.assertListEqual(
+            [entry['MessageBody'] for entry in
+             mock_send.call_args.kwargs['Entries']],
+            [record['body'] for record in self.valid_event['Records'][1:]]
+        )
+
+    def test_dedup_submit(self):
+        '''
+        Test the lambda handler for the submit_to_sds module with granules
+        which are already being ingested, claimed by another submission, or
+        fail to submit, verifying that only unclaimed granules reach the SDS,
+        that failed submissions release their claim, that redeliveries of
+        submitted granules are skipped from the in-process cache, and that
+        granules requeued after failing are resubmitted despite the cache
+        '''
+        submit_to_sds.dynamodb.batch_get_item.return_value = {
+            'Responses': {'test_ingest_table_name': [
+                {'granule_id': {'S': 'test-1'},
+                 'status': {'S': 'job-started'}}
+            ]}
+        }
+
+        def _mock_update_item(**kwargs):
+            if kwargs['Key']['granule_id']['S'] == 'test-2':
+                raise ClientError(
+                    {'Error': {'Code': 'ConditionalCheckFailedException'}},
+                    'UpdateItem'
+                )
+            return {'Attributes': {'granule_id': {'S': 'test-3'},
+                                   'status': {'S': 'job-failed'}}}
+
+        mock_dynamodb = submit_to_sds.dynamodb
+        mock_dynamodb.update_item.side_effect = _mock_update_item
+        self.job_type.submit_job.side_effect = RuntimeError('SDS unavailable')
+
+        event = submit_to_sds.lambda_handler(self.valid_event, None)
+
+        self.assertEqual(event['job_count'], 0)
+        self.assertEqual(self.job_type.submit_job.call_count, 1)
+        self.assertListEqual(
+            [call.kwargs['Key']['granule_id']['S']
+             for call in mock_dynamodb.update_item.call_args_list],
+            ['test-2', 'test-3']
+        )
+        mock_dynamodb.put_item.assert_called_once()
+        self.assertDictEqual(
+            mock_dynamodb.put_item.call_args.kwargs['Item'],
+            {'granule_id': {'S': 'test-3'}, 'status': {'S': 'job-failed'}}
+        )
+
+        # Redeliveries of submitted granules aren't claimed again
+        mock_dynamodb.update_item.side_effect = None
+        self.job_type.submit_job.side_effect = None
+        submit_to_sds.dynamodb.batch_get_item.return_value = {
+            'Responses': {'test_ingest_table_name': []}
+        }
+
+        event = submit_to_sds.lambda_handler(self.valid_event, None)
+        self.assertEqual(event['job_count'], 3)
+
+        mock_dynamodb.update_item.reset_mock()
+        event = submit_to_sds.lambda_handler(self.valid_event, None)
+        self.assertEqual(event['job_count'], 0)
+        mock_dynamodb.update_item.assert_not_called()
+
+        # Granules requeued after failing are resubmitted
+        submit_to_sds.dynamodb.batch_get_item.return_value = {
+            'Responses': {'test_ingest_table_name': [
+                {'granule_id': {'S': 'test-1'},
+                 'status': {'S': 'job-failed'}},
+                {'granule_id': {'S': 'test-2'},
+                 'status': {'S': 'job-requeued'}}
+            ]}
+        }
+        event = submit_to_sds.lambda_handler(self.valid_event, None)
+        self.assertListEqual(
+            [job['granule_id'] for job in event['jobs']], ['test-1', 'test-2']
         )
 
+    def test_failed_submit(self):
+        '''
+        Test the lambda handler for the submit_to_sds module with a poison
+        record and records whose submission fails, verifying that only the
+        failed records are requeued, with their requeue count incremented,
+        and that records past the requeue limit are dropped
+        '''
+        records = [
+            {**record, 'requeue_count': i}
+            for i, record in enumerate(self.valid_event['Records'])
+        ]
+        records[2]['requeue_count'] = submit_to_sds.REQUEUE_MAX
+        records.append({'messageId': 'poison', 'body': '{"product": {}}'})
+
+        def _mock_submit_job(priority, tag):  # pylint: disable=unused-argument # noqa: E501
+            if tag == 'ingest_file_otello__test-1.nc':
+                return MagicMock(job_id='job-1')
+            raise RuntimeError('SDS unavailable')
+
+        self.job_type.submit_job.side_effect = _mock_submit_job
+
+        with patch.object(submit_to_sds.sqs, 'send_message_batch',
+                          return_value={'Failed': []}) as mock_send:
+            event = submit_to_sds.lambda_handler({'Records': records}, None)
+
+        self.assertEqual(event['job_count'], 1)
+        mock_send.assert_called_once()
+        self.assertListEqual(mock_send.call_args.kwargs['Entries'], [{
+            'Id': '0',
+            'MessageBody': records[1]['body'],
+            'DelaySeconds': submit_to_sds.REQUEUE_DELAY,
+            'MessageAttributes': {'requeue_count': {
+                'DataType': 'Number', 'StringValue': '2'
+            }}
+        }])
+
+    def test_prioritized_submit(self):
+        '''
+        Test the lambda handler for the submit_to_sds module with a record
+        requesting a priority, verifying that its granule is submitted first
+        with the priority requested and that the priority is kept when the
+        record is requeued
+        '''
+        records = [dict(record) for record in self.valid_event['Records']]
+        records[2]['priority'] = 7
+
+        self.job_type.submit_job.side_effect = RuntimeError('SDS unavailable')
+        with patch.object(submit_to_sds.sqs, 'send_message_batch',
+                          return_value={'Failed': []}) as mock_send:
+            submit_to_sds.lambda_handler({'Records': records}, None)
+
+        # pylint: disable=no-member
+        self.assertListEqual([
+            call.args[0]['data_file']
+            for call in self.job_type.set_input_params.call_args_list
+        ], ['test-3.nc', 'test-1.nc', 'test-2.nc'])
+        self.assertListEqual([
+            call.kwargs['priority']
+            for call in self.job_type.submit_job.call_args_list
+        ], [7, 0, 0])
+
+        entries = mock_send.call_args.kwargs['Entries']
+        self.assertDictEqual(entries[0]['MessageAttributes']['priority'], {
+            'DataType': 'Number', 'StringValue': '7'
+        })
+        self.assertNotIn('priority', entries[1]['MessageAttributes'])
+
+    def test_rate_limited_submit(self):
+        '''
+        Test the lambda handler for the submit_to_sds module when the
+        submission rate limit is reached, verifying that granules over the
+        limit are deferred to the queue, spread out at the submission rate,
+        without counting as a requeue
+        '''
+        limiter = MagicMock()
+        limiter.acquire.return_value = 1
+
+        with (
+            patch.object(submit_to_sds, 'submit_limiter', limiter),
+            patch.object(submit_to_sds, 'SUBMIT_RATE', 0.5),
+            patch.object(submit_to_sds.sqs, 'send_message_batch',
+                         return_value={'Failed': []}) as mock_send
+        ):
+            event = submit_to_sds.lambda_handler(self.valid_event, None)
+
+        limiter.acquire.assert_called_once_with(3)
+        self.assertEqual(event['job_count'], 1)
+        self.assertEqual(self.job_type.submit_job.call_count, 1)
+
+        entries = mock_send.call_args.kwargs['Entries']
+        self.assertListEqual(
+            [entry['MessageBody'] for entry in entries],
+            [record['body'] for record in self.valid_event['Records'][1:]]
+        )
+        self.assertListEqual(
+            [entry['DelaySeconds'] for entry in entries], [2, 4]
+        )
+        self.assertListEqual(
+            [entry['MessageAttributes']['requeue_count']['StringValue']
+             for entry in entries], ['0', '0']
+        )
+
+    def test_rate_limited_unsent(self):
+        '''
+        Test the lambda handler for the submit_to_sds module when a granule
+        deferred by the submission rate limit fails to be sent to the queue,
+        verifying that it is requeued as a failure rather than dropped
+        '''
+        limiter = MagicMock()
+        limiter.acquire.return_value = 1
+
+        with (
+            patch.object(submit_to_sds, 'submit_limiter', limiter),
+            patch.object(submit_to_sds, 'SUBMIT_RATE', 0.5),
+            patch.object(submit_to_sds.sqs, 'send_message_batch',
+                         side_effect=[
+                             {'Failed': [{'Id': '1', 'Message': 'Error'}]},
+                             {'Failed': []}
+                         ]) as mock_send
+        ):
+            submit_to_sds.lambda_handler(self.valid_event, None)
+
+        self.assertEqual(mock_send.call_count, 2)
+        self.assertListEqual(mock_send.call_args.kwargs['Entries'], [{
+            'Id': '0',
+            'MessageBody': self.valid_event['Records'][2]['body'],
+            'DelaySeconds': submit_to_sds.REQUEUE_DELAY,
+            'MessageAttributes': {'requeue_count': {
+                'DataType': 'Number', 'StringValue': '1'
+            }}
+        }])
+
     def test_invalid_submit(self):
         '''
         Test the lambda handler for the submit_to_sds module by submitting
@@ -124,13 +474,43 @@ class TestSubmitToSds(TestCase):
         event = submit_to_sds.lambda_handler(self.invalid_event, None)
         self.assertEqual(len(event['jobs']), 0)
 
+    def setUp(self):
+        '''
+        Replace the ingest table with a mock, return an empty lookup result
+        from it, and resolve job types to a mock through a fresh,
+        non-persistent job type cache
+        '''
+        self.job_type = MagicMock()
+        table_patcher = patch.object(
+            submit_to_sds.utils, '_ingest_table', create=True
+        )
+        self.mock_table = table_patcher.start()
+        self.addCleanup(table_patcher.stop)
+
+        patchers = [
+            patch('otello.mozart.Mozart.get_job_type',
+                  return_value=self.job_type),
+            patch('podaac.swodlr_common.utilities.BaseUtilities.get_latest_job_version',  # pylint: disable=line-too-long # noqa: E501
+                  return_value='job-INGEST_STAGED:test'),
+            patch.object(submit_to_sds, 'ingest_job_types',
+                         JobTypeCache('job-INGEST_STAGED')),
+            patch.object(submit_to_sds, 'recent_granules', OrderedDict())
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        submit_to_sds.dynamodb.batch_get_item.return_value = {
+            'Responses': {'test_ingest_table_name': []}
+        }
+        submit_to_sds.dynamodb.update_item.return_value = {}
+
     def tearDown(self):
         '''
         Reset mocks after each test run
         '''
-
-        # pylint: disable=no-member
-        submit_to_sds.ingest_job_type.set_input_params.reset_mock()
-        # pylint: disable=no-member
-        submit_to_sds.ingest_job_type.submit_job.reset_mock()
         submit_to_sds.dynamodb.batch_get_item.reset_mock()
+        for operation in ('update_item', 'put_item', 'delete_item'):
+            getattr(submit_to_sds.dynamodb, operation).reset_mock(
+                side_effect=True
+            )
@@ -0,0 +1,108 @@
+'''Tests for the sweeper module'''
+from unittest import TestCase
+from unittest.mock import patch
+from os import environ
+from podaac.swodlr_ingest_to_sds.utilities import utils
+
+with (
+    patch.dict(environ, {
+        'SWODLR_ENV': 'dev',
+        'SWODLR_sds_username': 'test_username',
+        'SWODLR_sds_password': 'test_password'
+    })
+):
+    from podaac.swodlr_ingest_to_sds import sweeper
+
+
+class TestSweeper(TestCase):
+    '''Tests for the sweeper module'''
+
+    def test_sweeper(self):
+        '''
+        Test the lambda handler for the sweeper module by returning in-flight
+        jobs from the status index, including one returned by two adjacent
+        segments, and a completed granule whose tile is pending, verifying
+        that every status and last_check segment is queried, that each job is
+        polled once, that only changed statuses are written, and that the
+        pending tile is inserted without polling its job.
+        '''
+        pending_id = 'SWOT_L2_HR_PIXC_001_002_003L_20230101T000000_01'
+        rows = {
+            'job-queued': [
+                {'granule_id': {'S': 'granule_id_1'},
+                 'job_id': {'S': 'job_id_1'},
+                 'status': {'S': 'job-queued'}}
+            ],
+            'job-started': [
+                {'granule_id': {'S': 'granule_id_2'},
+                 'job_id': {'S': 'job_id_2'},
+                 'status': {'S': 'job-started'}}
+            ],
+            'job-completed': [
+                {'granule_id': {'S': pending_id},
+                 'job_id': {'S': 'job_id_3'},
+                 'status': {'S': 'job-completed'}}
+            ]
+        }
+
+        def _mock_paginate(**kwargs):
+            status = kwargs['ExpressionAttributeValues'][':status']['S']
+            return [{'Items': rows[status]}, {'Items': []}]
+
+        with (
+            patch.object(utils, '_ingest_table', create=True) as mock_table,
+            patch.object(utils, '_available_tiles_table', create=True)
+            as mock_tiles_table,
+            patch.object(utils, 'get_job_statuses', return_value={
+                'job_id_1': {'status': 'job-queued'},
+                'job_id_2': {'status': 'job-completed'}
+            }) as mock_get_job_statuses
+        ):
+            client = mock_table.meta.client
+            client.get_paginator.return_value.paginate.side_effect = \
+                _mock_paginate
+            client.batch_execute_statement.side_effect = \
+                lambda **kwargs: {
+                    'Responses': [{} for _ in kwargs['Statements']]
+                }
+
+            result = sweeper.lambda_handler({}, None)
+
+        self.assertDictEqual(result, {
+            'in_flight': 2, 'checked': 2, 'finished': 1, 'tiles_retried': 1
+        })
+
+        paginate_calls = client.get_paginator.return_value.paginate\
+            .call_args_list
+        self.assertEqual(
+            len(paginate_calls),
+            len(sweeper.IN_FLIGHT_STATUSES) * (len(sweeper.SEGMENT_AGES) + 1)
+            + 1
+        )
+        for call in paginate_calls:
+            self.assertEqual(call.kwargs['IndexName'], sweeper.STATUS_INDEX)
+        self.assertEqual(paginate_calls[-1].kwargs['FilterExpression'],
+                         'attribute_exists(tile_pending_since)')
+
+        mock_get_job_statuses.assert_called_once()
+        self.assertCountEqual(
+            mock_get_job_statuses.call_args.args[0], ['job_id_1', 'job_id_2']
+        )
+
+        # pylint: disable=unnecessary-dunder-call
+        mock_tiles_table.batch_writer().__enter__().put_item\
+            .assert_called_once_with(Item={'tile_id': 'PIXC,1,2,3L'})
+
+        statements = [
+            statement
+            for call in client.batch_execute_statement.call_args_list
+            for statement in call.kwargs['Statements']
+            if 'SET' in statement['Statement']
+        ]
+        self.assertEqual(len(statements), 1)
+        where = statements[0]['Parameters'][
+            statements[0]['Statement'].count('SET'):
+        ]
+        self.assertListEqual(where[:2], [
+            {'S': 'granule_id_2'}, {'S': 'job_id_2'}
+        ])
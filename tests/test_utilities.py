@@ -0,0 +1,145 @@
+'''Tests for the utilities module'''
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import environ
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+from podaac.swodlr_ingest_to_sds.utilities import Utilities
+
+
+class _SdsHandler(BaseHTTPRequestHandler):
+    '''Stand-in for the SDS which throttles every other request'''
+    protocol_version = 'HTTP/1.1'
+    throttle = False
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        '''Responds with a 429 or a 200, alternately'''
+        _SdsHandler.throttle = not _SdsHandler.throttle
+        status = 429 if _SdsHandler.throttle else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *_):  # pylint: disable=arguments-differ
+        '''Silences request logging'''
+
+
+class TestUtilities(TestCase):
+    '''Tests for the utilities module'''
+
+    def setUp(self):
+        '''
+        Start a local stand-in for the SDS
+        '''
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _SdsHandler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.host = f'http://127.0.0.1:{self.server.server_port}/'
+
+    def test_sds_session(self):
+        '''
+        Test the SDS session of the utilities module, verifying that its
+        connection pool is sized to the largest worker count, that throttled
+        requests are retried, and that connections are kept alive and
+        reported as reused in the pool stats
+        '''
+        with patch.dict(environ, {
+            'SWODLR_ENV': 'dev',
+            'SWODLR_sds_host': self.host,
+            'SWODLR_sds_username': 'test_username',
+            'SWODLR_sds_password': 'test_password',
+            'SWODLR_submit_workers': '4',
+            'SWODLR_poll_workers': '16'
+        }):
+            utils = Utilities()
+            self.assertDictEqual(
+                utils.get_sds_pool_stats(), {'connections': 0, 'requests': 0}
+            )
+
+            session = utils.sds_session
+            adapter = session.get_adapter(self.host)
+            self.assertEqual(
+                adapter._pool_maxsize, 16  # pylint: disable=protected-access
+            )
+
+            for _ in range(5):
+                res = session.get(self.host)
+                self.assertEqual(res.status_code, 200)
+
+        stats = utils.get_sds_pool_stats()
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['requests'], 10)
+
+    def test_config(self):
+        '''
+        Test the config of the utilities module outside of dev, verifying
+        that params are loaded in bulk and cached until their ttl expires,
+        that secrets are only decrypted when read, and that a second instance
+        reads the config cache file instead of SSM
+        '''
+        path = Utilities.CONFIG_PATH
+        ssm = MagicMock()
+        ssm.get_paginator.return_value.paginate.return_value = [
+            {'Parameters': [
+                {'Name': f'{path}sds_host', 'Type': 'String',
+                 'Value': 'https://sds.test/'},
+                {'Name': f'{path}config_ttl', 'Type': 'String',
+                 'Value': '60'}
+            ]},
+            {'Parameters': [
+                {'Name': f'{path}sds_password', 'Type': 'SecureString',
+                 'Value': 'encrypted'}
+            ]}
+        ]
+        ssm.get_parameter.return_value = {
+            'Parameter': {'Value': 'test_password'}
+        }
+
+        tmp_dir = TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmp_dir.cleanup)
+        cache_path = Path(tmp_dir.name).joinpath('config.json')
+
+        with patch.dict(environ, {
+                'SWODLR_ENV': 'prod',
+                'SWODLR_CONFIG_CACHE': str(cache_path)
+        }), patch('boto3.client', return_value=ssm), \
+                patch('podaac.swodlr_ingest_to_sds.utilities.time') as time:
+            time.return_value = 1000
+            utils = Utilities()
+
+            self.assertEqual(utils.get_param('sds_host'), 'https://sds.test/')
+            self.assertIsNone(utils.get_param('submit_workers'))
+            ssm.get_paginator.assert_called_once_with(
+                'get_parameters_by_path'
+            )
+            ssm.get_parameter.assert_not_called()
+            self.assertEqual(len(utils.pop_config_timings()), 1)
+            self.assertListEqual(utils.pop_config_timings(), [])
+
+            self.assertEqual(utils.get_param('sds_password'), 'test_password')
+            self.assertEqual(utils.get_param('sds_password'), 'test_password')
+            ssm.get_parameter.assert_called_once_with(
+                Name=f'{path}sds_password', WithDecryption=True
+            )
+            self.assertNotIn('test_password', cache_path.read_text())
+
+            # A second instance within the ttl reads the cache file
+            cached_utils = Utilities()
+            self.assertEqual(cached_utils.get_param('sds_host'),
+                             'https://sds.test/')
+            self.assertEqual(
+                ssm.get_paginator.return_value.paginate.call_count, 1
+            )
+
+            # Expired params are reloaded, and secrets refreshed when read
+            time.return_value = 1060
+            utils.get_param('sds_host')
+            self.assertEqual(
+                ssm.get_paginator.return_value.paginate.call_count, 2
+            )
+            self.assertEqual(ssm.get_parameter.call_count, 1)
+            utils.get_param('sds_password')
+            self.assertEqual(ssm.get_parameter.call_count, 2)